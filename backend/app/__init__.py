@@ -17,5 +17,5 @@ bcrypt = Bcrypt(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 
-from app import routes, models
+from app import database, querycount, routes, models, migrations
 
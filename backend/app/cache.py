@@ -0,0 +1,205 @@
+"""
+Per-user response cache for the read endpoints.
+
+Responses are cached under (user, endpoint, view arguments, query string) together with
+a per-user generation. Whenever a transaction changes a user's data (see `app.changes`),
+the user gets a new generation, so that user's old entries can no longer be reached and
+simply age out. A generation is kept for twice the TTL after it was set, by which time the
+entries of the previous one have expired, and is then dropped. Cached responses carry a
+strong ETag, so clients that send `If-None-Match` get a 304.
+
+Two backends are available:
+    - `memory`: an in-process LRU bounded by entry count and bytes, with a TTL. Each process
+      has its own cache and only sees the invalidations of the writes it makes itself: with
+      several gunicorn workers, or scrapes and analyses run by `app.worker` processes, a
+      user's responses can be up to RESPONSE_CACHE_TTL seconds stale. It is the default only
+      when REDIS_URL is not set, and a warning is logged when it is used that way.
+    - `redis`: a store shared by all processes, the default when REDIS_URL is set. Any client
+      object with the redis-py `get`/`set` interface can be passed in, such as the local
+      stand-in of app/testing.py. Memory is bounded by the TTL and the server's `maxmemory`
+      LRU policy.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request
+from flask_login import current_user
+from app import app
+from app.changes import users_changed
+from app.metrics import cache_lookups
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU cache with a TTL, bounded by number of entries and total bytes."""
+
+    def __init__(self, max_entries=2048, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.generations = OrderedDict()  # name -> (expires_at, generation), oldest first
+        self.tokens = itertools.count(1)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+    def generation(self, name):
+        with self.lock:
+            entry = self.generations.get(name)
+            if entry is None or entry[0] < time.monotonic():
+                return 0
+            return entry[1]
+
+    def bump_generation(self, name, ttl):
+        with self.lock:
+            now = time.monotonic()
+            # Generations all live as long, so the expired ones are at the front
+            while self.generations and next(iter(self.generations.values()))[0] < now:
+                self.generations.popitem(last=False)
+            self.generations.pop(name, None)
+            self.generations[name] = (now + ttl, next(self.tokens))
+
+
+class RedisBackend:
+    """Shared cache stored in Redis (or anything exposing the same `get`/`set` calls)."""
+
+    def __init__(self, client, prefix='sentimentscout:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def generation(self, name):
+        value = self.client.get(self.prefix + 'generation:' + name)
+        return value.decode() if value is not None else 0
+
+    def bump_generation(self, name, ttl):
+        # A random generation rather than a counter, which would start over once it expired
+        self.client.set(self.prefix + 'generation:' + name, os.urandom(8).hex(), ex=ttl)
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl=300, enabled=True):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+
+    def key(self, user_id, endpoint, view_args, query_args):
+        generation = self.backend.generation(f'user:{user_id}')
+        args = '&'.join(f'{name}={value}' for name, value in sorted(view_args.items()))
+        query = '&'.join(f'{name}={value}' for name, value in sorted(query_args.items(multi=True)))
+        return f'{user_id}:{generation}:{endpoint}:{args}:{query}'
+
+    def get(self, key):
+        """Returns (etag, body) for a cached response, or None."""
+        value = self.backend.get(key)
+        if value is None:
+            return None
+        etag, _, body = value.partition(b'\n')
+        return etag.decode(), body
+
+    def set(self, key, body):
+        etag = hashlib.sha256(body).hexdigest()
+        self.backend.set(key, etag.encode() + b'\n' + body, self.ttl)
+        return etag
+
+    def invalidate_user(self, user_id):
+        self.backend.bump_generation(f'user:{user_id}', 2 * self.ttl)
+
+
+def create_response_cache(config):
+    if config.get('RESPONSE_CACHE_BACKEND') == 'redis':
+        backend = RedisBackend.from_url(config['RESPONSE_CACHE_REDIS_URL'])
+    else:
+        if config.get('RESPONSE_CACHE_ENABLED', True) and config.get('JOB_EXECUTOR') == 'worker':
+            app.logger.warning(
+                'The response cache is per process (RESPONSE_CACHE_BACKEND=memory) but scrapes and analyses '
+                'run in worker processes: their results show up to RESPONSE_CACHE_TTL seconds late. '
+                'Set REDIS_URL to share the cache.'
+            )
+        backend = MemoryBackend(
+            max_entries=config.get('RESPONSE_CACHE_MAX_ENTRIES', 2048),
+            max_bytes=config.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        )
+    return ResponseCache(
+        backend,
+        ttl=config.get('RESPONSE_CACHE_TTL', 300),
+        enabled=config.get('RESPONSE_CACHE_ENABLED', True),
+    )
+
+
+response_cache = create_response_cache(app.config)
+
+
+@users_changed.connect
+def invalidate_changed_users(session, user_ids):
+    for user_id in user_ids:
+        response_cache.invalidate_user(user_id)
+
+
+def cached_response(f):
+    """
+    Decorator caching successful JSON responses of a read endpoint per logged-in user.
+    Must be applied below `login_required`.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not response_cache.enabled:
+            return f(*args, **kwargs)
+
+        key = response_cache.key(current_user.id, request.endpoint, kwargs, request.args)
+        cached = response_cache.get(key)
+        if cached:
+            etag, body = cached
+            response = app.response_class(body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            cache_lookups.inc(cache='response', result='hit')
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            etag = response_cache.set(key, response.get_data())
+            response.headers['X-Cache'] = 'MISS'
+            cache_lookups.inc(cache='response', result='miss')
+
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return decorated_function
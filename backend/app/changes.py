@@ -0,0 +1,77 @@
+"""
+Tracks which users' data a database transaction changes.
+
+Session listeners collect the owners of every product, product platform, scraping task,
+sentiment summary and review that gets flushed, and which of those tables changed for each
+of them. Right before the transaction commits, the `users_changing` signal is sent with
+those user ids and tables, so per-user derived data can be refreshed inside the same
+transaction. Updates of only the lease columns of a scraping task are left out: no user
+sees them. Once the commit succeeded `users_changed` follows,
+for work that must only see committed data, such as cache invalidation.
+"""
+from blinker import Namespace
+from sqlalchemy import event, inspect
+from app import db
+from app.models import Product, ProductPlatform, ScrapingTask, SentimentSummary, Review
+
+signals = Namespace()
+
+# Sent with `user_ids`, and `tables` mapping each of them to the names of the tables changed,
+# before a transaction that changed those users' data commits
+users_changing = signals.signal('users-changing')
+# Sent with `user_ids` after a transaction that changed those users' data committed
+users_changed = signals.signal('users-changed')
+
+USER_TABLES_KEY = 'changed_user_tables'
+PRODUCT_TABLES_KEY = 'changed_product_tables'
+COMMITTING_USER_IDS_KEY = 'committing_user_ids'
+
+# The columns of a running task's lease (see app/leases.py)
+LEASE_COLUMNS = frozenset({'owner', 'lease_expires_at', 'attempts'})
+
+
+def changed_columns(obj):
+    return {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+
+
+@event.listens_for(db.session, 'after_flush')
+def collect_changes(session, flush_context):
+    # user id -> names of its changed tables, and the same by product id for the rows of products
+    user_tables = session.info.setdefault(USER_TABLES_KEY, {})
+    product_tables = session.info.setdefault(PRODUCT_TABLES_KEY, {})
+    dirty = [obj for obj in session.dirty if not (isinstance(obj, ScrapingTask) and changed_columns(obj) <= LEASE_COLUMNS)]
+    for obj in (*session.new, *dirty, *session.deleted):
+        if isinstance(obj, (Product, ScrapingTask)):
+            user_tables.setdefault(obj.created_by, set()).add(obj.__tablename__)
+        elif isinstance(obj, (ProductPlatform, SentimentSummary, Review)):
+            product_tables.setdefault(obj.product_id, set()).add(obj.__tablename__)
+
+
+@event.listens_for(db.session, 'before_commit')
+def notify_changes(session):
+    # Flush first so the changes still pending in the session are collected too
+    session.flush()
+    user_tables = session.info.pop(USER_TABLES_KEY, {})
+    product_tables = session.info.pop(PRODUCT_TABLES_KEY, {})
+    if product_tables:
+        for product_id, created_by in session.query(Product.id, Product.created_by).filter(Product.id.in_(product_tables)).all():
+            user_tables.setdefault(created_by, set()).update(product_tables[product_id])
+    user_tables.pop(None, None)
+    if user_tables:
+        user_ids = set(user_tables)
+        users_changing.send(session, user_ids=user_ids, tables=user_tables)
+        session.info[COMMITTING_USER_IDS_KEY] = user_ids
+
+
+@event.listens_for(db.session, 'after_commit')
+def notify_committed_changes(session):
+    user_ids = session.info.pop(COMMITTING_USER_IDS_KEY, None)
+    if user_ids:
+        users_changed.send(session, user_ids=user_ids)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def discard_changes(session, previous_transaction):
+    session.info.pop(USER_TABLES_KEY, None)
+    session.info.pop(PRODUCT_TABLES_KEY, None)
+    session.info.pop(COMMITTING_USER_IDS_KEY, None)
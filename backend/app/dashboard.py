@@ -0,0 +1,157 @@
+"""
+Materialized per-user dashboard statistics.
+
+The dashboard numbers used to be computed with about a dozen queries on every
+`/dashboard` load. They are now stored in `dashboard_aggregates` and recomputed whenever
+a transaction changes the user's products, scraping tasks, reviews or sentiment
+summaries (see `app.changes`), so reading the dashboard is a single primary key lookup.
+Only the statistics the changed tables feed are recomputed, so the status updates of a
+running scrape only query its user's pending tasks again.
+"""
+import click
+from werkzeug.http import http_date
+from app import app, db
+from app.changes import users_changing
+from app.models import User, Product, Review, SentimentSummary, ScrapingTask, Status, DashboardAggregate
+
+FIELDS = (
+    'total_reviews', 'total_products', 'pending_scraping_tasks', 'pending_scraping_task_details',
+    'total_positive_reviews', 'total_negative_reviews', 'total_neutral_reviews',
+    'average_rating', 'most_rating',
+    'product_with_most_positive_reviews', 'product_with_most_negative_reviews', 'product_with_most_neutral_reviews',
+)
+
+
+# The parts of the statistics that a change to each table can affect. A product being
+# deleted leaves its reviews and summaries out too; product platforms are not counted.
+PARTS = frozenset({'reviews', 'products', 'tasks', 'summaries'})
+PARTS_BY_TABLE = {
+    'products': {'reviews', 'products', 'summaries'},
+    'reviews': {'reviews'},
+    'sentiment_summaries': {'summaries'},
+    'scraping_tasks': {'tasks'},
+}
+
+
+def compute_dashboard(user_id, parts=PARTS):
+    """
+    Computes the dashboard statistics for a user from the source tables, leaving out products
+    being deleted. Only the fields of the given parts are computed.
+    """
+    stats = {}
+    if 'reviews' in parts:
+        # Get total reviews analyzed (counting reviews for products created by the user)
+        stats['total_reviews'] = db.session.query(Review).join(Product).filter(Product.created_by == user_id, Product.deleting.is_(False)).count()
+
+    if 'products' in parts:
+        # Get total products for the user
+        stats['total_products'] = db.session.query(Product).filter_by(created_by=user_id, deleting=False).count()
+
+    if 'tasks' in parts:
+        # Get details of pending scraping tasks
+        pending_tasks = db.session.query(ScrapingTask).filter_by(status=Status.PENDING, created_by=user_id).all()
+        stats['pending_scraping_tasks'] = len(pending_tasks)
+        stats['pending_scraping_task_details'] = [
+            {
+                'task_id': task.id,
+                'status': task.status.name,
+                'created_at': http_date(task.created_at) if task.created_at else None,
+                'message': task.message,
+                'platform': task.platform.name,
+                'product_id': task.product_id
+            } for task in pending_tasks
+        ]
+
+    if 'summaries' in parts:
+        # Sentiment summaries of the products created by the user
+        user_product_ids = db.session.query(Product.id).filter_by(created_by=user_id, deleting=False)
+        summaries = db.session.query(SentimentSummary).filter(SentimentSummary.product_id.in_(user_product_ids))
+
+        totals = summaries.with_entities(
+            db.func.sum(SentimentSummary.positive_count),
+            db.func.sum(SentimentSummary.negative_count),
+            db.func.sum(SentimentSummary.neutral_count),
+            db.func.avg(SentimentSummary.average_rating),
+        ).one()
+
+        # Get the most common rating (most rating)
+        most_rating = summaries.with_entities(SentimentSummary.most_rating) \
+            .group_by(SentimentSummary.most_rating) \
+            .order_by(db.func.count().desc()).first()
+
+        def product_with_most(count_column):
+            row = summaries.with_entities(SentimentSummary.product_id) \
+                .group_by(SentimentSummary.product_id) \
+                .order_by(db.func.sum(count_column).desc()).first()
+            return row[0] if row else None
+
+        stats.update({
+            'total_positive_reviews': totals[0] or 0,
+            'total_negative_reviews': totals[1] or 0,
+            'total_neutral_reviews': totals[2] or 0,
+            'average_rating': totals[3] or 0,
+            'most_rating': most_rating[0] if most_rating else 0,
+            'product_with_most_positive_reviews': product_with_most(SentimentSummary.positive_count),
+            'product_with_most_negative_reviews': product_with_most(SentimentSummary.negative_count),
+            'product_with_most_neutral_reviews': product_with_most(SentimentSummary.neutral_count),
+        })
+    return stats
+
+
+def refresh_dashboard_aggregate(user_id, parts=PARTS):
+    """Recomputes the given parts of a user's dashboard row in the current session. The caller commits."""
+    aggregate = db.session.get(DashboardAggregate, user_id)
+    if not aggregate:
+        aggregate = DashboardAggregate(user_id=user_id)
+        db.session.add(aggregate)
+        parts = PARTS
+    for field, value in compute_dashboard(user_id, parts).items():
+        setattr(aggregate, field, value)
+    return aggregate
+
+
+def dashboard_response(aggregate):
+    return {field: getattr(aggregate, field) for field in FIELDS}
+
+
+@users_changing.connect
+def refresh_changed_dashboards(session, user_ids, tables):
+    for user_id in user_ids:
+        parts = set().union(*(PARTS_BY_TABLE.get(table, ()) for table in tables[user_id]))
+        if parts:
+            refresh_dashboard_aggregate(user_id, parts)
+
+
+def _same(stored, computed):
+    if isinstance(stored, float) or isinstance(computed, float):
+        return abs((stored or 0) - (computed or 0)) < 1e-9
+    return stored == computed
+
+
+def check_dashboard_aggregates(fix=False):
+    """
+    Compares every user's stored dashboard row with the statistics computed from the source
+    tables. Returns the ids of users whose rows are missing or stale; with `fix`, rebuilds them.
+    """
+    stale = []
+    for (user_id,) in db.session.query(User.id).all():
+        aggregate = db.session.get(DashboardAggregate, user_id)
+        computed = compute_dashboard(user_id)
+        if not aggregate or not all(_same(getattr(aggregate, field), value) for field, value in computed.items()):
+            stale.append(user_id)
+            if fix:
+                refresh_dashboard_aggregate(user_id)
+    if fix:
+        db.session.commit()
+    return stale
+
+
+@app.cli.command('check-dashboards')
+@click.option('--fix', is_flag=True, help='Rebuild the rows that are missing or stale.')
+def check_dashboards_command(fix):
+    """Checks the materialized dashboard rows against the source tables."""
+    stale = check_dashboard_aggregates(fix=fix)
+    if not stale:
+        click.echo('All dashboard aggregates are consistent.')
+    else:
+        click.echo(f"{'Rebuilt' if fix else 'Stale'} dashboard aggregates for users: {', '.join(map(str, stale))}")
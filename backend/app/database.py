@@ -0,0 +1,20 @@
+"""
+Connection setup for SQLite.
+
+Every new SQLite connection gets the `SQLITE_PRAGMAS` from the config (WAL journal,
+synchronous=NORMAL, busy timeout, memory-mapped reads). Other databases are left alone.
+"""
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config.get('SQLITE_PRAGMAS', {}).items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
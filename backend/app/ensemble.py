@@ -0,0 +1,48 @@
+"""
+Ensemble analysis: every review is classified by several models over the same vectors (see
+`classify_batch` with a tuple of model names), and combined into a majority vote.
+"""
+from collections import Counter
+
+
+def sentiment_counts(labels):
+    counts = Counter(labels)
+    return {
+        'positive_reviews': counts['Positive'],
+        'negative_reviews': counts['Negative'],
+        'neutral_reviews': len(labels) - counts['Positive'] - counts['Negative'],
+    }
+
+
+def majority_vote(labels_by_model, model_names):
+    """
+    The label most models gave. Ties go to the first model in `model_names` (the model the
+    analysis was requested with) that voted for one of the tied labels.
+    """
+    counts = Counter(labels_by_model[name] for name in model_names)
+    top = max(counts.values())
+    return next(labels_by_model[name] for name in model_names if counts[labels_by_model[name]] == top)
+
+
+def ensemble_report(model_names, predictions):
+    """
+    Returns the majority label of each review and the comparison of the models: their
+    sentiment counts and how often each agrees with the majority, the majority's counts, and
+    the agreement rate (the share of reviews all models classified the same).
+    """
+    majorities = [majority_vote(labels, model_names) for labels in predictions]
+    total = len(predictions) or 1
+    models = {}
+    for name in model_names:
+        labels = [labels_by_model[name] for labels_by_model in predictions]
+        models[name] = {
+            **sentiment_counts(labels),
+            'agreement_with_majority': round(sum(a == b for a, b in zip(labels, majorities)) / total, 4),
+        }
+    unanimous = sum(len(set(labels.values())) == 1 for labels in predictions)
+    report = {
+        'models': models,
+        'majority': sentiment_counts(majorities),
+        'agreement_rate': round(unanimous / total, 4),
+    }
+    return majorities, report
@@ -0,0 +1,286 @@
+"""
+Page fetching for the scrapers.
+
+The review pages of both marketplaces are rendered on the server, so they are fetched over
+plain HTTP from a pool of keep-alive connections (urllib3, which Selenium already depends
+on), several at a time. A page is only loaded in headless Chrome when it needs a browser:
+a sign-in redirect, a captcha or robot check, or a page without the markup it should have
+(rendered by JavaScript). The Chrome session is started on the first such page and shared
+by the scrape, and the cookies it ends up with (after signing in) are copied to the HTTP
+client, so the next pages are fetched over HTTP again. The browser does not load images,
+stylesheets, fonts or trackers (see `browser_profile`).
+
+A fetcher given a `session` name starts from the cookies saved under it (app/session_store.py),
+and saves the ones the browser has after signing in. Its first HTTP request checks them
+for free: when they are still signed in, no page is redirected to the sign-in page and
+Chrome is not started at all.
+
+`SCRAPE_FETCHER=browser` loads every page in Chrome, as the scrapers used to.
+"""
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urljoin
+from app import app
+from app.session_store import load_session, save_session
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-IN,en;q=0.9',
+}
+
+# Answers the marketplaces give automated clients instead of the page
+BLOCKED_STATUSES = (403, 429, 503)
+CAPTCHA_MARKERS = ('/errors/validateCaptcha', 'Enter the characters you see below', 'g-recaptcha', 'Are you a human')
+
+
+class FetchError(Exception):
+    pass
+
+
+class Page:
+    def __init__(self, url, status, text, final_url=None, via='http'):
+        self.url = url
+        self.status = status
+        self.text = text
+        self.final_url = final_url or url
+        self.via = via
+
+
+def browser_reason(page, expect=None):
+    """Why the page has to be loaded in a browser instead, or None when it does not."""
+    if '/ap/signin' in page.final_url:
+        return 'sign-in'
+    if page.status in BLOCKED_STATUSES or any(marker in page.text for marker in CAPTCHA_MARKERS):
+        return 'captcha'
+    if page.status == 200 and expect and expect not in page.text:
+        return 'rendered by JavaScript'
+    return None
+
+
+# What the scraping browser does not load: the scrapers only read the review markup, so images,
+# stylesheets, web fonts, media and the marketplaces' ad and analytics requests are blocked
+# (patterns of CDP Network.setBlockedURLs, where * matches anything)
+BLOCKED_URLS = (
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.mp4', '*.webm',
+    '*google-analytics.com*', '*googletagmanager.com*', '*/gtag/js*', '*doubleclick.net*', '*facebook.net*',
+    '*amazon-adsystem.com*', '*fls-eu.amazon.*', '*unagi.amazon.*', '*rome.api.flipkart.com*',
+)
+CHROME_ARGUMENTS = (
+    '--headless', '--disable-gpu', '--no-sandbox', '--disable-dev-shm-usage', '--window-size=1920x1080',
+    '--disable-extensions', '--disable-infobars', f'user-agent={USER_AGENT}',
+)
+# Chrome features a scrape has no use for
+IDLE_ARGUMENTS = (
+    '--blink-settings=imagesEnabled=false', '--disable-background-networking', '--disable-component-update',
+    '--disable-sync', '--disable-default-apps', '--no-first-run', '--mute-audio',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication',
+)
+# Content settings: 2 blocks
+BLOCKING_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+    'profile.default_content_setting_values.notifications': 2,
+    'profile.default_content_setting_values.geolocation': 2,
+    'profile.default_content_setting_values.media_stream': 2,
+    'profile.default_content_setting_values.popups': 2,
+}
+
+
+def browser_profile(**overrides):
+    """
+    How the scraping browser is set up, from SCRAPE_BLOCK_RESOURCES and SCRAPE_BLOCKED_URLS,
+    with a scraper's `overrides`: `block_resources` (False loads everything), `blocked_urls`
+    (replacing the patterns), `allowed_urls` (patterns taken out of them), `arguments` and
+    `prefs` (added to the Chrome ones).
+    """
+    profile = {
+        'block_resources': app.config['SCRAPE_BLOCK_RESOURCES'],
+        'blocked_urls': BLOCKED_URLS + tuple(app.config['SCRAPE_BLOCKED_URLS']),
+        'allowed_urls': (),
+        'arguments': (),
+        'prefs': {},
+    }
+    unknown = set(overrides) - set(profile)
+    if unknown:
+        raise TypeError(f"Unknown browser profile setting {', '.join(sorted(unknown))}")
+    profile.update(overrides)
+    return profile
+
+
+def create_chrome_driver(profile=None):
+    """Headless Chrome as the scrapers use it, set up by a `browser_profile()`."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    profile = profile or browser_profile()
+    chrome_options = Options()
+    arguments = CHROME_ARGUMENTS + (IDLE_ARGUMENTS if profile['block_resources'] else ()) + tuple(profile['arguments'])
+    for argument in arguments:
+        chrome_options.add_argument(argument)
+    prefs = dict(BLOCKING_PREFS) if profile['block_resources'] else {}
+    prefs.update(profile['prefs'])
+    if prefs:
+        chrome_options.add_experimental_option('prefs', prefs)
+    service = Service("/usr/bin/chromedriver")  # Adjust path as needed
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    blocked_urls = [url for url in profile['blocked_urls'] if url not in profile['allowed_urls']]
+    if profile['block_resources'] and blocked_urls:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+    return driver
+
+
+class HttpClient:
+    """Keep-alive connection pool with at most `concurrency` connections per host, and the session's cookies."""
+
+    def __init__(self, concurrency, timeout, retries):
+        import urllib3
+        self.pool = urllib3.PoolManager(
+            maxsize=concurrency,
+            block=True,
+            timeout=urllib3.Timeout(connect=min(timeout, 10), read=timeout),
+            retries=urllib3.Retry(total=retries, backoff_factor=0.5, status_forcelist=(500, 502, 504), raise_on_status=False),
+        )
+        self.cookies = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        headers = HEADERS
+        with self.lock:
+            if self.cookies:
+                headers = dict(HEADERS, Cookie='; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+        try:
+            response = self.pool.request('GET', url, headers=headers)
+        except Exception as e:
+            raise FetchError(f'Fetching {url} failed: {e}') from e
+        cookies = {}
+        for header in response.headers.getlist('Set-Cookie'):
+            cookies.update((name, morsel.value) for name, morsel in SimpleCookie(header).items())
+        self.update_cookies(cookies)
+        return Page(url, response.status, response.data.decode('utf-8', errors='replace'), urljoin(url, response.url or url))
+
+    def update_cookies(self, cookies):
+        with self.lock:
+            self.cookies.update(cookies)
+
+    def close(self):
+        self.pool.clear()
+
+
+class Fetcher:
+    """
+    Fetches the pages of one scrape: over HTTP, `SCRAPE_CONCURRENCY` at a time, falling back
+    to a shared Chrome session for the pages that need one. `sign_in(driver)` is called when
+    the browser lands on a sign-in page, and every page the browser loads is given
+    `page_wait` seconds to settle; `browser` overrides the `browser_profile()` settings.
+    `session` names the saved session to sign in with. Close it when the scrape is done.
+    """
+
+    def __init__(self, sign_in=None, page_wait=0, browser=None, session=None):
+        self.mode = app.config['SCRAPE_FETCHER']
+        self.concurrency = app.config['SCRAPE_CONCURRENCY'] if self.mode == 'http' else 1
+        self.timeout = app.config['SCRAPE_TIMEOUT']
+        self.http = HttpClient(self.concurrency, self.timeout, app.config['SCRAPE_RETRIES']) if self.mode == 'http' else None
+        self.sign_in = sign_in
+        self.page_wait = page_wait
+        self.browser = browser_profile(**(browser or {}))
+        self.session = session
+        self.session_cookies = load_session(session) if session else None
+        if self.session_cookies and self.http:
+            self.http.update_cookies({cookie['name']: cookie['value'] for cookie in self.session_cookies})
+        self.driver = None
+        self.browser_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='fetcher')
+        self.pages = Counter()  # pages fetched, by 'http' and 'browser'
+        self.pages_lock = threading.Lock()
+
+    def fetch(self, url, expect=None):
+        """
+        The page at `url`. `expect` is markup the page has when it was rendered on the server;
+        the browser waits up to SCRAPE_TIMEOUT seconds for it to appear.
+        """
+        if self.http:
+            page = self.http.get(url)
+            reason = browser_reason(page, expect)
+            if reason is None:
+                with self.pages_lock:
+                    self.pages['http'] += 1
+                return page
+            app.logger.info(f'Loading {url} in Chrome: {reason}')
+        return self.fetch_in_browser(url, expect)
+
+    def fetch_in_browser(self, url, expect=None):
+        # One Chrome session per scrape, which can only load one page at a time
+        with self.browser_lock:
+            if self.driver is None:
+                self.driver = create_chrome_driver(self.browser)
+                if self.session_cookies:
+                    self.restore_browser_session(url)
+            self.driver.get(url)
+            time.sleep(self.page_wait)
+            if '/ap/signin' in self.driver.current_url and self.sign_in:
+                if self.session_cookies:
+                    app.logger.info(f'The saved session of {self.session} is signed out, signing in again')
+                self.sign_in(self.driver)
+                cookies = self.driver.get_cookies()
+                if self.http:
+                    self.http.update_cookies({cookie['name']: cookie['value'] for cookie in cookies})
+                if self.session:
+                    save_session(self.session, cookies)
+                    self.session_cookies = cookies
+            deadline = time.monotonic() + self.timeout
+            while expect and expect not in self.driver.page_source and time.monotonic() < deadline:
+                time.sleep(0.25)
+            with self.pages_lock:
+                self.pages['browser'] += 1
+            return Page(url, 200, self.driver.page_source, self.driver.current_url, via='browser')
+
+    def restore_browser_session(self, url):
+        # Chrome only takes the cookies of the site it is on, so it opens the site first
+        self.driver.get(url)
+        for cookie in self.session_cookies:
+            try:
+                self.driver.add_cookie({key: value for key, value in cookie.items()
+                                        if key in ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')})
+            except Exception as e:
+                app.logger.info(f"Skipping the saved cookie {cookie['name']}: {e}")
+
+    def map(self, func, items):
+        """Runs `func` over the items on the fetcher's threads, returning the results in order."""
+        return self.executor.map(func, items)
+
+    def fetch_pages(self, page_url, parse, max_pages, expect=None, window=None):
+        """
+        Fetches and parses pages 1, 2, ... of a paginated listing, where `page_url(n)` is the URL
+        of page n and `parse(page)` returns (result, whether there is a next page). Yields the
+        results up to the last page. `window` pages are fetched and parsed at a time on the
+        fetcher's threads (the fetcher's concurrency by default; pass 1 when calling from one
+        of them), so up to `window - 1` pages past the last one are fetched for nothing.
+        """
+        window = window or self.concurrency
+
+        def fetch_and_parse(number):
+            return parse(self.fetch(page_url(number), expect))
+
+        number = 1
+        while number <= max_pages:
+            numbers = range(number, min(number + window, max_pages + 1))
+            for result, has_next in (self.map(fetch_and_parse, numbers) if window > 1 else map(fetch_and_parse, numbers)):
+                yield result
+                if not has_next:
+                    return
+            number += window
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.http:
+            self.http.close()
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
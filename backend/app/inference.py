@@ -0,0 +1,269 @@
+"""
+Inference service: a fixed pool of worker processes holding the sentiment models.
+
+Request threads submit texts with `inference_pool.submit(texts, model_name)` and get a
+future for the predicted labels (or labels and decision scores, with `scores=True`; or the
+labels of several models, with a tuple of model names). Texts
+are preprocessed in the workers too with `preprocess=True`. Submissions are split into chunks of at most
+`INFERENCE_MAX_BATCH_SIZE` texts and queued; a dispatcher thread takes chunks for the same
+model and options from the queue and sends them to a worker process as one micro-batch. It waits up
+to `INFERENCE_MAX_WAIT` seconds for a batch to fill, and only forms a batch when a worker
+is free, so under load concurrent requests share batches instead of each running its own
+small predict calls, and large analyses are interleaved with small ones.
+
+`INFERENCE_PROCESSES=0` runs the batches on a single thread in the calling process instead
+(development, platforms without multiprocessing). `inference_pool.stats()` reports the
+queue depth and a histogram of batch sizes.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from app import app
+from app.metrics import Gauge, Histogram
+from app.model_store import get_models
+from app.tasks import preprocess_text
+
+
+def classify_batch(model_name, texts, preprocess=False, scores=False):
+    """
+    Runs in a worker process: predicts the labels of a batch of texts. With `scores`, returns
+    `{'label', 'scores'}` per text instead, the scores being the model's decision function by
+    class (None for models without one). With a tuple of model names, the texts are vectorized
+    once and every model predicts them, giving `{model_name: label}` per text.
+    """
+    models = get_models()
+    if preprocess:
+        texts = [preprocess_text(text) for text in texts]
+    vectors = models.vectorizer.transform(texts)
+    if isinstance(model_name, tuple):
+        predictions = [models.models[name].predict(vectors) for name in model_name]
+        return [
+            {name: str(label) for name, label in zip(model_name, labels)} for labels in zip(*predictions)
+        ]
+
+    model = models.models[model_name]
+    labels = [str(label) for label in model.predict(vectors)]
+    if not scores:
+        return labels
+    if not hasattr(model, 'decision_function'):
+        return [{'label': label, 'scores': None} for label in labels]
+
+    classes = [str(label) for label in model.classes_]
+    decision = model.decision_function(vectors)
+    if decision.ndim == 1:
+        # Two classes: one score, positive for the second class
+        decision = decision[:, None] * [-1, 1]
+    return [
+        {'label': label, 'scores': {cls: round(float(score), 6) for cls, score in zip(classes, row)}}
+        for label, row in zip(labels, decision)
+    ]
+
+
+def _load_models():
+    # Worker process initializer, so the first batch does not pay for loading the models
+    get_models()
+
+
+class _Chunk:
+    def __init__(self, key, texts, future):
+        self.key = key  # (model_name, preprocess, scores): only chunks with the same key share a batch
+        self.texts = texts
+        self.future = future
+
+
+class InferencePool:
+    def __init__(self, processes=2, max_batch_size=256, max_wait=0.01):
+        self.processes = processes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.slots = threading.Semaphore(max(processes, 1))
+        self.executor = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        # Histogram buckets: batch sizes up to 1, 2, 4, ... max_batch_size
+        self.bucket_bounds = [2 ** i for i in range(max_batch_size.bit_length()) if 2 ** i < max_batch_size] + [max_batch_size]
+        self.bucket_counts = [0] * len(self.bucket_bounds)
+        self.batches = 0
+        self.texts = 0
+        self.running = 0
+
+    def submit(self, texts, model_name, preprocess=False, scores=False):
+        """Queues texts for classification. Returns a Future resolving to their results, in order."""
+        self._ensure_started()
+        texts = list(texts)
+        future = Future()
+        if not texts:
+            future.set_result([])
+            return future
+
+        chunks = [
+            _Chunk((model_name, preprocess, scores), texts[start:start + self.max_batch_size], Future())
+            for start in range(0, len(texts), self.max_batch_size)
+        ]
+        _gather(future, [chunk.future for chunk in chunks])
+        with self.condition:
+            self.pending.extend(chunks)
+            self.condition.notify()
+        return future
+
+    def predict(self, texts, model_name, preprocess=False, scores=False):
+        return self.submit(texts, model_name, preprocess, scores).result()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'processes': self.processes,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': sum(len(chunk.texts) for chunk in self.pending),
+                'queued_chunks': len(self.pending),
+                'running_batches': self.running,
+                'batches': self.batches,
+                'texts': self.texts,
+                # Number of batches by size, keyed by the bucket's upper bound
+                'batch_size_histogram': {
+                    str(bound): count for bound, count in zip(self.bucket_bounds, self.bucket_counts)
+                },
+            }
+
+    def _ensure_started(self):
+        with self.lock:
+            # A forked worker process inherits the object but not the thread or the pool
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.executor = self._new_executor()
+                self.thread = threading.Thread(target=self._dispatch, name='inference-dispatcher', daemon=True)
+                self.thread.start()
+
+    def _new_executor(self):
+        if self.processes == 0:
+            return ThreadPoolExecutor(max_workers=1, initializer=_load_models)
+        # Spawned rather than forked: the workers map the model package themselves, and
+        # forking a process that runs request threads is not safe
+        return ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'), initializer=_load_models
+        )
+
+    def _pending_texts(self, key):
+        return sum(len(chunk.texts) for chunk in self.pending if chunk.key == key)
+
+    def _next_batch(self):
+        with self.condition:
+            while not self.pending:
+                self.condition.wait()
+            key = self.pending[0].key
+            deadline = time.monotonic() + self.max_wait
+            while self._pending_texts(key) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+
+            batch, size = [], 0
+            for chunk in list(self.pending):
+                if chunk.key != key:
+                    continue
+                if batch and size + len(chunk.texts) > self.max_batch_size:
+                    break
+                self.pending.remove(chunk)
+                batch.append(chunk)
+                size += len(chunk.texts)
+            return key, batch
+
+    def _dispatch(self):
+        while True:
+            # Only form a batch once a worker is free, so waiting chunks can be combined
+            self.slots.acquire()
+            key, batch = self._next_batch()
+            batch = [chunk for chunk in batch if chunk.future.set_running_or_notify_cancel()]
+            if not batch:
+                self.slots.release()
+                continue
+
+            with self.condition:
+                self.running += 1
+            texts = [text for chunk in batch for text in chunk.texts]
+            executor = self.executor
+            try:
+                result = executor.submit(classify_batch, key[0], texts, *key[1:])
+            except Exception as e:  # The pool is broken or could not start its processes
+                self._finish(executor, batch, error=e)
+                continue
+            result.add_done_callback(lambda result, batch=batch, executor=executor: self._finish(executor, batch, result))
+
+    def _record(self, size):
+        # Only batches that were classified are counted, without the chunks cancelled before
+        with self.condition:
+            self.batches += 1
+            self.texts += size
+            for i, bound in enumerate(self.bucket_bounds):
+                if size <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+        batch_size_metric.observe(size)
+
+    def _finish(self, executor, batch, result=None, error=None):
+        with self.condition:
+            self.running -= 1
+        if error is None:
+            error = result.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; the batches after it get a fresh pool
+            with self.lock:
+                if self.executor is executor:
+                    self.executor = self._new_executor()
+        self.slots.release()
+        if error is not None:
+            for chunk in batch:
+                chunk.future.set_exception(error)
+            return
+        results = result.result()
+        self._record(len(results))
+        start = 0
+        for chunk in batch:
+            chunk.future.set_result(results[start:start + len(chunk.texts)])
+            start += len(chunk.texts)
+
+
+def _gather(future, parts):
+    """Resolves `future` with the concatenated results of `parts` once they are all done."""
+    future.set_running_or_notify_cancel()
+    remaining = [len(parts)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        error = next((part.exception() for part in parts if part.exception()), None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result([item for part in parts for item in part.result()])
+
+    for part in parts:
+        part.add_done_callback(done)
+
+
+batch_size_metric = Histogram(
+    'sentimentscout_inference_batch_size', 'Texts per batch classified by the inference pool.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+
+inference_pool = InferencePool(
+    processes=app.config.get('INFERENCE_PROCESSES', 2),
+    max_batch_size=app.config.get('INFERENCE_MAX_BATCH_SIZE', 256),
+    max_wait=app.config.get('INFERENCE_MAX_WAIT', 0.01),
+)
+Gauge('sentimentscout_inference_queue_depth', 'Texts waiting for the inference pool.',
+      lambda: inference_pool.stats()['queue_depth'])
+Gauge('sentimentscout_inference_running_batches', 'Batches being classified by the inference pool.',
+      lambda: inference_pool.running)
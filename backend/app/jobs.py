@@ -0,0 +1,285 @@
+"""
+Job queue for worker processes.
+
+With JOB_EXECUTOR=worker the API processes do not scrape or analyse themselves: they add
+a job to the `jobs` table and hand it to a broker, and `python -m app.worker` processes
+(see app/worker.py), on this machine or others, take the jobs from the broker and run
+them. The table is the record of every job, its status and its result, whichever broker
+delivers it:
+
+    DatabaseBroker   (JOB_BROKER_URL unset) workers claim queued rows of the table itself:
+                     SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL and MySQL, and on SQLite,
+                     whose writes are serialized anyway, a conditional UPDATE that only one
+                     worker can win
+    KombuBroker      (JOB_BROKER_URL=redis://... or amqp://...) job ids go through a queue per
+                     kind of job; needs kombu, and redis for a Redis URL
+
+A worker holds a lease on each job it runs and renews it every TASK_HEARTBEAT_INTERVAL
+seconds. A running job whose lease expired belongs to a worker that died; any worker puts
+it back in the queue, up to TASK_MAX_ATTEMPTS runs, or fails it. A worker acknowledges a
+message of the KombuBroker only once it has claimed its job, so the broker delivers it
+again when the worker dies before. A message can still be lost with the broker, or not be
+sent when publishing fails after the job was added: a job still queued JOB_REPUBLISH_AFTER
+seconds after it was published is published again. The workers skip the duplicates, as
+only the first delivery of a job claims it.
+
+Job functions are registered per kind with `@job_handler(kind)`; they take the payload
+and return the job's result, which must be JSON serializable. A kind whose jobs stand for
+a record of their own, like the scraping task of a scrape, also registers an `on_failure`
+writer job that fails that record in the transaction failing the job, so the record never
+outlives a job that will not run again.
+"""
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select, update
+from app import app, db
+from app.models import Job, JobStatus
+from app.leases import lease_expiry
+from app.writer import write_serializer
+
+JOB_HANDLERS = {}
+JOB_FAILURE_HANDLERS = {}
+
+
+def job_handler(kind, on_failure=None):
+    """
+    Registers the function running the jobs of a kind, and optionally `on_failure(payload,
+    error)`, which runs in the writer transaction that fails one of them.
+    """
+    def register(func):
+        JOB_HANDLERS[kind] = func
+        if on_failure:
+            JOB_FAILURE_HANDLERS[kind] = on_failure
+        return func
+    return register
+
+
+def record_failure(job_id, error):
+    job = db.session.execute(select(Job.kind, Job.payload).where(Job.id == job_id)).first()
+    if job and job.kind in JOB_FAILURE_HANDLERS:
+        JOB_FAILURE_HANDLERS[job.kind](job.payload, error)
+
+
+def republish_time():
+    return datetime.now() + timedelta(seconds=app.config['JOB_REPUBLISH_AFTER'])
+
+
+def add_job(job_id, kind, payload, created_by):
+    db.session.add(Job(id=job_id, kind=kind, payload=payload, status=JobStatus.QUEUED, created_by=created_by,
+                       lease_expires_at=republish_time()))
+
+
+def claim_job(job_id, owner):
+    """Marks a queued job as run by `owner`. Returns whether it was still queued."""
+    return db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.QUEUED)
+        .values(status=JobStatus.RUNNING, owner=owner, lease_expires_at=lease_expiry(),
+                attempts=Job.attempts + 1, started_at=datetime.now())
+    ).rowcount == 1
+
+
+def claim_next_job(owner, kinds):
+    """Claims the oldest queued job of the kinds. Returns its id, or None."""
+    query = (select(Job.id).where(Job.status == JobStatus.QUEUED, Job.kind.in_(kinds))
+             .order_by(Job.created_at).limit(1))
+    if db.engine.dialect.name in ('postgresql', 'mysql', 'mariadb'):
+        # Rows locked by the claims of other workers are skipped instead of waited for
+        query = query.with_for_update(skip_locked=True)
+    job_id = db.session.execute(query).scalar()
+    if job_id is not None and claim_job(job_id, owner):
+        return job_id
+    return None
+
+
+def finish_job(job_id, owner, status, result=None, error=None):
+    # Only by the worker holding it: a job taken over after its lease expired is not finished twice
+    finished = db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.owner == owner, Job.status == JobStatus.RUNNING)
+        .values(status=status, result=result, error=error and error[:500], finished_at=datetime.now())
+    ).rowcount == 1
+    if finished and status == JobStatus.FAILED:
+        record_failure(job_id, error)
+
+
+def renew_job_leases(job_ids, owner):
+    db.session.execute(
+        update(Job)
+        .where(Job.id.in_(job_ids), Job.owner == owner, Job.status == JobStatus.RUNNING)
+        .values(lease_expires_at=lease_expiry())
+    )
+
+
+def release_job(job_id, now, max_attempts):
+    """Puts a running job whose lease expired back in the queue, or fails it. Returns its new status, or None."""
+    job = db.session.execute(
+        select(Job.attempts).where(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.lease_expires_at < now)
+    ).first()
+    if job is None:
+        return None
+    status = JobStatus.QUEUED if job.attempts < max_attempts else JobStatus.FAILED
+    values = {'status': status, 'owner': None, 'lease_expires_at': republish_time() if status == JobStatus.QUEUED else None}
+    if status == JobStatus.FAILED:
+        values.update(error=f'Abandoned after {job.attempts} interrupted runs', finished_at=datetime.now())
+    db.session.execute(update(Job).where(Job.id == job_id, Job.status == JobStatus.RUNNING).values(**values))
+    if status == JobStatus.FAILED:
+        record_failure(job_id, values['error'])
+    return status
+
+
+def renew_queued_job(job_id, now):
+    """Sets when a queued job not taken by then is published again. Returns whether it was due."""
+    return db.session.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatus.QUEUED,
+               or_(Job.lease_expires_at < now, Job.lease_expires_at.is_(None)))
+        .values(lease_expires_at=republish_time())
+    ).rowcount == 1
+
+
+class DatabaseBroker:
+    """Jobs are claimed from the jobs table itself; publishing is a no-op, the row is the message."""
+
+    def publish(self, job_id, kind):
+        pass
+
+    def claim(self, owner, kinds, timeout):
+        job_id = write_serializer.run(claim_next_job, owner, kinds)
+        if job_id is None:
+            time.sleep(timeout)
+        return job_id
+
+    def close(self):
+        pass
+
+
+class KombuBroker:
+    """Job ids go through a Redis or AMQP queue per kind of job; the jobs table keeps their state."""
+
+    def __init__(self, url):
+        try:
+            import kombu
+        except ImportError:
+            raise RuntimeError(f'JOB_BROKER_URL={url} needs kombu (and redis for a Redis URL): pip install kombu redis')
+        self.kombu = kombu
+        self.url = url
+        self.local = threading.local()  # kombu connections are not shared between threads
+
+    def queue(self, kind):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = self.kombu.Connection(self.url)
+            self.local.queues = {}
+        if kind not in self.local.queues:
+            self.local.queues[kind] = self.local.connection.SimpleQueue(f'sentimentscout.jobs.{kind}')
+        return self.local.queues[kind]
+
+    def publish(self, job_id, kind):
+        self.queue(kind).put({'job_id': job_id})
+
+    def claim(self, owner, kinds, timeout):
+        for kind in kinds:
+            try:
+                message = self.queue(kind).get(block=True, timeout=timeout / len(kinds))
+            except queue.Empty:
+                continue
+            try:
+                # A job published twice is delivered twice; only the first delivery claims it
+                claimed = write_serializer.run(claim_job, message.payload['job_id'], owner)
+            except Exception:
+                message.requeue()
+                raise
+            # Acknowledged once the job is claimed (or a duplicate): until then the broker
+            # delivers it again if this worker dies
+            message.ack()
+            if claimed:
+                return message.payload['job_id']
+        return None
+
+    def close(self):
+        if hasattr(self.local, 'connection'):
+            for simple_queue in self.local.queues.values():
+                simple_queue.close()
+            self.local.connection.release()
+            del self.local.connection
+
+
+def create_broker(url):
+    return KombuBroker(url) if url else DatabaseBroker()
+
+
+broker = create_broker(app.config.get('JOB_BROKER_URL'))
+
+
+def run_in_workers():
+    return app.config['JOB_EXECUTOR'] == 'worker'
+
+
+def enqueue_job(kind, payload, created_by=None, job_id=None):
+    """Queues a job for the workers. Returns its id."""
+    job_id = job_id or str(uuid.uuid4())
+    write_serializer.run(add_job, job_id, kind, payload, created_by)
+    broker.publish(job_id, kind)
+    return job_id
+
+
+def recover_jobs():
+    """
+    Requeues or fails the running jobs whose worker stopped renewing their lease, and with the
+    KombuBroker publishes again the queued jobs not taken in JOB_REPUBLISH_AFTER seconds.
+    Returns their ids.
+    """
+    now = datetime.now()
+    with app.app_context():
+        job_ids = db.session.scalars(
+            select(Job.id).where(Job.status == JobStatus.RUNNING, Job.lease_expires_at < now)
+        ).all()
+    recovered = []
+    for job_id in job_ids:
+        status = write_serializer.run(release_job, job_id, now, app.config['TASK_MAX_ATTEMPTS'])
+        if status is None:
+            continue
+        recovered.append(job_id)
+        app.logger.warning(f'Job {job_id} lost its worker: {status.name.lower()}')
+        if status == JobStatus.QUEUED:
+            with app.app_context():
+                kind = db.session.get(Job, job_id).kind
+            broker.publish(job_id, kind)
+    if isinstance(broker, KombuBroker):
+        # The database broker has no messages to lose: its workers claim the rows themselves
+        recovered.extend(republish_lost_jobs(now))
+    return recovered
+
+
+def republish_lost_jobs(now):
+    with app.app_context():
+        jobs = db.session.execute(
+            select(Job.id, Job.kind).where(Job.status == JobStatus.QUEUED,
+                                           or_(Job.lease_expires_at < now, Job.lease_expires_at.is_(None)))
+        ).all()
+    republished = []
+    for job in jobs:
+        # One conditional UPDATE, so only one of the workers sweeping publishes it
+        if write_serializer.run(renew_queued_job, job.id, now):
+            app.logger.warning(f'Job {job.id} was not taken from the queue in time: publishing it again')
+            broker.publish(job.id, job.kind)
+            republished.append(job.id)
+    return republished
+
+
+def wait_for_job(job_id, timeout, interval=0.25):
+    """
+    Polls the job until it finishes or `timeout` seconds pass. Returns its row (status, result,
+    error), or None if it is gone (deleted with its user's data).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        # A fresh connection, so every poll sees the workers' latest commits
+        with db.engine.connect() as conn:
+            job = conn.execute(select(Job.status, Job.result, Job.error).where(Job.id == job_id)).first()
+        if job is None or job.status in (JobStatus.COMPLETED, JobStatus.FAILED) or time.monotonic() >= deadline:
+            return job
+        time.sleep(interval)
@@ -0,0 +1,138 @@
+"""
+Leases on running scraping tasks.
+
+A scrape runs on a thread of the gunicorn worker that started it, so when the worker dies
+the thread dies with it and its task used to stay PENDING forever, which also kept the
+listing from ever being scraped again. Now every running task carries the id of the
+process running it (`owner`) and a lease that expires TASK_LEASE_SECONDS after it was last
+renewed. The lease keeper thread of each process (started with the process, by the gunicorn
+post_worker_init hook or run.py) renews the leases of the tasks it runs every
+TASK_HEARTBEAT_INTERVAL seconds, and then sweeps for running tasks whose lease has
+expired: their owner stopped heartbeating, so it is gone. A process claims such a task by
+taking its lease over in one conditional UPDATE (so only one of the workers gets it) and
+starts its scrape again, up to TASK_MAX_ATTEMPTS times, or fails it when
+TASK_ORPHAN_ACTION is 'fail'. The first sweep runs when the keeper starts, so the work of
+a process that died is picked up as soon as its leases run out.
+"""
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from app import app, db
+from app.models import ScrapingTask, Status
+from app.writer import write_serializer
+
+
+def worker_id():
+    # Computed on every call, as a forked worker inherits the module from the master
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def lease_expiry():
+    return datetime.now() + timedelta(seconds=app.config['TASK_LEASE_SECONDS'])
+
+
+def renew_leases(task_ids, owner):
+    db.session.execute(
+        update(ScrapingTask)
+        .where(ScrapingTask.id.in_(task_ids), ScrapingTask.owner == owner, ScrapingTask.status == Status.PENDING)
+        .values(lease_expires_at=lease_expiry())
+    )
+
+
+def claim_task(task_id, owner, now):
+    """Takes over the lease of a running task if it has expired. Returns the task's attempts, or None."""
+    claimed = db.session.execute(
+        update(ScrapingTask)
+        .where(ScrapingTask.id == task_id, ScrapingTask.status == Status.PENDING, ScrapingTask.lease_expires_at < now)
+        .values(owner=owner, lease_expires_at=lease_expiry(), attempts=ScrapingTask.attempts + 1)
+    ).rowcount
+    if claimed:
+        return db.session.execute(select(ScrapingTask.attempts).where(ScrapingTask.id == task_id)).scalar()
+    return None
+
+
+def recover_orphans():
+    """Restarts or fails the running tasks whose lease has expired. Returns the ids recovered."""
+    from app.tasks import SCRAPERS, set_task_status
+
+    now = datetime.now()
+    with app.app_context():
+        orphans = db.session.execute(
+            select(ScrapingTask.id, ScrapingTask.owner, ScrapingTask.platform, ScrapingTask.fsn_asin, ScrapingTask.product_id)
+            .where(ScrapingTask.status == Status.PENDING, ScrapingTask.lease_expires_at < now)
+        ).all()
+    recovered = []
+    for task in orphans:
+        attempts = write_serializer.run(claim_task, task.id, worker_id(), now)
+        if attempts is None:  # claimed by another worker, or finished meanwhile
+            continue
+        recovered.append(task.id)
+        owner = task.owner or 'a worker from before leases'
+        if app.config['TASK_ORPHAN_ACTION'] == 'requeue' and attempts <= app.config['TASK_MAX_ATTEMPTS']:
+            app.logger.warning(f'Restarting scraping task {task.id} of {owner} (attempt {attempts})')
+            threading.Thread(target=run_with_lease, args=(task.id, SCRAPERS[task.platform], task.fsn_asin, task.id, task.product_id)).start()
+        else:
+            app.logger.warning(f'Failing scraping task {task.id}: {owner} stopped running it')
+            write_serializer.run(set_task_status, task.id, Status.FAILED, f'Abandoned after {attempts - 1} interrupted attempts')
+    return recovered
+
+
+class TaskLeases:
+    def __init__(self, heartbeat_interval=30):
+        self.heartbeat_interval = heartbeat_interval
+        self.held = set()
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Also called by hold(), so a process that did not start it at startup has it while it scrapes
+        with self.lock:
+            # A forked worker process inherits the object but not the thread
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                if self.pid != os.getpid():
+                    self.held = set()  # the master's scrapes are not running here
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._work, name='task-leases', daemon=True)
+                self.thread.start()
+
+    @contextmanager
+    def hold(self, task_id):
+        """Keeps the task's lease renewed while the block runs."""
+        self.start()
+        with self.lock:
+            self.held.add(task_id)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.held.discard(task_id)
+
+    def heartbeat(self):
+        with self.lock:
+            task_ids = list(self.held)
+        if task_ids:
+            write_serializer.run(renew_leases, task_ids, worker_id())
+
+    def _work(self):
+        # The first sweep recovers the tasks of processes that died before this one started
+        while True:
+            try:
+                self.heartbeat()
+                recover_orphans()
+            except Exception:
+                app.logger.exception('Renewing scraping task leases failed')
+            time.sleep(self.heartbeat_interval)
+
+
+task_leases = TaskLeases(heartbeat_interval=app.config.get('TASK_HEARTBEAT_INTERVAL', 30))
+
+
+def run_with_lease(task_id, func, *args):
+    """Runs a scrape on the current thread, holding its task's lease."""
+    with task_leases.hold(task_id):
+        func(*args)
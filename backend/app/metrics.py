@@ -0,0 +1,249 @@
+"""
+Timing instrumentation and Prometheus metrics.
+
+Stages are timed with `timer('stage')` as a context manager, or `@timed('stage')` on a
+function. Each timing is recorded in the `sentimentscout_stage_seconds` histogram and,
+inside a request, listed in the response's `Server-Timing` header next to the request's
+total, so the browser's network panel shows where an analysis spent its time. Request
+latency per route, scrape pages, queue depths and cache hits are recorded as well, and
+`GET /metrics` serves all of it in the Prometheus text format.
+
+Metrics live in the process that records them: with several gunicorn workers, each of
+them serves its own numbers, so scrape every worker or run a single one behind /metrics.
+With `METRICS_ENABLED=false` timers are a shared no-op object and nothing is recorded.
+"""
+import threading
+import time
+from functools import wraps
+from flask import g, has_request_context, request
+from app import app
+
+# Latency buckets in seconds, from a cache hit to a long scrape
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Registry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry(app.config.get('METRICS_ENABLED', True))
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [f'{self.name}{_labels(self.labelnames, key)} {value}' for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        if not registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        lines = []
+        with self.lock:
+            for key, (counts, total, count) in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+                lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {total}')
+                lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Gauge(Metric):
+    """A value read when the metrics are collected: `read()` returns a number, or a dict of label values to numbers."""
+    type = 'gauge'
+
+    def __init__(self, name, help, read, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.read = read
+
+    def samples(self):
+        try:
+            value = self.read()
+        except Exception as e:
+            app.logger.warning(f'Reading metric {self.name} failed: {e}')
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [
+            f'{self.name}{_labels(self.labelnames, key if isinstance(key, tuple) else (key,))} {number}'
+            for key, number in value.items()
+        ]
+
+
+stage_seconds = Histogram('sentimentscout_stage_seconds', 'Time spent in a processing stage.', ['stage'])
+request_seconds = Histogram(
+    'sentimentscout_request_seconds', 'Request latency by route.', ['method', 'route', 'status']
+)
+scrape_pages = Counter('sentimentscout_scrape_pages_total', 'Review pages scraped.', ['platform'])
+scrape_pages_per_second = Histogram(
+    'sentimentscout_scrape_pages_per_second', 'Pages per second of completed scrapes.', ['platform'],
+    buckets=(0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50)
+)
+cache_lookups = Counter('sentimentscout_cache_lookups_total', 'Cache lookups by result.', ['cache', 'result'])
+
+
+def _cache_hit_ratios():
+    ratios = {}
+    for cache in sorted({key[0] for key in list(cache_lookups.values)}):
+        hits, misses = cache_lookups.get(cache=cache, result='hit'), cache_lookups.get(cache=cache, result='miss')
+        ratios[cache] = hits / (hits + misses) if hits + misses else 0
+    return ratios
+
+
+Gauge('sentimentscout_cache_hit_ratio', 'Share of cache lookups that hit, since the process started.', _cache_hit_ratios, ['cache'])
+
+
+class Timer:
+    """Times a stage as a context manager; see `timed` for functions."""
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.stage, time.perf_counter() - self.started)
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def timer(stage):
+    return Timer(stage) if registry.enabled else NULL_TIMER
+
+
+def timed(stage):
+    """Decorator timing every call of the function as `stage`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_stage(stage, seconds):
+    stage_seconds.observe(seconds, stage=stage)
+    if has_request_context():
+        g.setdefault('stage_timings', []).append((stage, seconds))
+
+
+class ScrapeMeter:
+    """Counts the pages of one scrape, and records its pages per second once it completes."""
+
+    def __init__(self, platform):
+        self.platform = platform.name.lower()
+        self.pages = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()  # pages are parsed on several threads
+
+    def page(self):
+        with self.lock:
+            self.pages += 1
+        scrape_pages.inc(platform=self.platform)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        if self.pages and elapsed > 0:
+            scrape_pages_per_second.observe(self.pages / elapsed, platform=self.platform)
+        record_stage(f'scrape_{self.platform}', elapsed)
+
+
+@app.before_request
+def start_request_timer():
+    if registry.enabled:
+        g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_seconds.observe(elapsed, method=request.method, route=route, status=response.status_code)
+    timings = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in g.get('stage_timings', [])]
+    timings.append(f'total;dur={elapsed * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
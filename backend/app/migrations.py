@@ -0,0 +1,240 @@
+"""
+Versioned schema migrations.
+
+`db.create_all()` only creates tables that do not exist yet, so new columns and data
+backfills for databases that already exist are applied here. Every migration runs
+exactly once, in version order, and is recorded in the `schema_migrations` table.
+Run them with `python init_db.py` (or `flask db-upgrade`); `flask db-status` lists them.
+"""
+import click
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, bindparam, inspect, select, text
+from app import app, db
+from app.models import Product, RawReview, Review, ScrapingTask, SentimentRollup, DashboardAggregate, PredictionCache, Status, Job
+from app.parsers import parse_rating, parse_review_date
+from app.rollups import rebuild_rollups
+
+BATCH_SIZE = 1000
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Registers a function taking a connection as the migration with the given version."""
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+def add_column(conn, column):
+    """Adds a model column (and any single-column index on it) to an existing table if missing."""
+    table = column.table
+    existing = {col['name'] for col in inspect(conn).get_columns(table.name)}
+    if column.name not in existing:
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    for index in table.indexes:
+        if column.name in index.columns:
+            index.create(conn, checkfirst=True)
+
+
+def upgrade():
+    """Applies all pending migrations in version order. Each migration runs in its own transaction."""
+    with app.app_context():
+        with db.engine.begin() as conn:
+            schema_migrations.create(conn, checkfirst=True)
+            applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+        for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+            if version in applied:
+                continue
+            with db.engine.begin() as conn:
+                func(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=version, description=description, applied_at=datetime.now()))
+            print(f'Applied migration {version}: {description}')
+
+
+def applied_versions():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            if not inspect(conn).has_table(schema_migrations.name):
+                return set()
+            return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def create_indexes(conn, *names):
+    """Creates the named indexes declared on the models, skipping those that already exist."""
+    indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+    for name in names:
+        indexes[name].create(conn, checkfirst=True)
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Creates missing tables and applies pending migrations."""
+    db.create_all()
+    upgrade()
+
+
+@app.cli.command('db-status')
+def db_status_command():
+    """Lists the migrations and whether they have been applied."""
+    applied = applied_versions()
+    for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+        click.echo(f"{version:>4}  {'applied' if version in applied else 'pending':<8} {description}")
+
+
+@migration(1, 'Typed rating and posted_on columns for reviews')
+def typed_review_columns(conn):
+    raw = RawReview.__table__
+    reviews = Review.__table__
+    tasks = ScrapingTask.__table__
+    add_column(conn, raw.c.rating_value)
+    add_column(conn, raw.c.posted_on)
+    add_column(conn, reviews.c.posted_on)
+
+    # Backfill raw reviews in batches. Relative dates ("11 months ago") are resolved
+    # against the creation time of the scraping task that fetched them.
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(raw.c.id, raw.c.platform, raw.c.rating, raw.c.date, tasks.c.created_at)
+            .select_from(raw.outerjoin(tasks, raw.c.task_id == tasks.c.id))
+            .where(raw.c.id > last_id)
+            .order_by(raw.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            raw.update().where(raw.c.id == bindparam('row_id')),
+            [
+                {
+                    'row_id': row.id,
+                    'rating_value': parse_rating(row.platform, row.rating),
+                    'posted_on': parse_review_date(row.platform, row.date, row.created_at),
+                }
+                for row in rows
+            ]
+        )
+        last_id = rows[-1].id
+
+    # Processed reviews carry the same date string as the raw review they came from,
+    # so reuse the already resolved date where possible.
+    matching_date = (
+        select(raw.c.posted_on)
+        .where(
+            raw.c.product_id == reviews.c.product_id,
+            raw.c.platform == reviews.c.source,
+            raw.c.date == reviews.c.review_date,
+            raw.c.posted_on.isnot(None),
+        )
+        .limit(1)
+        .scalar_subquery()
+    )
+    conn.execute(reviews.update().where(reviews.c.posted_on.is_(None)).values(posted_on=matching_date))
+
+    rows = conn.execute(
+        select(reviews.c.id, reviews.c.source, reviews.c.review_date)
+        .where(reviews.c.posted_on.is_(None), reviews.c.review_date.isnot(None))
+    ).all()
+    updates = [
+        {'row_id': row.id, 'posted_on': parse_review_date(row.source, row.review_date)}
+        for row in rows
+    ]
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(
+            reviews.update().where(reviews.c.id == bindparam('row_id')),
+            updates[start:start + BATCH_SIZE]
+        )
+
+
+@migration(2, 'Daily sentiment rollups')
+def sentiment_rollups(conn):
+    SentimentRollup.__table__.create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+
+@migration(3, 'Materialized dashboard aggregates')
+def dashboard_aggregates(conn):
+    # Rows are built on the first dashboard read of each user and kept up to date from then on
+    DashboardAggregate.__table__.create(conn, checkfirst=True)
+
+
+@migration(4, 'Composite indexes for the hot query patterns')
+def hot_query_indexes(conn):
+    create_indexes(
+        conn,
+        'ix_products_created_by',
+        'ix_product_platforms_product_id',
+        'ix_raw_reviews_product_platform',
+        'ix_raw_reviews_task_id',
+        'ix_reviews_product_source_sentiment',
+        'ix_reviews_product_id',
+        'ix_reviews_product_posted_on',
+        'ix_sentiment_summaries_product_platform',
+        'ix_scraping_tasks_created_by_status',
+        'ix_scraping_tasks_fsn_asin_status',
+    )
+
+
+@migration(5, 'Deleting flag for background product deletion')
+def product_deleting_flag(conn):
+    products = Product.__table__
+    add_column(conn, products.c.deleting)
+    conn.execute(products.update().where(products.c.deleting.is_(None)).values(deleting=False))
+
+
+@migration(6, 'Majority vote sentiment of ensemble analyses')
+def review_majority_sentiment(conn):
+    # Filled by the next ensemble analysis of each product
+    add_column(conn, Review.__table__.c.majority_sentiment)
+
+
+@migration(7, 'Persistent prediction cache')
+def prediction_cache(conn):
+    PredictionCache.__table__.create(conn, checkfirst=True)
+
+
+@migration(8, 'Single running scrape per listing, and scrape finish times')
+def scrape_coalescing(conn):
+    tasks = ScrapingTask.__table__
+    add_column(conn, tasks.c.finished_at)
+    # Only the newest running task of a listing is kept running, so the unique index can be built
+    pending = conn.execute(
+        select(tasks.c.id, tasks.c.platform, tasks.c.fsn_asin)
+        .where(tasks.c.status == Status.PENDING)
+        .order_by(tasks.c.created_at.desc())
+    ).all()
+    seen = set()
+    for task in pending:
+        if (task.platform, task.fsn_asin) in seen:
+            conn.execute(tasks.update().where(tasks.c.id == task.id).values(status=Status.FAILED, message='Superseded by a newer scrape'))
+        seen.add((task.platform, task.fsn_asin))
+    create_indexes(conn, 'ix_scraping_tasks_pending_listing')
+
+
+@migration(9, 'Leases on running scraping tasks')
+def scraping_task_leases(conn):
+    tasks = ScrapingTask.__table__
+    add_column(conn, tasks.c.owner)
+    add_column(conn, tasks.c.lease_expires_at)
+    add_column(conn, tasks.c.attempts)
+    conn.execute(tasks.update().where(tasks.c.attempts.is_(None)).values(attempts=1))
+    # Tasks left running by the old code have no owner; the first sweep recovers them
+    conn.execute(tasks.update().where(tasks.c.status == Status.PENDING).values(lease_expires_at=datetime.now()))
+    create_indexes(conn, 'ix_scraping_tasks_status_lease')
+
+
+@migration(10, 'Job queue for worker processes')
+def job_queue(conn):
+    Job.__table__.create(conn, checkfirst=True)
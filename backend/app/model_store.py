@@ -0,0 +1,330 @@
+"""
+Sentiment model storage.
+
+`models.p` pickles a scikit-learn TfidfVectorizer and the classifiers. Unpickling it gives
+every worker process a private copy of the vocabulary dict and the model arrays, and the
+linear SVC carries all of its sparse support vectors. The model package is a directory
+holding the same model as plain `.npy` arrays plus a `manifest.json`:
+
+    vocabulary_terms.npy   the n-gram terms, sorted (fixed width unicode)
+    vocabulary_index.npy   feature index of each sorted term
+    idf.npy                idf weights
+    <model>_coef.npy       linear weights, one row per class (or class pair for the SVC)
+    <model>_intercept.npy
+
+The arrays are loaded with `np.load(mmap_mode='r')`, so their pages live in the OS page
+cache and are shared by all workers instead of being copied into each of them. Terms are
+looked up with a binary search over the sorted array, so no vocabulary dict is built and
+scikit-learn is not imported at all. With gunicorn `--preload` the package is loaded once
+in the master process (see gunicorn.conf.py) and the workers inherit it.
+
+Convert an existing pickle with `python convert_model.py models.p models`. The package is
+only loaded while it matches the pickle: after models.p is replaced, the pickle is loaded
+instead until the package is converted again.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import numpy as np
+from app import app
+from app.metrics import timed
+
+FORMAT_VERSION = 1
+
+# TfidfVectorizer settings the package reproduces; the converter rejects anything else
+VECTORIZER_DEFAULTS = {
+    'input': 'content', 'strip_accents': None, 'preprocessor': None, 'tokenizer': None,
+    'analyzer': 'word', 'stop_words': None, 'binary': False,
+}
+
+
+class MappedVectorizer:
+    """TF-IDF transform equivalent to the fitted TfidfVectorizer, over memory-mapped arrays."""
+
+    def __init__(self, terms, index, idf, params):
+        self.terms = terms
+        self.index = index
+        self.idf = idf
+        self.lowercase = params['lowercase']
+        self.token_pattern = re.compile(params['token_pattern'])
+        self.ngram_range = tuple(params['ngram_range'])
+        self.norm = params['norm']
+        self.sublinear_tf = params['sublinear_tf']
+        self.n_features = len(terms)
+
+    def analyze(self, doc):
+        """Word n-grams of a document, as produced by scikit-learn's word analyzer."""
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self.token_pattern.findall(doc)
+        min_n, max_n = self.ngram_range
+        ngrams = []
+        for n in range(min_n, min(max_n, len(tokens)) + 1):
+            ngrams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+    def transform(self, docs):
+        from scipy import sparse
+
+        rows, ngrams = [], []
+        for row, doc in enumerate(docs):
+            doc_ngrams = self.analyze(doc)
+            ngrams.extend(doc_ngrams)
+            rows.extend([row] * len(doc_ngrams))
+
+        # Look each distinct n-gram up once in the sorted terms
+        distinct = np.array(list(dict.fromkeys(ngrams)) or [''])
+        positions = np.searchsorted(self.terms, distinct)
+        positions[positions >= self.n_features] = 0
+        found = self.terms[positions] == distinct
+        column_of = dict(zip(distinct[found].tolist(), self.index[positions[found]].tolist()))
+        entries = [(row, column_of[ngram]) for row, ngram in zip(rows, ngrams) if ngram in column_of]
+        rows, columns = zip(*entries) if entries else ((), ())
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(columns)), (rows, columns)), shape=(len(docs), self.n_features)
+        )
+        matrix.sum_duplicates()
+        matrix.sort_indices()
+        if self.sublinear_tf:
+            np.log(matrix.data, matrix.data)
+            matrix.data += 1
+        if self.idf is not None:
+            matrix.data *= self.idf[matrix.indices]
+        if self.norm:
+            if self.norm == 'l2':
+                norms = np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1
+            else:
+                norms = abs(matrix).sum(axis=1).A1
+            norms[norms == 0] = 1
+            matrix.data /= np.repeat(norms, np.diff(matrix.indptr))
+        return matrix
+
+
+class LinearModel:
+    """
+    Prediction for a fitted linear classifier from its weights.
+
+    `scheme` is 'ovr' for one weight row per class (LogisticRegression), or 'ovo' for one
+    row per class pair voted on like libsvm does (SVC with a linear kernel).
+    """
+
+    def __init__(self, coef, intercept, classes, scheme):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = classes
+        self.scheme = scheme
+
+    def _scores(self, X):
+        return np.asarray(X @ self.coef.T) + self.intercept
+
+    def decision_function(self, X):
+        """Per-class scores, shaped (n_samples, n_classes), or (n_samples,) for two classes."""
+        scores = self._scores(X)
+        if len(self.classes_) == 2:
+            return scores.ravel()
+        if self.scheme == 'ovo':
+            return ovr_from_ovo(scores, len(self.classes_))
+        return scores
+
+    def predict(self, X):
+        scores = self._scores(X)
+        if len(self.classes_) == 2:
+            return self.classes_[(scores.ravel() > 0).astype(int)]
+        if self.scheme == 'ovo':
+            return self.classes_[np.argmax(ovo_votes(scores, len(self.classes_)), axis=1)]
+        return self.classes_[np.argmax(scores, axis=1)]
+
+
+def class_pairs(n_classes):
+    return [(i, j) for i in range(n_classes) for j in range(i + 1, n_classes)]
+
+
+def ovo_votes(scores, n_classes):
+    votes = np.zeros((scores.shape[0], n_classes))
+    for k, (i, j) in enumerate(class_pairs(n_classes)):
+        votes[scores[:, k] > 0, i] += 1
+        votes[scores[:, k] <= 0, j] += 1
+    return votes
+
+
+def ovr_from_ovo(scores, n_classes):
+    """Vote counts plus bounded confidences, like SVC's decision_function_shape='ovr'."""
+    confidences = np.zeros((scores.shape[0], n_classes))
+    for k, (i, j) in enumerate(class_pairs(n_classes)):
+        confidences[:, i] += scores[:, k]
+        confidences[:, j] -= scores[:, k]
+    return ovo_votes(scores, n_classes) + confidences / (3 * (np.abs(confidences) + 1))
+
+
+class ModelBundle:
+    """The vectorizer and the classifiers by name, plus a version identifying the model file."""
+
+    def __init__(self, vectorizer, models, version):
+        self.vectorizer = vectorizer
+        self.models = models
+        self.version = version
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_version(path):
+    """The version of a model pickle: the start of its SHA-256."""
+    return file_sha256(path)[:12]
+
+
+def load_pickle(path, version=None):
+    """Loads the legacy `models.p` (scikit-learn objects, one private copy per process)."""
+    import pickle
+    with open(path, 'rb') as f:
+        model_data = pickle.load(f)
+    vectorizer = model_data.pop('vectorizer')
+    return ModelBundle(vectorizer, model_data, version or model_version(path))
+
+
+def load_package(path):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model package format {manifest['format_version']} in {path}")
+
+    def array(name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+    params = manifest['vectorizer']
+    vectorizer = MappedVectorizer(
+        array('vocabulary_terms'), array('vocabulary_index'),
+        array('idf') if params['use_idf'] else None, params
+    )
+    models = {
+        name: LinearModel(array(f'{name}_coef'), array(f'{name}_intercept'), np.array(model['classes'], dtype=object), model['scheme'])
+        for name, model in manifest['models'].items()
+    }
+    return ModelBundle(vectorizer, models, manifest['version'])
+
+
+def convert_pickle(source, destination, check_docs=None):
+    """
+    Writes the model package for the pickled models at `source` into `destination`, then
+    checks that the package reproduces the original vectors and predictions. Returns the
+    manifest.
+    """
+    import pickle
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC
+
+    with open(source, 'rb') as f:
+        model_data = pickle.load(f)
+    vectorizer = model_data['vectorizer']
+    if not isinstance(vectorizer, TfidfVectorizer):
+        raise ValueError(f'Unsupported vectorizer {type(vectorizer).__name__}')
+    for name, default in VECTORIZER_DEFAULTS.items():
+        if getattr(vectorizer, name) != default:
+            raise ValueError(f'Unsupported vectorizer setting {name}={getattr(vectorizer, name)!r}')
+
+    os.makedirs(destination, exist_ok=True)
+
+    def save(name, value):
+        np.save(os.path.join(destination, name + '.npy'), value)
+
+    terms = sorted(vectorizer.vocabulary_)
+    save('vocabulary_terms', np.array(terms))
+    save('vocabulary_index', np.array([vectorizer.vocabulary_[term] for term in terms], dtype=np.int32))
+    if vectorizer.use_idf:
+        save('idf', vectorizer.idf_)
+
+    models = {}
+    for name, model in model_data.items():
+        if name == 'vectorizer':
+            continue
+        if isinstance(model, LogisticRegression):
+            scheme = 'ovr'
+        elif isinstance(model, SVC) and model.kernel == 'linear':
+            scheme = 'ovo'
+        else:
+            raise ValueError(f'Unsupported model {name}: {type(model).__name__}')
+        coef = model.coef_
+        save(f'{name}_coef', np.ascontiguousarray(coef.toarray() if hasattr(coef, 'toarray') else coef))
+        save(f'{name}_intercept', np.asarray(model.intercept_))
+        models[name] = {'scheme': scheme, 'classes': [str(label) for label in model.classes_]}
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': model_version(source),  # same version as the pickle it was made from
+        'source': os.path.basename(source),
+        'vectorizer': {
+            'lowercase': vectorizer.lowercase,
+            'token_pattern': vectorizer.token_pattern,
+            'ngram_range': list(vectorizer.ngram_range),
+            'norm': vectorizer.norm,
+            'use_idf': vectorizer.use_idf,
+            'sublinear_tf': vectorizer.sublinear_tf,
+        },
+        'models': models,
+    }
+    with open(os.path.join(destination, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Documents made of vocabulary terms exercise every part of the transform
+    if check_docs is None:
+        rng = np.random.default_rng(0)
+        check_docs = [' '.join(rng.choice(terms, size=rng.integers(1, 30))) for _ in range(500)] + ['', 'zzzz']
+    package = load_package(destination)
+    expected = vectorizer.transform(check_docs)
+    actual = package.vectorizer.transform(check_docs)
+    if abs(expected - actual).max() > 1e-9:
+        raise ValueError('The converted vectorizer does not reproduce the original vectors')
+    for name in models:
+        if not np.array_equal(model_data[name].predict(expected), package.models[name].predict(actual)):
+            raise ValueError(f'The converted model {name} does not reproduce the original predictions')
+        if not np.allclose(model_data[name].decision_function(expected), package.models[name].decision_function(actual)):
+            raise ValueError(f'The converted model {name} does not reproduce the original decision scores')
+    return manifest
+
+
+@timed('model_load')
+def load_models(config):
+    """
+    Loads the model package if it was converted from the current pickle, otherwise the pickle.
+    A package left over from a replaced models.p would serve the old models (and their cached
+    predictions) under the old version, so it is only used when its version is the pickle's,
+    or when there is no pickle to compare with.
+    """
+    package, pickle_path = config['MODEL_PACKAGE'], config['MODEL_PICKLE']
+    if not os.path.exists(os.path.join(package, 'manifest.json')):
+        return load_pickle(pickle_path)
+    if not os.path.exists(pickle_path):
+        return load_package(package)
+    version = model_version(pickle_path)
+    bundle = load_package(package)
+    if bundle.version == version:
+        return bundle
+    app.logger.warning(
+        f'The model package {package} is version {bundle.version} but {pickle_path} is version {version}: '
+        f'loading {pickle_path} instead, unshared between workers. Update the package with '
+        f'`python convert_model.py {pickle_path} {package}`.'
+    )
+    return load_pickle(pickle_path, version)
+
+
+_bundle = None
+_bundle_lock = threading.Lock()
+
+
+def get_models():
+    """The models of this process, loaded on first use (or in the gunicorn master with --preload)."""
+    global _bundle
+    if _bundle is None:
+        with _bundle_lock:
+            if _bundle is None:
+                _bundle = load_models(app.config)
+    return _bundle
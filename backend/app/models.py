@@ -65,10 +65,15 @@ class Product(db.Model):
     description = db.Column(db.Text)
     image = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.now(), index=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    # Set when the user deletes the product; the reaper (app/reaper.py) removes it and its rows in the background
+    deleting = db.Column(db.Boolean, nullable=False, default=False)
     
-    reviews = db.relationship('Review', backref='product', lazy=True)
-    sentiment_summary = db.relationship('SentimentSummary', backref='product', uselist=False)
+    # A product can have tens of thousands of reviews, so never load them implicitly: `product.reviews` is a query
+    reviews = db.relationship('Review', backref='product', lazy='dynamic')
+    # There is one summary per platform; query SentimentSummary explicitly instead of using this relationship
+    sentiment_summary = db.relationship('SentimentSummary', backref='product', uselist=False, lazy='raise')
+    # Load with selectinload(Product.platforms) when listing products to avoid one query per product
     platforms = db.relationship('ProductPlatform', back_populates='product', lazy=True)  # Updated to back_populates for bidirectional relationship
 
     
@@ -76,7 +81,7 @@ class Product(db.Model):
 class ProductPlatform(db.Model):
     __tablename__ = 'product_platforms'
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     platform = db.Column(Enum(ReviewSource), nullable=False)
     platform_id = db.Column(db.String(16), unique=True, nullable=False)  # ASIN or FSN
     
@@ -89,11 +94,19 @@ class RawReview(db.Model):
     task_id = db.Column(db.String(36), db.ForeignKey('scraping_tasks.id'), nullable=False)
     title = db.Column(db.String(200), nullable=True)
     rating = db.Column(db.String(10), nullable=True)
+    rating_value = db.Column(db.Float, nullable=True)  # rating parsed at ingest
     body = db.Column(db.Text, nullable=True)
     author = db.Column(db.String(100), nullable=True)
     date = db.Column(db.String(50), nullable=True)
+    posted_on = db.Column(db.Date, nullable=True, index=True)  # date parsed at ingest
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     platform = db.Column(Enum(ReviewSource), nullable=False)  
+
+    __table_args__ = (
+        db.Index('ix_raw_reviews_product_platform', 'product_id', 'platform'),
+        db.Index('ix_raw_reviews_task_id', 'task_id'),
+    )
+
 class Review(db.Model):
     __tablename__ = 'reviews'
     id = db.Column(db.Integer, primary_key=True)
@@ -103,10 +116,18 @@ class Review(db.Model):
     rating = db.Column(db.Float)
     source = db.Column(Enum(ReviewSource), nullable=False)
     sentiment = db.Column(Enum(Sentiment))
+    majority_sentiment = db.Column(Enum(Sentiment), nullable=True)  # majority vote of the last ensemble analysis
     relevance_score = db.Column(db.Float)
     review_date = db.Column(db.String(50), nullable=True)
+    posted_on = db.Column(db.Date, nullable=True, index=True)  # parsed review_date
     author = db.Column(db.String(100), nullable=True)
 
+    __table_args__ = (
+        db.Index('ix_reviews_product_source_sentiment', 'product_id', 'source', 'sentiment'),
+        db.Index('ix_reviews_product_id', 'product_id', 'id'),  # keyset pagination of a product's reviews
+        db.Index('ix_reviews_product_posted_on', 'product_id', 'posted_on'),
+    )
+
 # SentimentSummary model
 class SentimentSummary(db.Model):
     __tablename__ = 'sentiment_summaries'
@@ -122,8 +143,10 @@ class SentimentSummary(db.Model):
     word_cloud = db.Column(db.Text)
     words = db.Column(db.JSON, nullable=False, default=list)
     frequency = db.Column(db.JSON, nullable=False, default=list)
-    
-    
+
+    __table_args__ = (
+        db.Index('ix_sentiment_summaries_product_platform', 'product_id', 'platform'),
+    )
     
     # Helper method to get reviews by sentiment
     def get_reviews_by_sentiment(self, sentiment_value):
@@ -131,6 +154,32 @@ class SentimentSummary(db.Model):
 
 
 
+# Daily sentiment buckets per product and platform, updated incrementally as reviews are classified
+class SentimentRollup(db.Model):
+    __tablename__ = 'sentiment_rollups'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    platform = db.Column(Enum(ReviewSource), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    positive_count = db.Column(db.Integer, nullable=False, default=0)
+    neutral_count = db.Column(db.Integer, nullable=False, default=0)
+    negative_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Float, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('product_id', 'platform', 'day', name='uq_sentiment_rollups_bucket'),)
+
+
+class PredictionCache(db.Model):
+    """Predicted labels by model version and preprocessed text; see app/prediction_cache.py."""
+    __tablename__ = 'prediction_cache'
+    model_name = db.Column(db.String(50), primary_key=True)
+    model_version = db.Column(db.String(64), primary_key=True)
+    text_hash = db.Column(db.String(64), primary_key=True)  # sha256 of the normalized preprocessed text
+    label = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
 class ScrapingTask(db.Model):
     __tablename__='scraping_tasks'
     id = db.Column(db.String(36), primary_key=True)
@@ -138,11 +187,72 @@ class ScrapingTask(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     platform = db.Column(Enum(ReviewSource), nullable=False)  # "flipkart" or "amazon"
     status = db.Column(Enum(Status), nullable=False, default=Status.PENDING)  # "pending", "completed", "failed"
-    created_at = db.Column(db.DateTime, default=datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.now)
     message = db.Column(db.String(200), nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)  # when it completed or failed
+    # The process running it and until when; see app/leases.py
+    owner = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=1)
     
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    
 
-    
-    
\ No newline at end of file
+    __table_args__ = (
+        db.Index('ix_scraping_tasks_created_by_status', 'created_by', 'status'),
+        db.Index('ix_scraping_tasks_fsn_asin_status', 'fsn_asin', 'status'),
+        # At most one running scrape per listing, also across gunicorn workers
+        db.Index('ix_scraping_tasks_pending_listing', 'platform', 'fsn_asin', unique=True,
+                 sqlite_where=db.text("status = 'PENDING'"), postgresql_where=db.text("status = 'PENDING'")),
+        db.Index('ix_scraping_tasks_status_lease', 'status', 'lease_expires_at'),
+    )
+
+
+# Scrapes and analyses queued for worker processes (app/jobs.py, app/worker.py)
+class JobStatus(enum.Enum):
+    QUEUED='queued'
+    RUNNING='running'
+    COMPLETED='completed'
+    FAILED='failed'
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    id = db.Column(db.String(36), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'scrape' or 'analysis'
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.String(500), nullable=True)
+    # The worker running it and until when, as for scraping tasks. For a queued job, when its
+    # message is published again if no worker has taken it (see app/jobs.py)
+    owner = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_kind_created_at', 'status', 'kind', 'created_at'),
+        db.Index('ix_jobs_status_lease', 'status', 'lease_expires_at'),
+    )
+
+
+# Per-user dashboard statistics, refreshed in the same transaction as the products,
+# scraping tasks, reviews and sentiment summaries they are computed from
+class DashboardAggregate(db.Model):
+    __tablename__ = 'dashboard_aggregates'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    total_reviews = db.Column(db.Integer, nullable=False, default=0)
+    total_products = db.Column(db.Integer, nullable=False, default=0)
+    pending_scraping_tasks = db.Column(db.Integer, nullable=False, default=0)
+    pending_scraping_task_details = db.Column(db.JSON, nullable=False, default=list)
+    total_positive_reviews = db.Column(db.Integer, nullable=False, default=0)
+    total_negative_reviews = db.Column(db.Integer, nullable=False, default=0)
+    total_neutral_reviews = db.Column(db.Integer, nullable=False, default=0)
+    average_rating = db.Column(db.Float, nullable=False, default=0)
+    most_rating = db.Column(db.Float, nullable=False, default=0)
+    product_with_most_positive_reviews = db.Column(db.Integer, nullable=True)
+    product_with_most_negative_reviews = db.Column(db.Integer, nullable=True)
+    product_with_most_neutral_reviews = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
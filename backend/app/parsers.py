@@ -0,0 +1,136 @@
+import re
+from datetime import date, datetime, timedelta
+from app.models import ReviewSource
+
+
+RATING_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+AMAZON_DAY_FIRST_PATTERN = re.compile(r'(\d{1,2})\s+([A-Za-z]+)\s+(\d{4})')    # "17 July 2023"
+AMAZON_MONTH_FIRST_PATTERN = re.compile(r'([A-Za-z]+)\s+(\d{1,2}),\s*(\d{4})')  # "July 17, 2023"
+FLIPKART_MONTH_PATTERN = re.compile(r'^([A-Za-z]+),?\s+(\d{4})$')               # "Mar, 2021"
+RELATIVE_PATTERN = re.compile(r'^(\d+|an?)\s+(day|week|month|year)s?\s+ago$')   # "11 months ago"
+
+
+def _parse_month(value):
+    """Returns the month number for a full or abbreviated English month name, or None."""
+    try:
+        return datetime.strptime(value[:3].capitalize(), '%b').month
+    except ValueError:
+        return None
+
+
+def _subtract_months(reference, months):
+    month_index = reference.year * 12 + reference.month - 1 - months
+    year, month = divmod(month_index, 12)
+    # Clamp the day so that e.g. 31 March minus one month lands on the last day of February
+    next_month = date(year + (month + 1) // 12, (month + 1) % 12 + 1, 1)
+    last_day = (next_month - timedelta(days=1)).day
+    return date(year, month + 1, min(reference.day, last_day))
+
+
+def _parse_rating(text):
+    """
+    Extracts the leading number from a rating string and returns it as a float
+    when it is a valid 0-5 star rating, otherwise None.
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        value = float(text)
+    else:
+        match = RATING_PATTERN.search(str(text))
+        if not match:
+            return None
+        value = float(match.group(1))
+    return value if 0 <= value <= 5 else None
+
+
+def parse_amazon_rating(text):
+    """Parses Amazon ratings such as '4.0 out of 5 stars'."""
+    return _parse_rating(text)
+
+
+def parse_flipkart_rating(text):
+    """Parses Flipkart ratings, which are scraped as a bare digit such as '4'."""
+    return _parse_rating(text)
+
+
+def parse_amazon_date(text, reference=None):
+    """
+    Parses Amazon review dates such as 'Reviewed in India on 17 July 2023'
+    (or the US style 'Reviewed in the United States on July 17, 2023').
+    """
+    if not text:
+        return None
+    match = AMAZON_DAY_FIRST_PATTERN.search(text)
+    if match:
+        day, month_name, year = match.groups()
+    else:
+        match = AMAZON_MONTH_FIRST_PATTERN.search(text)
+        if not match:
+            return None
+        month_name, day, year = match.groups()
+    month = _parse_month(month_name)
+    if not month:
+        return None
+    try:
+        return date(int(year), month, int(day))
+    except ValueError:
+        return None
+
+
+def parse_flipkart_date(text, reference=None):
+    """
+    Parses Flipkart review dates. Older reviews are shown as 'Mar, 2021' (parsed to
+    the first of that month) and recent ones relative to the scrape, e.g. '11 months ago',
+    which are resolved against `reference` (the scrape date, defaults to today).
+    """
+    if not text:
+        return None
+    text = text.strip().lower()
+    reference = reference or date.today()
+    if isinstance(reference, datetime):
+        reference = reference.date()
+
+    if text == 'today':
+        return reference
+    if text == 'yesterday':
+        return reference - timedelta(days=1)
+
+    match = RELATIVE_PATTERN.match(text)
+    if match:
+        amount, unit = match.groups()
+        amount = 1 if amount in ('a', 'an') else int(amount)
+        if unit == 'day':
+            return reference - timedelta(days=amount)
+        if unit == 'week':
+            return reference - timedelta(weeks=amount)
+        if unit == 'month':
+            return _subtract_months(reference, amount)
+        return _subtract_months(reference, amount * 12)
+
+    match = FLIPKART_MONTH_PATTERN.match(text)
+    if match:
+        month = _parse_month(match.group(1))
+        if month:
+            return date(int(match.group(2)), month, 1)
+    return None
+
+
+# Platform specific (rating parser, date parser) pairs
+PARSERS = {
+    ReviewSource.AMAZON: (parse_amazon_rating, parse_amazon_date),
+    ReviewSource.FLIPKART: (parse_flipkart_rating, parse_flipkart_date),
+}
+
+
+def parse_rating(platform, text):
+    """Parses a scraped rating string for the given platform into a float (or None)."""
+    return PARSERS[platform][0](text)
+
+
+def parse_review_date(platform, text, reference=None):
+    """
+    Parses a scraped review date string for the given platform into a `date` (or None).
+    `reference` is the date the review was scraped on and is used for relative dates.
+    """
+    return PARSERS[platform][1](text, reference)
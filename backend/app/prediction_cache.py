@@ -0,0 +1,126 @@
+"""
+Persistent prediction cache.
+
+The same review text often comes up more than once: in the variants of one listing, on
+both platforms, or when a product is scraped again. The labels the models predicted are
+kept in the `prediction_cache` table under (model name, model version, hash of the
+preprocessed text), so an analysis only classifies the texts no model version has seen.
+
+The model version is the hash of models.p (`ModelBundle.version`; a converted package is
+only loaded while it carries the same version), so replacing the models makes every cached
+label miss; the rows of other versions are deleted by the first write after the change.
+Lookups are made in bulk before inference, and the new labels are written through the
+writer thread after it, skipping the ones another process cached in the meantime.
+"""
+import hashlib
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app import app, db
+from app.models import PredictionCache
+from app.model_store import get_models
+from app.inference import inference_pool
+from app.metrics import cache_lookups
+from app.writer import write_serializer
+
+LOOKUP_CHUNK = 500  # hashes per IN (...) lookup, below SQLite's bound parameter limit
+
+_purged_version = None
+
+
+def text_hash(text):
+    """Hash of a preprocessed text, with whitespace normalized."""
+    return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+
+def lookup_predictions(model_names, version, hashes):
+    """Returns the cached labels as {model_name: {text_hash: label}}."""
+    cached = {name: {} for name in model_names}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), LOOKUP_CHUNK):
+        rows = db.session.query(PredictionCache.model_name, PredictionCache.text_hash, PredictionCache.label).filter(
+            PredictionCache.model_name.in_(model_names),
+            PredictionCache.model_version == version,
+            PredictionCache.text_hash.in_(hashes[start:start + LOOKUP_CHUNK]),
+        )
+        for model_name, hash_value, label in rows:
+            cached[model_name][hash_value] = label
+    return cached
+
+
+def insert_or_ignore(model):
+    """An INSERT of the model's rows that skips the rows whose primary key is taken."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(model).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(model).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return insert(model).prefix_with('IGNORE')
+    return insert(model)
+
+
+def store_predictions(version, labels_by_hash):
+    """
+    Writer job: caches `{text_hash: {model_name: label}}` for the model version, skipping
+    entries cached in the meantime, and deletes the entries of older model versions.
+    """
+    global _purged_version
+    if _purged_version != version:
+        PredictionCache.query.filter(PredictionCache.model_version != version).delete(synchronize_session=False)
+        _purged_version = version
+
+    rows = [
+        {'model_name': model_name, 'model_version': version, 'text_hash': hash_value, 'label': label}
+        for hash_value, labels in labels_by_hash.items() for model_name, label in labels.items()
+    ]
+    if rows:
+        db.session.execute(insert_or_ignore(PredictionCache), rows)
+
+
+def log_store_failure(future):
+    # The analysis has its labels already; a failed write only costs later cache hits
+    if future.exception() is not None:
+        app.logger.error('Caching predictions failed', exc_info=future.exception())
+
+
+def predict(texts, model_name):
+    """
+    Classifies preprocessed texts like `inference_pool.predict`, serving what it can from the
+    cache. `model_name` is a model name or a tuple of them. Returns the results and the cache
+    statistics: `hits` (texts all models had cached), `misses` and `hit_rate`; the statistics
+    are None when the cache is disabled.
+    """
+    if not app.config['PREDICTION_CACHE_ENABLED']:
+        return inference_pool.predict(texts, model_name), None
+
+    model_names = model_name if isinstance(model_name, tuple) else (model_name,)
+    version = get_models().version
+    hashes = [text_hash(text) for text in texts]
+    cached = lookup_predictions(model_names, version, set(hashes))
+
+    # Classify each distinct missing text once
+    missing = {}
+    for text, hash_value in zip(texts, hashes):
+        if any(hash_value not in cached[name] for name in model_names):
+            missing.setdefault(hash_value, text)
+    if missing:
+        results = inference_pool.predict(list(missing.values()), model_names)
+        new_labels = dict(zip(missing, results))
+        write_serializer.submit(store_predictions, version, new_labels).add_done_callback(log_store_failure)
+        for hash_value, labels in new_labels.items():
+            for name, label in labels.items():
+                cached[name][hash_value] = label
+
+    hits = sum(1 for hash_value in hashes if hash_value not in missing)
+    cache_lookups.inc(hits, cache='prediction', result='hit')
+    cache_lookups.inc(len(hashes) - hits, cache='prediction', result='miss')
+    stats = {
+        'hits': hits,
+        'misses': len(hashes) - hits,
+        'hit_rate': round(hits / len(hashes), 4) if hashes else 0.0,
+    }
+    if isinstance(model_name, tuple):
+        results = [{name: cached[name][hash_value] for name in model_names} for hash_value in hashes]
+    else:
+        results = [cached[model_name][hash_value] for hash_value in hashes]
+    return results, stats
@@ -0,0 +1,190 @@
+"""
+SQL statement counting and per-request query accounting.
+
+Every statement a request executes in its thread is counted and timed, including writes
+committed inline (which run in an app context of their own, hence a context variable
+rather than `g`). After the request, it is logged at WARNING when it crossed one of the thresholds:
+
+    QUERY_COUNT_THRESHOLD   statements per request
+    QUERY_TIME_THRESHOLD    seconds spent in the database per request
+    N_PLUS_ONE_THRESHOLD    executions of the same statement per request, the signature of
+                            a query run once per row of an earlier result (N+1)
+
+Statements slower than `SLOW_QUERY_THRESHOLD` seconds are logged on their own, from any
+thread, with their parameters redacted to their types so no user data reaches the logs.
+The statements per request also feed the `sentimentscout_request_queries` histogram.
+
+`count_queries()` records the statements of a `with` block instead, and
+`assert_max_queries(n)` fails when the block issues more than `n` of them; tests use it
+through the `query_budget` fixture in app/testing.py.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, db
+from app.metrics import Histogram
+
+request_queries = Histogram(
+    'sentimentscout_request_queries', 'SQL statements per request, by route.', ['route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+
+current_request_queries = ContextVar('current_request_queries', default=None)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+        self.durations = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def seconds(self):
+        return sum(self.durations)
+
+    def record(self, statement, seconds):
+        self.statements.append(statement)
+        self.durations.append(seconds)
+
+    def repeated(self, threshold):
+        """Statements executed at least `threshold` times, most frequent first, as (statement, count)."""
+        counts = Counter(normalize_statement(statement) for statement in self.statements)
+        return [(statement, count) for statement, count in counts.most_common() if count >= threshold]
+
+
+IN_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%\(\w+\)s\s*,)+\s*%\(\w+\)s\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """The statement with whitespace collapsed and expanded IN lists reduced to one placeholder."""
+    return IN_LIST.sub('(?)', WHITESPACE.sub(' ', statement).strip())
+
+
+def redact(parameters):
+    """Describes statement parameters by type and size only, e.g. `(<int>, <str:12>)`."""
+    def describe(value):
+        if value is None:
+            return 'NULL'
+        if isinstance(value, (str, bytes)):
+            return f'<{type(value).__name__}:{len(value)}>'
+        return f'<{type(value).__name__}>'
+
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{key}: {describe(value)}' for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            return f'[{len(parameters)} parameter sets]'  # executemany
+        return '(' + ', '.join(describe(value) for value in parameters) + ')'
+    return describe(parameters)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('statement_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    queries = current_request_queries.get()
+    if queries is not None:
+        queries.record(statement, elapsed)
+    if elapsed >= app.config.get('SLOW_QUERY_THRESHOLD', 0.1):
+        app.logger.warning(
+            f'Slow SQL statement ({elapsed * 1000:.0f} ms): {normalize_statement(statement)} '
+            f'parameters {redact(parameters)}'
+        )
+
+
+@app.before_request
+def start_query_accounting():
+    if app.config.get('QUERY_ACCOUNTING_ENABLED', True):
+        current_request_queries.set(QueryCounter())
+
+
+@app.teardown_request
+def stop_query_accounting(exc):
+    current_request_queries.set(None)
+
+
+@app.after_request
+def report_request_queries(response):
+    queries = current_request_queries.get()
+    if queries is None:
+        return response
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_queries.observe(queries.count, route=route)
+
+    problems = []
+    if queries.count > app.config.get('QUERY_COUNT_THRESHOLD', 30):
+        problems.append(f'{queries.count} statements')
+    if queries.seconds > app.config.get('QUERY_TIME_THRESHOLD', 0.5):
+        problems.append(f'{queries.seconds * 1000:.0f} ms in the database')
+    repeated = queries.repeated(app.config.get('N_PLUS_ONE_THRESHOLD', 10))
+    if repeated:
+        problems.append('possible N+1: ' + '; '.join(f'{count}x {statement}' for statement, count in repeated[:3]))
+    if problems:
+        app.logger.warning(
+            f'{request.method} {route}: {queries.count} statements, {queries.seconds * 1000:.0f} ms '
+            f'({", ".join(problems)})'
+        )
+    return response
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the SQL statements the current thread executes on the app's engine inside the
+    `with` block; those of background threads (the reaper, the lease keeper) are not its own.
+    """
+    counter = QueryCounter()
+    started = []
+    thread = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            started.append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            counter.record(statement, time.perf_counter() - started.pop() if started else 0)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+        event.remove(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(limit, n_plus_one_threshold=None):
+    """
+    Fails with an AssertionError listing the statements when the `with` block executes more
+    than `limit` SQL statements, or (with `n_plus_one_threshold`) repeats one that often.
+    """
+    with count_queries() as counter:
+        yield counter
+    listing = '\n'.join(f'  {normalize_statement(statement)}' for statement in counter.statements)
+    assert counter.count <= limit, f'{counter.count} SQL statements executed, expected at most {limit}:\n{listing}'
+    if n_plus_one_threshold:
+        repeated = counter.repeated(n_plus_one_threshold)
+        assert not repeated, 'Possible N+1 queries:\n' + '\n'.join(
+            f'  {count}x {statement}' for statement, count in repeated
+        )
@@ -0,0 +1,109 @@
+"""
+Background deletion of products.
+
+Deleting a product used to remove all of its reviews, raw reviews, summaries, rollups,
+tasks and platforms in one transaction inside the request, holding SQLite's write lock
+for seconds on large products. The route now only marks the product as `deleting`; the
+reaper thread then removes the child rows in batches of `PRODUCT_DELETE_BATCH_SIZE`, one
+short transaction each through the writer thread, and finally the product itself.
+
+Every process starts its reaper thread with it (the gunicorn post_worker_init hook, run.py
+and app.worker), and the delete route wakes it. Its first sweep picks up the products left
+`deleting` by a process that stopped, without waiting for a request.
+
+Products marked as deleting are hidden from every route. Scrapers and analysis jobs still
+running for such a product stop at their next check and their results are not stored.
+"""
+import os
+import threading
+from sqlalchemy import select
+from app import app, db
+from app.models import Product, ProductPlatform, Review, SentimentSummary, SentimentRollup, RawReview, ScrapingTask
+from app.writer import write_serializer
+
+# Deleted in this order, the rows referencing the product last
+CHILD_MODELS = (Review, SentimentRollup, SentimentSummary, RawReview, ScrapingTask, ProductPlatform)
+
+
+class ProductDeleted(Exception):
+    """Raised by a job whose product has been deleted or marked for deletion."""
+
+
+def is_product_deleting(product_id):
+    """Reads the product's state on a fresh connection, for jobs running outside a request."""
+    with db.engine.connect() as conn:
+        deleting = conn.execute(select(Product.deleting).where(Product.id == product_id)).scalar()
+    return deleting is None or deleting
+
+
+def check_product(product_id):
+    """Raises ProductDeleted if the product is gone or marked as deleting. For use in writer jobs."""
+    product = db.session.get(Product, product_id)
+    if product is None or product.deleting:
+        raise ProductDeleted(f'Product {product_id} was deleted')
+
+
+def delete_batch(model, product_id, batch_size):
+    ids = select(model.id).where(model.product_id == product_id).limit(batch_size)
+    return db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+
+
+def delete_product_row(product_id):
+    product = db.session.get(Product, product_id)
+    if product is not None:
+        db.session.delete(product)
+
+
+def delete_product_data(product_id, batch_size):
+    for model in CHILD_MODELS:
+        while write_serializer.run(delete_batch, model, product_id, batch_size) == batch_size:
+            pass
+    write_serializer.run(delete_product_row, product_id)
+
+
+def reap_products(batch_size):
+    """Deletes every product marked as deleting. Returns the ids deleted."""
+    with app.app_context():
+        product_ids = db.session.scalars(select(Product.id).where(Product.deleting.is_(True))).all()
+    for product_id in product_ids:
+        delete_product_data(product_id, batch_size)
+    return product_ids
+
+
+class ProductReaper:
+    def __init__(self, batch_size=1000, interval=60):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        # Also called by wake(), so a process that did not start it at startup has it once it deletes
+        with self.lock:
+            # A forked worker process inherits the object but not the thread
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._work, name='product-reaper', daemon=True)
+                self.thread.start()
+
+    def wake(self):
+        self.start()
+        self.wakeup.set()
+
+    def _work(self):
+        # The first sweep also picks up deletions interrupted by a restart
+        while True:
+            try:
+                reap_products(self.batch_size)
+            except Exception:
+                app.logger.exception('Deleting products failed')
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+
+
+product_reaper = ProductReaper(
+    batch_size=app.config.get('PRODUCT_DELETE_BATCH_SIZE', 1000),
+    interval=app.config.get('PRODUCT_REAPER_INTERVAL', 60),
+)
@@ -0,0 +1,143 @@
+"""
+Pre-aggregated sentiment time series.
+
+`sentiment_rollups` holds one row per (product, platform, day) with sentiment counts and
+rating sums. The analysis route feeds it deltas as reviews are (re)classified, so the
+time series endpoint reads a few hundred buckets instead of scanning every review.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import case, func, select, tuple_
+from app import db
+from app.models import Review, Sentiment, SentimentRollup
+
+COUNT_COLUMNS = {
+    Sentiment.POSITIVE: 'positive_count',
+    Sentiment.NEUTRAL: 'neutral_count',
+    Sentiment.NEGATIVE: 'negative_count',
+}
+GRANULARITIES = ('day', 'week', 'month')
+
+
+class RollupDeltas:
+    """Accumulates per-bucket changes caused by adding or removing classified reviews."""
+
+    def __init__(self):
+        self.buckets = defaultdict(lambda: defaultdict(float))
+
+    def add(self, product_id, platform, day, sentiment, rating, sign=1):
+        # Reviews whose date could not be parsed don't belong to any bucket
+        if day is None or sentiment is None:
+            return
+        bucket = self.buckets[(product_id, platform, day)]
+        bucket[COUNT_COLUMNS[sentiment]] += sign
+        if rating is not None:
+            bucket['rating_sum'] += sign * rating
+            bucket['rating_count'] += sign
+
+    def remove(self, product_id, platform, day, sentiment, rating):
+        self.add(product_id, platform, day, sentiment, rating, sign=-1)
+
+
+def apply_rollup_deltas(deltas):
+    """
+    Applies accumulated deltas to the rollup table in the current session. The caller
+    commits, so the buckets change in the same transaction as the reviews themselves.
+    """
+    changed = {key: values for key, values in deltas.buckets.items() if any(values.values())}
+    if not changed:
+        return
+
+    existing = {
+        (row.product_id, row.platform, row.day): row
+        for row in SentimentRollup.query.filter(
+            tuple_(SentimentRollup.product_id, SentimentRollup.platform, SentimentRollup.day).in_(list(changed))
+        ).all()
+    }
+    for (product_id, platform, day), values in changed.items():
+        rollup = existing.get((product_id, platform, day))
+        if not rollup:
+            rollup = SentimentRollup(
+                product_id=product_id, platform=platform, day=day,
+                positive_count=0, neutral_count=0, negative_count=0, rating_sum=0, rating_count=0
+            )
+            db.session.add(rollup)
+        for column, delta in values.items():
+            value = getattr(rollup, column) + delta
+            setattr(rollup, column, value if column == 'rating_sum' else int(value))
+
+
+def rebuild_rollups(conn, product_id=None):
+    """Recomputes the rollup buckets from the reviews table, for one product or all of them."""
+    rollups = SentimentRollup.__table__
+    reviews = Review.__table__
+
+    delete = rollups.delete()
+    query = select(
+        reviews.c.product_id,
+        reviews.c.source,
+        reviews.c.posted_on,
+        *[
+            func.sum(case((reviews.c.sentiment == sentiment, 1), else_=0))
+            for sentiment in COUNT_COLUMNS
+        ],
+        func.coalesce(func.sum(reviews.c.rating), 0),
+        func.count(reviews.c.rating),
+    ).where(reviews.c.posted_on.isnot(None), reviews.c.sentiment.isnot(None))
+    if product_id is not None:
+        delete = delete.where(rollups.c.product_id == product_id)
+        query = query.where(reviews.c.product_id == product_id)
+    query = query.group_by(reviews.c.product_id, reviews.c.source, reviews.c.posted_on)
+
+    conn.execute(delete)
+    conn.execute(rollups.insert().from_select(
+        ['product_id', 'platform', 'day', *COUNT_COLUMNS.values(), 'rating_sum', 'rating_count'],
+        query
+    ))
+
+
+def bucket_start(day, granularity):
+    """Returns the first day of the day/week/month bucket that `day` falls in (weeks start on Monday)."""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def sentiment_timeseries(product_id, granularity='day', start=None, end=None, platform=None):
+    """
+    Reads the daily rollups for a product within [start, end] and folds them into
+    day, week or month buckets. Returns the buckets ordered by period.
+    """
+    query = SentimentRollup.query.filter_by(product_id=product_id)
+    if platform is not None:
+        query = query.filter_by(platform=platform)
+    if start is not None:
+        query = query.filter(SentimentRollup.day >= start)
+    if end is not None:
+        query = query.filter(SentimentRollup.day <= end)
+
+    buckets = {}
+    for rollup in query.order_by(SentimentRollup.day).all():
+        period = bucket_start(rollup.day, granularity)
+        bucket = buckets.setdefault(period, {
+            'positive': 0, 'negative': 0, 'neutral': 0, 'rating_sum': 0.0, 'rating_count': 0
+        })
+        bucket['positive'] += rollup.positive_count
+        bucket['negative'] += rollup.negative_count
+        bucket['neutral'] += rollup.neutral_count
+        bucket['rating_sum'] += rollup.rating_sum
+        bucket['rating_count'] += rollup.rating_count
+
+    return [
+        {
+            'period': period.isoformat(),
+            'positive': bucket['positive'],
+            'negative': bucket['negative'],
+            'neutral': bucket['neutral'],
+            'total': bucket['positive'] + bucket['negative'] + bucket['neutral'],
+            'average_rating': bucket['rating_sum'] / bucket['rating_count'] if bucket['rating_count'] else None,
+        }
+        for period, bucket in sorted(buckets.items())
+    ]
@@ -1,26 +1,29 @@
-from flask import jsonify, request, abort
+from flask import jsonify, request, abort, Response, stream_with_context
 from app import app,db, login_manager, bcrypt
-from app.models import User, Product, ProductPlatform, Review, SentimentSummary, ReviewSource, ScrapingTask, RawReview, Sentiment, Status
+from app.models import User, Product, ProductPlatform, Review, SentimentSummary, ReviewSource, ScrapingTask, RawReview, Sentiment, Status, SentimentRollup, DashboardAggregate, Job, JobStatus
 from flask_login import login_user, logout_user, login_required, current_user
 from app.errorHandler import handle_errors
-from app.tasks import scrape_flipkart_reviews, scrape_amazon_reviews, preprocess_text, fill_missing_ratings, word_distribution
-import threading
-import uuid
+from app.tasks import start_scrape, preprocess_text, fill_missing_ratings, word_distribution
+from app.rollups import RollupDeltas, apply_rollup_deltas, sentiment_timeseries, GRANULARITIES
+from app.dashboard import refresh_dashboard_aggregate, dashboard_response
+from app.cache import cached_response
+from app.writer import write_serializer
+from app.reaper import product_reaper, check_product, ProductDeleted
+from app.model_store import get_models
+from app.inference import inference_pool
+from app.ensemble import ensemble_report
+from app import prediction_cache
+from app.metrics import registry as metrics_registry, timer
+from app.jobs import enqueue_job, job_handler, run_in_workers, wait_for_job
 import re
+import json
 from datetime import datetime
 
 
 from sqlalchemy.exc import SQLAlchemyError
-import pickle
-import pandas as pd
-from io import BytesIO
+from sqlalchemy.orm import selectinload, joinedload
+from io import BufferedReader, BytesIO
 import base64
-from wordcloud import WordCloud, ImageColorGenerator
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import numpy as np
-from PIL import Image
 
 # User loader for Flask-Login
 @login_manager.user_loader
@@ -322,7 +325,7 @@ def add_or_update_product():
     if product_id:
         # Attempt to retrieve the existing product by ID
         product = Product.query.get(product_id)
-        if not product:
+        if not product or product.deleting:
             return jsonify({'message': 'Product not found'}), 404
 
         # Ensure the product belongs to the logged-in user
@@ -397,6 +400,7 @@ def add_or_update_product():
 @app.route('/products', methods=['GET'])
 @login_required
 @handle_errors
+@cached_response
 def get_user_products():
     """
     Retrieves all products belonging to the logged-in user.
@@ -424,8 +428,8 @@ def get_user_products():
         ]
     }
     """
-    # Fetch all products for the logged-in user
-    products = Product.query.filter_by(created_by=current_user.id).all()
+    # Fetch all products for the logged-in user, loading all their platforms in one extra query
+    products = Product.query.options(selectinload(Product.platforms)).filter_by(created_by=current_user.id, deleting=False).all()
 
     # If no products exist, return a 404 error
     if not products:
@@ -454,6 +458,7 @@ def get_user_products():
 @app.route('/product/<int:product_id>', methods=['GET'])
 @login_required
 @handle_errors
+@cached_response
 def get_user_product(product_id):
     """
     Retrieves the details of a specific product by its ID that belongs to the logged-in user.
@@ -482,8 +487,8 @@ def get_user_product(product_id):
         
     }
     """
-    # Fetch the product by ID that belongs to the logged-in user
-    product = Product.query.filter_by(id=product_id, created_by=current_user.id).first()
+    # Fetch the product by ID that belongs to the logged-in user, together with its platforms
+    product = Product.query.options(selectinload(Product.platforms)).filter_by(id=product_id, created_by=current_user.id, deleting=False).first()
 
     # If no such product exists, return a 404 error
     if not product:
@@ -511,67 +516,104 @@ def get_user_product(product_id):
 @handle_errors
 def delete_product(product_id):
     """
-    Deletes a product and its associated records (platforms, reviews, sentiment summary, raw reviews).
+    Deletes a product and its associated records (platforms, reviews, sentiment summary, raw reviews,
+    rollups and scraping tasks).
 
-    The route will first ensure the product exists, and if it does, it will delete the product 
-    along with the related platforms, reviews, sentiment summary, and raw reviews from the database.
+    The route only marks the product as being deleted, cancels its pending scraping tasks and
+    returns right away. From then on the product is hidden from every route, and the background
+    reaper (see app/reaper.py) removes the associated records in small batches and then the
+    product itself. Scraping or analysis jobs still running for the product stop without storing
+    their results.
 
     Args:
         product_id (int): The ID of the product to delete.
 
     Returns:
-        - 200: Product and associated records deleted successfully
-        - 404: Product not found
+        - 202: Product deletion started
+        - 403: Product belongs to another user
+        - 404: Product not found (or already being deleted)
     """
     # Fetch the product to be deleted
     product = Product.query.get(product_id)
     
-    if not product:
+    if not product or product.deleting:
         return jsonify({'message': 'Product not found'}), 404
     
     # Check if the current user is the one who created the product
     if product.created_by != current_user.id:
         return jsonify({'message': 'You do not have permission to delete this product'}), 403
 
-    # Deleting associated records
-    # Delete associated reviews, raw reviews, and sentiment summaries
-    db.session.query(Review).filter(Review.product_id == product_id).delete()
-    db.session.query(SentimentSummary).filter(SentimentSummary.product_id == product_id).delete()
-    db.session.query(RawReview).filter(RawReview.product_id == product_id).delete()
-    db.session.query(ScrapingTask).filter(ScrapingTask.product_id == product_id).delete()
-
-    # Delete associated product platforms (ASIN/FSN links)
-    db.session.query(ProductPlatform).filter(ProductPlatform.product_id == product_id).delete()
+    product.deleting = True
 
-    # Now delete the product itself
-    db.session.delete(product)
+    # Cancel the scraping tasks still running for the product
+    for task in ScrapingTask.query.filter_by(product_id=product_id, status=Status.PENDING).all():
+        task.status = Status.FAILED
+        task.message = 'Cancelled: product deleted'
+        task.finished_at = datetime.now()
 
-    # Commit all changes to the database
     db.session.commit()
+    product_reaper.wake()
 
     # Return success message
-    return jsonify({'message': 'Product and all associated records deleted successfully'}), 200
+    return jsonify({'message': 'Product deletion started'}), 202
 
 
 # REVIEW MANAGEMENT ROUTES
 
 # PRODUCT REVIEWS RETRIEVAL ROUTE
+REVIEWS_PAGE_SIZE = 100
+REVIEWS_MAX_PAGE_SIZE = 1000
+
+
+def serialize_review(review):
+    return {
+        'id': review.id,
+        'review_text': review.review_text,
+        'rating': review.rating,
+        'source': review.source.name,  # Assuming source is an Enum or has a name field
+        'sentiment': review.sentiment.name if review.sentiment else None,
+        'majority_sentiment': review.majority_sentiment.name if review.majority_sentiment else None,
+        'relevance_score': review.relevance_score,
+        'review_date': review.review_date,
+        'posted_on': review.posted_on.isoformat() if review.posted_on else None,
+        'author': review.author
+    }
+
+
 @app.route('/product/<int:product_id>/reviews', methods=['GET'])
 @login_required
 @handle_errors
 def get_reviews(product_id):
     """
-    Retrieves all reviews associated with a specific product.
+    Retrieves the reviews associated with a specific product, filtered and paginated on the server.
 
-    This endpoint fetches all the reviews linked to the given product ID.
+    This endpoint fetches the reviews linked to the given product ID, ordered by review ID.
     Each review includes its text, source (platform), sentiment, and relevance score, review date and author.
     If no processed reviews are found, it checks for raw reviews and prompts the user to analyze them.
 
     Parameters:
         product_id (int): The ID of the product for which to retrieve reviews.
 
+    Query Parameters (all optional):
+        - sentiment (str): 'positive', 'negative' or 'neutral'.
+        - source (str): 'amazon' or 'flipkart'.
+        - min_rating / max_rating (float): Inclusive rating range.
+        - start / end (str): Inclusive range of the parsed review date (YYYY-MM-DD).
+        - q (str): Only reviews whose text contains this string (case-insensitive).
+        - limit (int): Page size, defaults to 100 and is capped at 1000.
+        - cursor (int): The `X-Next-Cursor` value of the previous page.
+
+    Pagination:
+        Pages are keyset paginated on the review ID. When more reviews match, the response carries an
+        `X-Next-Cursor` header; pass its value as `cursor` to fetch the next page.
+
+    Streaming:
+        With `Accept: application/x-ndjson` every matching review after `cursor` is streamed as one JSON
+        object per line instead (no page size cap), which is meant for exports.
+
     Returns:
-        - 200: A JSON array of reviews for the specified product.
+        - 200: A JSON array of reviews for the specified product (or an NDJSON stream).
+        - 400: If a filter or the cursor is invalid.
         - 404: If the product with the specified ID does not exist or has no reviews.
     
     Response JSON structure:
@@ -582,8 +624,10 @@ def get_reviews(product_id):
         "rating": <int>,                 # The rating given by the reviewer
         "source": <str>,                 # The name of the source platform (e.g., Amazon, Flipkart)
         "sentiment": <str>,              # The sentiment classification of the review (e.g., Positive, Negative, Neutral)
+        "majority_sentiment": <str>,     # The majority vote of the models in the last ensemble analysis, null if none
         "relevance_score": <float>,      # The relevance score assigned to the review
         "review_date": <str>,            # The date when the review was posted (string)
+        "posted_on": <str>,              # The parsed review date (YYYY-MM-DD), null if unparseable
         "author": <str>                  # The author of the review (optional)
     },
     ...
@@ -592,37 +636,93 @@ def get_reviews(product_id):
     # Fetch the product by its ID to ensure it exists
     product = Product.query.get(product_id)
 
-    if not product:
+    if not product or product.deleting:
         return jsonify({'message': 'Product not found'}), 404
 
-    # Fetch all processed reviews for the specified product ID
-    reviews = Review.query.filter_by(product_id=product_id).all()
+    # Build the filters from the query parameters
+    filters = [Review.product_id == product_id]
+    try:
+        sentiment = request.args.get('sentiment')
+        if sentiment:
+            filters.append(Review.sentiment == Sentiment[sentiment.upper()])
+        source = request.args.get('source')
+        if source:
+            filters.append(Review.source == ReviewSource[source.upper()])
+        if request.args.get('min_rating'):
+            filters.append(Review.rating >= float(request.args['min_rating']))
+        if request.args.get('max_rating'):
+            filters.append(Review.rating <= float(request.args['max_rating']))
+        if request.args.get('start'):
+            filters.append(Review.posted_on >= datetime.strptime(request.args['start'], '%Y-%m-%d').date())
+        if request.args.get('end'):
+            filters.append(Review.posted_on <= datetime.strptime(request.args['end'], '%Y-%m-%d').date())
+        cursor = int(request.args.get('cursor', 0))
+        limit = min(max(int(request.args.get('limit', REVIEWS_PAGE_SIZE)), 1), REVIEWS_MAX_PAGE_SIZE)
+    except (KeyError, ValueError):
+        return jsonify({'message': 'Invalid filter. Check sentiment, source, rating, date (YYYY-MM-DD), limit and cursor.'}), 400
+    if request.args.get('q'):
+        filters.append(db.func.lower(Review.review_text).contains(request.args['q'].lower(), autoescape=True))
+    is_filtered = len(filters) > 1 or cursor > 0
+
+    query = Review.query.filter(*filters, Review.id > cursor).order_by(Review.id)
+
+    # Stream every matching review as NDJSON for exports, without building the whole list in memory
+    if request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for review in query.yield_per(1000):
+                yield json.dumps(serialize_review(review)) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    # Fetch one extra row to know whether there is a next page
+    reviews = query.limit(limit + 1).all()
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
 
     # Check if no processed reviews exist
-    if not reviews:
+    if not reviews and not is_filtered:
         # Check if there are raw reviews for the product
-        raw_reviews = RawReview.query.filter_by(product_id=product_id).all()
+        raw_review = RawReview.query.filter_by(product_id=product_id).first()
 
-        if raw_reviews:
+        if raw_review:
             return jsonify({'message': 'No processed reviews found. Please analyze the raw reviews to generate processed reviews.'}), 404
         else:
             return jsonify({'message': 'No reviews found for this product. Try Scraping and analysing'}), 404
 
-    # Return the list of processed reviews as a JSON response
-    return jsonify([
-        {
-            'id': review.id,
-            'review_text': review.review_text,
-            'rating': review.rating,
-            'source': review.source.name,  # Assuming source is an Enum or has a name field
-            'sentiment': review.sentiment.name,
-            'relevance_score': review.relevance_score,
-            'review_date': review.review_date,
-            'author': review.author
-        } for review in reviews
-    ]), 200
+    # Return the page of processed reviews as a JSON response
+    response = jsonify([serialize_review(review) for review in reviews])
+    if has_more:
+        response.headers['X-Next-Cursor'] = str(reviews[-1].id)
+    return response, 200
+
 
 
+# REVIEWS SCRAPING
+def start_scrape_response(platform, platform_id, product_id):
+    """
+    Starts a scrape of the listing, or attaches the request to its running scrape or to one
+    completed within the platform's SCRAPE_FRESHNESS_TTL (unless ?force=true); see `start_scrape`.
+    """
+    force = request.args.get('force', 'false').lower() == 'true'
+    task, state = start_scrape(platform, platform_id, product_id, current_user.id, force=force)
+    if state == 'started':
+        return jsonify({"task_id": task.id, "message": "Scraping started"}), 202
+    response = {
+        'task_id': task.id,
+        'task': {
+            'task_id': task.id,
+            'fsn_asin': task.fsn_asin,
+            'platform': task.platform.name,  #  platform is an Enum
+            'status': task.status.name,  #  status is an Enum
+            'message': task.message,
+            'created_at': task.created_at.isoformat(),  # Format datetime as string
+            'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+        }
+    }
+    if state == 'running':
+        response['message'] = 'Already scraping this listing, following the running scrape'
+        return jsonify(response), 202
+    response['message'] = f"Reviews scraped at {task.finished_at:%Y-%m-%d %H:%M} are reused; add ?force=true to scrape again"
+    return jsonify(response), 200
 
 # FLIPKART REVIEWS SCRAPING
 @app.route('/scrape_flipkart_reviews/<string:fsn>', methods=['POST'])
@@ -633,8 +733,10 @@ def scrape_flipkart_reviews_route(fsn):
     Scrapes Flipkart reviews for a specific product identified by FSN (Flipkart Seller Number).
     
     This endpoint validates the provided FSN, checks if the product exists and belongs to the 
-    current user, and ensures that no other scraping task is already in progress for the same FSN.
-    If valid, it triggers a scraping task in a separate thread to fetch reviews from Flipkart.
+    current user, and starts at most one scrape of a listing at a time: a request made while one
+    is running follows it, and one made within the platform's SCRAPE_FRESHNESS_TTL of a completed
+    scrape reuses its reviews, unless it is made with `?force=true`. Otherwise it triggers a
+    scraping task in a separate thread to fetch reviews from Flipkart.
 
     Parameters:
     - fsn (str): The FSN (Flipkart Seller Number) associated with the product. It must be a 
@@ -645,9 +747,10 @@ def scrape_flipkart_reviews_route(fsn):
     - 404 Not Found: If the product associated with the FSN does not exist or is not linked to 
       the current user.
     - 403 Forbidden: If the FSN is already attached to another user's product.
-    - 409 Conflict: If there is an ongoing scraping task for the same FSN.
-    - 202 Accepted: If the scraping task is successfully initiated. Returns the task ID and a 
-      message indicating that the scraping has started.
+    - 202 Accepted: If the scraping task is successfully initiated, or a scrape of the FSN is
+      already running. Returns the task ID and a message (and the running task).
+    - 200 OK: If the FSN was scraped within the freshness TTL. Returns that task's ID, the task
+      and a message.
 
     Example Responses:
     - If FSN is not valid:
@@ -660,16 +763,18 @@ def scrape_flipkart_reviews_route(fsn):
         "error": "Product with ASIN <fsn> not found. Kindly add product first"
       }
 
-    - If scraping task is already in progress:
+    - If scraping task is already in progress (202, the request follows that task):
       {
-        "error": "Already scraping for this ASIN",
+        "task_id": "unique-task-id",
+        "message": "Already scraping this listing, following the running scrape",
         "task": {
           "task_id": "unique-task-id",
           "fsn_asin": "FSN_VALUE",
           "platform": "flipkart",
           "status": "PENDING",
           "message": "Scraping task is pending",
-          "created_at": "2024-11-08T12:34:56"
+          "created_at": "2024-11-08T12:34:56",
+          "finished_at": null
         }
       }
 
@@ -688,31 +793,14 @@ def scrape_flipkart_reviews_route(fsn):
         return jsonify({'error': 'FSN is required'}), 400
     if not re.fullmatch(fsn_pattern, str(fsn).upper()):
         return jsonify({'error': 'FSN is not valid'}), 400
-    product = ProductPlatform.query.filter_by(platform_id=str(fsn).upper()).first()
+    product = ProductPlatform.query.options(joinedload(ProductPlatform.product)).filter_by(platform_id=str(fsn).upper()).first()
      # If product is not found, return an error response
-    if not product:
+    if not product or product.product.deleting:
         return jsonify({'error': f'Product with FSN {fsn} not found. Kindly add product first'}), 404
     if product.product.created_by != current_user.id:
         return jsonify({'error':"FSN already attached with other user's product"}), 403
     
-    existing_task = ScrapingTask.query.filter_by(fsn_asin=str(fsn).upper(), status = Status.PENDING).first()
-    if existing_task:
-        return jsonify({
-            'error': 'Already scraping for this FSN',
-            'task': {
-                'task_id': existing_task.id,
-                'fsn_asin': existing_task.fsn_asin,
-                'platform': existing_task.platform.name,  #  platform is an Enum
-                'status': existing_task.status.name,  #  status is an Enum
-                'message': existing_task.message,
-                'created_at': existing_task.created_at.isoformat(),  # Format datetime as string
-            }
-        }), 409
-    task_id = str(uuid.uuid4())
-    product_id = product.product_id
-    task_thread = threading.Thread(target=scrape_flipkart_reviews, args=(str(fsn).upper(),task_id,product_id), kwargs={'created_by': current_user.id})
-    task_thread.start()
-    return jsonify({"task_id": task_id, "message": "Scraping started"}), 202
+    return start_scrape_response(ReviewSource.FLIPKART, str(fsn).upper(), product.product_id)
 
 # AMAZON REVIEWS SCRAPING
 @app.route('/scrape_amazon_reviews/<string:asin>', methods=['POST'])
@@ -723,8 +811,10 @@ def scrape_amazon_reviews_route(asin):
     Scrapes Amazon reviews for a specific product identified by ASIN (Amazon Standard Identification Number).
     
     This endpoint validates the provided ASIN, checks if the product exists and belongs to the 
-    current user, and ensures that no other scraping task is already in progress for the same ASIN.
-    If valid, it triggers a scraping task in a separate thread to fetch reviews from Amazon.
+    current user, and starts at most one scrape of a listing at a time: a request made while one
+    is running follows it, and one made within the platform's SCRAPE_FRESHNESS_TTL of a completed
+    scrape reuses its reviews, unless it is made with `?force=true`. Otherwise it triggers a
+    scraping task in a separate thread to fetch reviews from Amazon.
 
     Parameters:
     - asin (str): The ASIN (Amazon Standard Identification Number) associated with the product. It must be a 
@@ -735,9 +825,10 @@ def scrape_amazon_reviews_route(asin):
     - 404 Not Found: If the product associated with the ASIN does not exist or is not linked to 
       the current user.
     - 403 Forbidden: If the ASIN is already attached to another user's product.
-    - 409 Conflict: If there is an ongoing scraping task for the same ASIN.
-    - 202 Accepted: If the scraping task is successfully initiated. Returns the task ID and a 
-      message indicating that the scraping has started.
+    - 202 Accepted: If the scraping task is successfully initiated, or a scrape of the ASIN is
+      already running. Returns the task ID and a message (and the running task).
+    - 200 OK: If the ASIN was scraped within the freshness TTL. Returns that task's ID, the task
+      and a message.
 
     Example Responses:
     - If ASIN is not valid:
@@ -755,16 +846,18 @@ def scrape_amazon_reviews_route(asin):
         "error": "ASIN already attached with other user's product"
       }
 
-    - If scraping task is already in progress:
+    - If scraping task is already in progress (202, the request follows that task):
       {
-        "error": "Already scraping for this ASIN",
+        "task_id": "unique-task-id",
+        "message": "Already scraping this listing, following the running scrape",
         "task": {
           "task_id": "unique-task-id",
           "fsn_asin": "ASIN_VALUE",
           "platform": "amazon",
           "status": "PENDING",
           "message": "Scraping task is pending",
-          "created_at": "2024-11-08T12:34:56"
+          "created_at": "2024-11-08T12:34:56",
+          "finished_at": null
         }
       }
 
@@ -784,30 +877,13 @@ def scrape_amazon_reviews_route(asin):
     if not re.fullmatch(asin_pattern, str(asin).upper()):
         return jsonify({'error': 'ASIN is not valid'}), 400
     # Look for the product by ASIN
-    product = ProductPlatform.query.filter_by(platform_id=str(asin).upper()).first()
-    if not product:
+    product = ProductPlatform.query.options(joinedload(ProductPlatform.product)).filter_by(platform_id=str(asin).upper()).first()
+    if not product or product.product.deleting:
         return jsonify({'error': f'Product with ASIN {asin} not found. Kindly add the product first.'}), 404
     if product.product.created_by != current_user.id:
         return jsonify({'error':"Asin already attached with other user's product"}), 403
     
-    existing_task = ScrapingTask.query.filter_by(fsn_asin=str(asin).upper(), status = Status.PENDING).first()
-    if existing_task:
-        return jsonify({
-            'error': 'Already scraping for this ASIN',
-            'task': {
-                'task_id': existing_task.id,
-                'fsn_asin': existing_task.fsn_asin,
-                'platform': existing_task.platform.name,  #  platform is an Enum
-                'status': existing_task.status.name,  #  status is an Enum
-                'message': existing_task.message,
-                'created_at': existing_task.created_at.isoformat(),  # Format datetime as string
-            }
-        }), 409
-    task_id = str(uuid.uuid4())
-    product_id = product.product_id
-    task_thread = threading.Thread(target=scrape_amazon_reviews, args=(str(asin).upper(),task_id, product_id),kwargs={'created_by': current_user.id})
-    task_thread.start()
-    return jsonify({"task_id": task_id, "message": "Scraping started"}), 202
+    return start_scrape_response(ReviewSource.AMAZON, str(asin).upper(), product.product_id)
 
 # GET SCRAPING STATUS
 @app.route('/scraping_task_status/<string:task_id>', methods=['GET'])
@@ -896,6 +972,7 @@ def check_task_status(task_id):
 @app.route('/user_tasks', methods=['GET'])
 @login_required
 @handle_errors
+@cached_response
 def get_user_tasks():
     """
     Retrieves all tasks associated with the current user, optionally filtered by status, platform, and product_id.
@@ -927,6 +1004,17 @@ def get_user_tasks():
     platform = request.args.get('platform')
     product_id = request.args.get('product_id')
 
+    # Select only the columns returned, no ORM objects are needed for the listing
+    tasks_query = db.session.query(
+        ScrapingTask.id,
+        ScrapingTask.fsn_asin,
+        ScrapingTask.platform,
+        ScrapingTask.status,
+        ScrapingTask.created_at,
+        ScrapingTask.message,
+        ScrapingTask.product_id
+    ).filter(ScrapingTask.created_by == current_user.id)
+
     # Validate and convert status to match the database format
     if status:
         status_upper = status.upper()
@@ -934,22 +1022,18 @@ def get_user_tasks():
             status_enum = Status[status_upper]  # Using Status enum to validate
         except KeyError:
             return jsonify({"error": f"Invalid status '{status}'. Valid statuses are 'PENDING', 'FAILED', 'COMPLETED'."}), 400
-        # Start the query with status filter
-        tasks_query = ScrapingTask.query.filter_by(created_by=current_user.id, status=status_enum)
-    else:
-        # Start the query with just the user ID if no status is specified
-        tasks_query = ScrapingTask.query.filter_by(created_by=current_user.id)
+        tasks_query = tasks_query.filter(ScrapingTask.status == status_enum)
 
     # Filter by platform if provided
     if platform:
         platform_upper = platform.lower()
         if platform_upper not in ['flipkart', 'amazon']:
             return jsonify({"error": f"Invalid platform '{platform}'. Valid platforms are 'flipkart' and 'amazon'."}), 400
-        tasks_query = tasks_query.filter_by(platform=ReviewSource[platform_upper.upper()])
+        tasks_query = tasks_query.filter(ScrapingTask.platform == ReviewSource[platform_upper.upper()])
 
     # Filter by product_id if provided
     if product_id:
-        tasks_query = tasks_query.filter_by(product_id=product_id)
+        tasks_query = tasks_query.filter(ScrapingTask.product_id == product_id)
 
     # Fetch the tasks based on the combined filters
     tasks = tasks_query.all()
@@ -973,6 +1057,105 @@ def get_user_tasks():
 
 
 # SENTIMENT ANALYSER API    
+def render_word_cloud(text, platform):
+    """Renders the word cloud of a platform's reviews, masked with the platform logo, as a base64 PNG."""
+    # Plotting libraries are only loaded by the first analysis, not at startup
+    import numpy as np
+    from PIL import Image
+    from wordcloud import WordCloud, ImageColorGenerator
+    from matplotlib.figure import Figure
+
+    amazon_mask = np.array(Image.open('amazon_PNG4.png')) if platform == 'amazon' else np.array(Image.open('flipkart_PNG4.png'))  # Modify if flipkart mask exists
+    wordcloud = WordCloud(
+        width=300,
+        height=200,
+        random_state=1,
+        background_color='white',
+        colormap='Set2',
+        collocations=False,
+        mask=amazon_mask,
+        max_words=100
+    ).generate(text)
+
+    # Color and save the word cloud image. A standalone Figure rather than pyplot, whose
+    # global current figure is shared by concurrent analyses
+    if amazon_mask is not None:
+        image_colors = ImageColorGenerator(amazon_mask)
+        wordcloud.recolor(color_func=image_colors)
+    img_buffer = BytesIO()
+    fig = Figure(figsize=(6, 6), facecolor="#f6f5f6")
+    ax = fig.subplots()
+    ax.imshow(wordcloud, interpolation="bilinear")
+    ax.axis("off")
+    ax.set_title(f"{platform.capitalize()} Reviews Word Cloud", fontsize=15)
+    fig.savefig(img_buffer, format="png", bbox_inches='tight', pad_inches=0)
+    img_buffer.seek(0)
+    return base64.b64encode(img_buffer.getvalue()).decode("utf-8")
+
+
+def store_analysis_results(product_id, platform_enum, platform_id, summary_values, review_rows):
+    """
+    Upserts the sentiment summary and the classified reviews of one product platform and
+    applies the matching rollup changes. Runs in the writer thread, which commits.
+    Raises ProductDeleted if the product was deleted while its reviews were being classified.
+    Rows of an ensemble analysis also carry the `Majority` label of each review.
+    """
+    check_product(product_id)
+
+    def to_sentiment(value):
+        return Sentiment[value.upper()] if value.upper() in Sentiment.__members__ else Sentiment.NEUTRAL
+
+    # Update or create sentiment summary
+    sentiment_summary = SentimentSummary.query.filter_by(product_id=product_id, platform_id=platform_id, platform=platform_enum).first()
+    if not sentiment_summary:
+        sentiment_summary = SentimentSummary(product_id=product_id, platform_id=platform_id, platform=platform_enum)
+        db.session.add(sentiment_summary)
+    for field, value in summary_values.items():
+        setattr(sentiment_summary, field, value)
+
+    # The reviews already stored for the platform, by text, loaded in one query rather than
+    # looked up once per row
+    existing_reviews = {}
+    for review in Review.query.filter_by(product_id=product_id, source=platform_enum).order_by(Review.id):
+        existing_reviews.setdefault(review.review_text, review)
+
+    # Update or add each review's sentiment, collecting the changes to the daily rollups
+    rollup_deltas = RollupDeltas()
+    for row in review_rows:
+        sentiment_enum = to_sentiment(row['Sentiment'])
+        majority_enum = to_sentiment(row['Majority']) if 'Majority' in row else None
+        rating = row['rating'] if row['rating'] is not None else 5.0
+        existing_review = existing_reviews.get(row['overall_review'])
+        if existing_review:
+            rollup_deltas.remove(product_id, platform_enum, existing_review.posted_on, existing_review.sentiment, existing_review.rating)
+            existing_review.rating = rating
+            existing_review.sentiment = sentiment_enum
+            if majority_enum:
+                existing_review.majority_sentiment = majority_enum
+            existing_review.relevance_score = 1.0
+            existing_review.review_date = row['date']
+            existing_review.posted_on = row['posted_on']
+            existing_review.author = row['author']
+        else:
+            cleaned_review = Review(
+                product_id=product_id,
+                review_text=row['overall_review'],
+                rating=rating,
+                source=platform_enum,
+                sentiment=sentiment_enum,
+                majority_sentiment=majority_enum,
+                relevance_score=1.0,
+                review_date=row['date'],
+                posted_on=row['posted_on'],
+                author=row['author']
+            )
+            db.session.add(cleaned_review)
+            existing_reviews[row['overall_review']] = cleaned_review  # a repeated text updates it
+        rollup_deltas.add(product_id, platform_enum, row['posted_on'], sentiment_enum, rating)
+
+    apply_rollup_deltas(rollup_deltas)
+
+
 @app.route('/reviews/analyse/<int:product_id>', methods=['POST'])
 @login_required
 @handle_errors
@@ -989,11 +1172,23 @@ def classify_multiple_reviews(product_id):
     Request Arguments:
     - model_name (str): The name of the sentiment model to be used for classification. Defaults to 'svm'.
     - platform (str): The platform from which reviews are being analyzed. Should be 'amazon' or 'flipkart'. 
+    - ensemble (str, optional): 'all', or a comma-separated list of model names, to compare several
+      models in the same analysis. The reviews are preprocessed and vectorized once and every listed
+      model (plus `model_name`) classifies them. The sentiment, summary and counts still come from
+      `model_name`; the majority vote of the models is stored on each review as `majority_sentiment`
+      (ties go to `model_name`) and the response gets an `ensemble` comparison.
+    - wait (float, optional): With JOB_EXECUTOR=worker, seconds to wait for the analysis before
+      answering 202. Defaults to 0.
 
     Responses:
-    - 400 Bad Request: If the platform is invalid or if the platform ID is not found for the product.
+    - 400 Bad Request: If the platform is invalid or if the platform ID is not found for the product,
+      or if `wait` is not a number of seconds.
     - 404 Not Found: If no reviews are found for the specified product on the selected platform or if the model is not found.
     - 500 Internal Server Error: In case of any database or unexpected errors.
+    - 202 Accepted: With JOB_EXECUTOR=worker the analysis runs in a worker process (see app/jobs.py):
+      the response is its `job_id` and a `status_url` to poll, GET /jobs/<job_id>, whose `result`
+      is the response below once it completes. With `wait=N` the request waits up to N seconds
+      (at most JOB_RESULT_WAIT) for the result and answers as below when it comes in time.
     - 200 OK: If reviews are successfully classified, sentiment summary and word cloud are generated and stored.
       The response includes:
       - `message`: A message indicating that the reviews were successfully processed.
@@ -1001,6 +1196,11 @@ def classify_multiple_reviews(product_id):
       - `negative_reviews`: The number of negative reviews.
       - `neutral_reviews`: The number of neutral reviews.
       - `bar_data`: Frequency distribution of words in the reviews.
+      - `prediction_cache`: How many reviews were served from the prediction cache (`hits`), how many
+        were classified (`misses`), and the `hit_rate`. Left out when the cache is disabled.
+      - `ensemble` (ensemble analyses only): Per model, its sentiment counts and the share of reviews on
+        which it agrees with the majority vote; the counts of the majority vote; and `agreement_rate`,
+        the share of reviews that all the models classified the same.
 
     Example Responses:
     - On success:
@@ -1012,6 +1212,19 @@ def classify_multiple_reviews(product_id):
         "bar_data": {
           "features": ["excellent", "good", "poor"],
           "frequency": [50, 60, 10]
+        },
+        "prediction_cache": {"hits": 150, "misses": 50, "hit_rate": 0.75}
+      }
+
+    - With `ensemble=all`, the response also includes:
+      {
+        "ensemble": {
+          "models": {
+            "svm": {"positive_reviews": 120, "negative_reviews": 30, "neutral_reviews": 50, "agreement_with_majority": 0.97},
+            "logreg": {"positive_reviews": 114, "negative_reviews": 33, "neutral_reviews": 53, "agreement_with_majority": 0.97}
+          },
+          "majority": {"positive_reviews": 120, "negative_reviews": 30, "neutral_reviews": 50},
+          "agreement_rate": 0.94
         }
       }
 
@@ -1029,9 +1242,9 @@ def classify_multiple_reviews(product_id):
     This function performs the following operations:
     - Validates and processes the request parameters including the platform and model.
     - Fetches reviews from the database for the given product and platform.
-    - Loads the sentiment model and vectorizer for text classification.
+    - Checks that the requested sentiment model exists.
     - Processes each review by combining the review text and description, and applying text preprocessing.
-    - Classifies the sentiment of each review and updates or creates the sentiment summary and individual reviews in the database.
+    - Classifies the sentiment of the reviews not in the prediction cache in batches on the inference pool and updates or creates the sentiment summary and individual reviews in the database.
     - Generates a word cloud based on the reviews for the selected platform, and returns it as a base64-encoded image.
     - Provides a frequency distribution of the most common words used in the reviews.
 
@@ -1039,33 +1252,88 @@ def classify_multiple_reviews(product_id):
 
     The sentiment of each review is classified as 'Positive', 'Negative', or 'Neutral', and stored in the database along with other review details.
     """
+    # Extract model_name and platform from request arguments
+    model_name = request.args.get('model_name', 'svm')  # Default model is 'svm'
+    platform = request.args.get('platform', '').lower()
+    ensemble = request.args.get('ensemble')
+    if run_in_workers():
+        try:
+            wait = float(request.args.get('wait', 0))
+        except ValueError:
+            wait = -1
+        if not 0 <= wait:  # also false for nan
+            return jsonify({"error": "wait must be a number of seconds."}), 400
+        wait = min(wait, app.config['JOB_RESULT_WAIT'])
+        return queued_analysis_response(product_id, platform, model_name, ensemble, wait)
+    response, status = analyse_product(product_id, platform, model_name, ensemble)
+    return jsonify(response), status
+
+
+def queued_analysis_response(product_id, platform, model_name, ensemble, wait=0):
+    # Queued for the workers. The client polls the status URL, so a request does not hold a
+    # server thread for the length of an analysis, unless it asks to wait for the result
+    payload = {'product_id': product_id, 'platform': platform, 'model_name': model_name, 'ensemble': ensemble}
+    job_id = enqueue_job('analysis', payload, current_user.id)
+    queued = jsonify({"message": "Analysis queued", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+    if not wait:
+        return queued
+    job = wait_for_job(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Analysis job not found.", "job_id": job_id}), 404
+    if job.status == JobStatus.COMPLETED:
+        return jsonify(job.result['response']), job.result['status']
+    if job.status == JobStatus.FAILED:
+        return jsonify({"error": f"An unexpected error occurred: {job.error}", "job_id": job_id}), 500
+    return queued
+
+
+@job_handler('analysis')
+def run_analysis_job(payload):
+    with app.app_context():
+        response, status = analyse_product(payload['product_id'], payload['platform'], payload['model_name'], payload['ensemble'])
+    return {'status': status, 'response': response}
+
+
+def analyse_product(product_id, platform, model_name='svm', ensemble=None):
+    """
+    The analysis of POST /reviews/analyse, in the request or in a worker: classifies the raw
+    reviews of the product on the platform and stores the results. Returns the response
+    body and its status code.
+    """
     try:
-        # Extract model_name and platform from request arguments
-        model_name = request.args.get('model_name', 'svm')  # Default model is 'svm'
-        platform = request.args.get('platform', '').lower()
         platform_enum = ReviewSource.AMAZON if platform == 'amazon' else ReviewSource.FLIPKART
         # Validate platform
         if platform not in ['amazon', 'flipkart']:
-            return jsonify({"error": "Invalid platform. Choose either 'amazon' or 'flipkart'."}), 400
-        
-        # Fetch the platform ID for the product
-        platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=platform_enum).first().platform_id
-        if not platform_id:
-            return jsonify({"error": "Platform ID not found for the given product."}), 404
+            return {"error": "Invalid platform. Choose either 'amazon' or 'flipkart'."}, 400
         
-        # Fetch reviews for the specified platform
-       
-        reviews = RawReview.query.filter_by(product_id=product_id, platform=platform_enum).all()
-        if not reviews:
-            return jsonify({"error": f"No reviews found for the given product on {platform}. Kindly first scrape the reviews to proceed"}), 404
-
-        # Load the model and vectorizer
-        with open("models.p", 'rb') as mod:
-            model_data = pickle.load(mod)
-        vect = model_data['vectorizer']
-        model = model_data.get(model_name)
-        if not model:
-            return jsonify({"error": f"Model '{model_name}' not found."}), 404
+        # Stage timings go to the Server-Timing header and /metrics (see app/metrics.py)
+        with timer('db_fetch'):
+            product = db.session.get(Product, product_id)
+            if not product or product.deleting:
+                return {"error": "Product not found."}, 404
+
+            # Fetch the platform ID for the product
+            platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=platform_enum).first().platform_id
+            if not platform_id:
+                return {"error": "Platform ID not found for the given product."}, 404
+
+            # Fetch reviews for the specified platform
+            reviews = RawReview.query.filter_by(product_id=product_id, platform=platform_enum).all()
+            if not reviews:
+                return {"error": f"No reviews found for the given product on {platform}. Kindly first scrape the reviews to proceed"}, 404
+
+        # Check the models exist; the reviews are classified by the inference pool (see app/inference.py)
+        available_models = get_models().models
+        if model_name not in available_models:
+            return {"error": f"Model '{model_name}' not found."}, 404
+        ensemble_models = None
+        if ensemble:
+            requested = list(available_models) if ensemble.lower() == 'all' else [name.strip() for name in ensemble.split(',') if name.strip()]
+            unknown = [name for name in requested if name not in available_models]
+            if unknown:
+                return {"error": f"Model '{unknown[0]}' not found."}, 404
+            # The requested model comes first: it breaks ties in the majority vote
+            ensemble_models = tuple(dict.fromkeys([model_name] + requested))
 
         # Prepare the reviews data for processing
         rev_data = [
@@ -1073,140 +1341,368 @@ def classify_multiple_reviews(product_id):
                 "review_id": review.id,
                 "review_text": review.title,
                 "review_desc": review.body,
-                "rating": review.rating,
+                # Use the rating parsed at ingest, falling back to the raw string for unparsed rows
+                "rating": review.rating_value if review.rating_value is not None else review.rating,
                 'date': review.date,
+                'posted_on': review.posted_on,
                 'author': review.author
             }
             for review in reviews
         ]
+        import pandas as pd
         data = pd.DataFrame(rev_data)
         fill_missing_ratings(data)
         data["overall_review"] = data["review_text"] + " " + data["review_desc"]
-        data['processed_review'] = data["overall_review"].apply(preprocess_text)
-
-        # Perform sentiment analysis
-        count_positive, count_negative, count_neutral = 0, 0, 0
-        sentiments = []
-        for review_text in data['processed_review']:
-            review_vector = vect.transform([review_text])
-            res = model.predict(review_vector)
-            sentiments.append(res[0])
-            if res[0] == 'Positive':
-                count_positive += 1
-            elif res[0] == 'Negative':
-                count_negative += 1
+        with timer('preprocess'):
+            data['processed_review'] = data["overall_review"].apply(preprocess_text)
+
+        # Perform sentiment analysis, batched with the reviews of concurrent analyses
+        # Texts classified before by the same model version come from the prediction cache
+        ensemble_data = None
+        with timer('classify'):
+            if ensemble_models:
+                predictions, cache_stats = prediction_cache.predict(data['processed_review'].tolist(), ensemble_models)
+                sentiments = [labels[model_name] for labels in predictions]
+                data["Majority"], ensemble_data = ensemble_report(ensemble_models, predictions)
             else:
-                count_neutral += 1
+                sentiments, cache_stats = prediction_cache.predict(data['processed_review'].tolist(), model_name)
+        count_positive = sentiments.count('Positive')
+        count_negative = sentiments.count('Negative')
+        count_neutral = len(sentiments) - count_positive - count_negative
         data["Sentiment"] = sentiments
 
         # Generate a word cloud with platform-specific mask
-        amazon_mask = np.array(Image.open('amazon_PNG4.png')) if platform == 'amazon' else np.array(Image.open('flipkart_PNG4.png'))  # Modify if flipkart mask exists
-        wordcloud_data = " ".join(data["processed_review"].astype(str).tolist())
-        wordcloud = WordCloud(
-            width=300,
-            height=200,
-            random_state=1,
-            background_color='white',
-            colormap='Set2',
-            collocations=False,
-            mask=amazon_mask,
-            max_words=100
-        ).generate(wordcloud_data)
-
-        # Color and save the word cloud image
-        if amazon_mask is not None:
-            image_colors = ImageColorGenerator(amazon_mask)
-            wordcloud.recolor(color_func=image_colors)
-        img_buffer = BytesIO()
-        plt.figure(figsize=(6, 6), facecolor="#f6f5f6")
-        plt.imshow(wordcloud, interpolation="bilinear")
-        plt.axis("off")
-        plt.title(f"{platform.capitalize()} Reviews Word Cloud", fontsize=15)
-        plt.savefig(img_buffer, format="png", bbox_inches='tight', pad_inches=0)
-        plt.close()
-        img_buffer.seek(0)
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode("utf-8")
+        with timer('word_cloud'):
+            img_base64 = render_word_cloud(" ".join(data["processed_review"].astype(str).tolist()), platform)
 
         # Prepare frequency bar data
-        bar_data = word_distribution(data['processed_review'])
-
-        # Update or create sentiment summary
-        sentiment_summary = SentimentSummary.query.filter_by(product_id=product_id, platform_id=platform_id, platform=platform_enum).first()
-        if sentiment_summary:
-            sentiment_summary.positive_count = count_positive
-            sentiment_summary.negative_count = count_negative
-            sentiment_summary.neutral_count = count_neutral
-            sentiment_summary.word_cloud = img_base64
-            sentiment_summary.words = bar_data['features']
-            sentiment_summary.frequency = bar_data['frequency']
-            sentiment_summary.platform = platform_enum
-            sentiment_summary.average_rating = data['rating'].mean()
-            sentiment_summary.most_rating = data['rating'].mode()[0]
-        else:
-            sentiment_summary = SentimentSummary(
-                product_id=product_id,
-                platform_id=platform_id,
-                positive_count=count_positive,
-                negative_count=count_negative,
-                neutral_count=count_neutral,
-                word_cloud=img_base64,
-                words=bar_data['features'],
-                frequency=bar_data['frequency'],
-                platform = platform_enum,
-                average_rating = data['rating'].mean(),
-                most_rating = data['rating'].mode()[0]
-            )
-            db.session.add(sentiment_summary)
-
-        # Update or add each review's sentiment
-        for _, row in data.iterrows():
-            sentiment_value = row['Sentiment']
-            sentiment_enum = Sentiment[sentiment_value.upper()] if sentiment_value.upper() in Sentiment.__members__ else Sentiment.NEUTRAL
-            existing_review = Review.query.filter_by(
-                product_id=product_id,
-                review_text=row['overall_review'],
-                source=platform_enum
-            ).first()
-            if existing_review:
-                existing_review.rating = row['rating'] if row['rating'] is not None else 5.0
-                existing_review.sentiment = sentiment_enum
-                existing_review.relevance_score = 1.0
-                existing_review.review_date = row['date']
-                existing_review.author = row['author']
-            else:
-                cleaned_review = Review(
-                    product_id=product_id,
-                    review_text=row['overall_review'],
-                    rating=row['rating'] if row['rating'] is not None else 5.0,
-                    source=platform_enum,
-                    sentiment=sentiment_enum,
-                    relevance_score=1.0,
-                    review_date=row['date'],
-                    author=row['author']
-                )
-                db.session.add(cleaned_review)
-       
-        db.session.commit()
-        return jsonify({
+        with timer('word_distribution'):
+            bar_data = word_distribution(data['processed_review'])
+
+        # Store the summary and the classified reviews through the writer thread
+        summary_values = {
+            'positive_count': count_positive,
+            'negative_count': count_negative,
+            'neutral_count': count_neutral,
+            'word_cloud': img_base64,
+            'words': bar_data['features'],
+            'frequency': bar_data['frequency'],
+            'average_rating': float(data['rating'].mean()),
+            'most_rating': float(data['rating'].mode()[0]),
+        }
+        review_columns = ['overall_review', 'rating', 'Sentiment', 'date', 'posted_on', 'author']
+        if ensemble_models:
+            review_columns.append('Majority')
+        review_rows = data[review_columns].to_dict('records')
+        with timer('store'):
+            write_serializer.run(store_analysis_results, product_id, platform_enum, platform_id, summary_values, review_rows)
+        response = {
             "message": "Reviews successfully classified and stored/updated, sentiment summary generated/updated.",
             "positive_reviews": count_positive,
             "negative_reviews": count_negative,
             "neutral_reviews": count_neutral,
             "bar_data": bar_data
-        }), 200
+        }
+        if ensemble_data:
+            response["ensemble"] = ensemble_data
+        if cache_stats:
+            response["prediction_cache"] = cache_stats
+        return response, 200
+
+    except ProductDeleted:
+        return {"error": "Product not found."}, 404
 
     except SQLAlchemyError as e:
         db.session.rollback()
-        return jsonify({"error": f"Database error: {str(e)}"}), 500
+        return {"error": f"Database error: {str(e)}"}, 500
 
     except Exception as e:
-        return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
+        return {"error": f"An unexpected error occurred: {str(e)}"}, 500
+
+
+# JOB STATUS
+@app.route('/jobs/<string:job_id>', methods=['GET'])
+@login_required
+@handle_errors
+def get_job_status(job_id):
+    """
+    Returns the status of a scrape or analysis queued for the workers (JOB_EXECUTOR=worker).
+    A scrape job has the id of its scraping task.
+
+    Responses:
+    - 404 Not Found: If there is no such job of the current user.
+    - 200 OK: The job:
+      {
+        "job_id": "unique-job-id",
+        "kind": "analysis",
+        "status": "COMPLETED",          # QUEUED, RUNNING, COMPLETED or FAILED
+        "attempts": 1,
+        "created_at": "2024-11-08T12:34:56",
+        "finished_at": "2024-11-08T12:35:10",
+        "result": {"status": 200, "response": {...}},   # the analysis response and its status code
+        "error": null
+      }
+    """
+    job = db.session.get(Job, job_id)
+    if job is None or job.created_by != current_user.id:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status.name,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': job.result,
+        'error': job.error,
+    }), 200
+
+
+# AD-HOC CLASSIFICATION
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class ClassifyRequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def read_classify_texts(max_texts):
+    """
+    Reads the texts of a /classify request: a JSON array, or NDJSON with one item per line,
+    each item a string or an object with a `text` string. NDJSON is read line by line, so
+    a body with too many texts is rejected without reading the rest of it.
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        items = []
+        # Buffered: iterating the raw request stream reads it a few bytes at a time
+        for line_number, line in enumerate(BufferedReader(request.stream, 1 << 16), 1):
+            if not line.strip():
+                continue
+            if len(items) == max_texts:
+                raise ClassifyRequestError(f"Too many texts, at most {max_texts} per request.", 413)
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ClassifyRequestError(f"Invalid JSON on line {line_number}.")
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ClassifyRequestError("Expected a JSON array of texts, or NDJSON with one text per line.")
+        if len(items) > max_texts:
+            raise ClassifyRequestError(f"Too many texts, at most {max_texts} per request.", 413)
+
+    texts = []
+    for i, item in enumerate(items):
+        text = item.get('text') if isinstance(item, dict) else item
+        if not isinstance(text, str):
+            raise ClassifyRequestError(f"Item {i} is not a text: expected a string or an object with a 'text' string.")
+        texts.append(text)
+    if not texts:
+        raise ClassifyRequestError("No texts to classify.")
+    return texts
+
+
+@app.route('/classify', methods=['POST'])
+@login_required
+@handle_errors
+def classify_texts():
+    """
+    Classifies the sentiment of arbitrary texts (support tickets, survey answers, ...) with the
+    review models, without scraping a product first. The texts go through the same
+    preprocessing and vectorizer as the reviews in `/reviews/analyse`, on the inference pool,
+    where they are batched together with concurrent requests.
+
+    Request Arguments:
+    - model_name (str): The sentiment model to use. Defaults to 'svm'.
+
+    Request Body:
+    - A JSON array of up to `CLASSIFY_MAX_TEXTS` items, or NDJSON (`Content-Type:
+      application/x-ndjson`) with one item per line. Each item is a string or an object with
+      a `text` string; other fields are ignored.
+
+    Responses:
+    - 400 Bad Request: If the body is not a JSON array or NDJSON of texts, or holds no texts.
+    - 404 Not Found: If the model is not found.
+    - 413 Payload Too Large: If there are more than `CLASSIFY_MAX_TEXTS` texts.
+    - 200 OK: One result per text, in order.
+      - `model_name`, `model_version`: The model used, and the version of the model file.
+      - `results`: The `label` of each text, and its decision `scores` by class (higher means
+        more likely), or null for models without a decision function.
+
+    Example:
+        POST /classify?model_name=svm
+        ["The agent solved my issue in minutes", "Still waiting for a refund after 3 weeks"]
+
+        Response:
+        {
+          "model_name": "svm",
+          "model_version": "3f9a1c0b7d2e",
+          "results": [
+            {"label": "Positive", "scores": {"Negative": -0.21, "Neutral": 0.89, "Positive": 2.31}},
+            {"label": "Negative", "scores": {"Negative": 2.27, "Neutral": 0.91, "Positive": -0.18}}
+          ]
+        }
+    """
+    model_name = request.args.get('model_name', 'svm')
+    models = get_models()
+    if model_name not in models.models:
+        return jsonify({"error": f"Model '{model_name}' not found."}), 404
+    try:
+        texts = read_classify_texts(app.config['CLASSIFY_MAX_TEXTS'])
+    except ClassifyRequestError as e:
+        return jsonify({"error": e.message}), e.status
+
+    with timer('classify'):
+        results = inference_pool.predict(texts, model_name, preprocess=True, scores=True)
+    return jsonify({
+        "model_name": model_name,
+        "model_version": models.version,
+        "results": results
+    }), 200
+
+
+# PROMETHEUS METRICS
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Exposes the metrics of the worker process serving the request in the Prometheus text format,
+    for a Prometheus server to scrape (see app/metrics.py). Not behind login, like Prometheus
+    endpoints usually are; restrict access to it at the proxy if needed.
+
+    Metrics:
+    - `sentimentscout_stage_seconds{stage}`: Histogram of the time spent in each processing stage
+      (db_fetch, model_load, preprocess, classify, word_cloud, word_distribution, store, write_batch,
+      scrape_amazon, scrape_flipkart).
+    - `sentimentscout_request_seconds{method,route,status}`: Histogram of the request latency per route.
+    - `sentimentscout_scrape_pages_total{platform}` and `sentimentscout_scrape_pages_per_second{platform}`:
+      Review pages scraped, and a histogram of the pages per second of completed scrapes.
+    - `sentimentscout_inference_queue_depth`, `sentimentscout_inference_running_batches`,
+      `sentimentscout_inference_batch_size` and `sentimentscout_write_queue_depth`: The inference pool
+      and writer thread queues.
+    - `sentimentscout_cache_lookups_total{cache,result}` and `sentimentscout_cache_hit_ratio{cache}`: Hits
+      and misses of the response cache and the prediction cache.
+
+    Responses:
+    - 200 OK: The metrics, as `text/plain; version=0.0.4`.
+    - 404 Not Found: If metrics are disabled (`METRICS_ENABLED=false`).
+    """
+    if not metrics_registry.enabled:
+        return jsonify({"error": "Metrics are disabled."}), 404
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# INFERENCE POOL STATS
+@app.route('/inference_stats', methods=['GET'])
+@login_required
+@handle_errors
+def get_inference_stats():
+    """
+    Reports the state of the inference pool that classifies reviews for the analyse endpoint,
+    for the gunicorn worker that serves the request.
+
+    Responses:
+    - 200 OK: The pool's counters.
+      - `processes`: Worker processes in the pool (0 when classifying in-process).
+      - `max_batch_size`, `max_wait_ms`: The batching limits.
+      - `queue_depth`: Texts waiting to be classified, in `queued_chunks` submissions.
+      - `running_batches`: Batches being classified right now.
+      - `batches`, `texts`: Batches and texts classified since the worker started.
+      - `batch_size_histogram`: Number of batches by size, keyed by the upper bound of each bucket.
+
+    Example Response:
+      {
+        "processes": 2,
+        "max_batch_size": 256,
+        "max_wait_ms": 10.0,
+        "queue_depth": 512,
+        "queued_chunks": 2,
+        "running_batches": 2,
+        "batches": 41,
+        "texts": 9650,
+        "batch_size_histogram": {"1": 0, "2": 0, "4": 1, "8": 0, "16": 2, "32": 1, "64": 0, "128": 3, "256": 34}
+      }
+    """
+    return jsonify(inference_pool.stats()), 200
+
+
+# SENTIMENT TIME SERIES
+@app.route('/product/<int:product_id>/sentiment_timeseries', methods=['GET'])
+@login_required
+@handle_errors
+@cached_response
+def get_sentiment_timeseries(product_id):
+    """
+    Retrieves how the sentiment of a product's reviews develops over time, read from the
+    pre-aggregated daily rollups that are updated whenever reviews are analysed.
+
+    Parameters:
+        product_id (int): The ID of the product.
+
+    Query Parameters:
+        - granularity (str, optional): Bucket size, one of 'day', 'week' or 'month'. Defaults to 'day'.
+          Weeks start on Monday.
+        - start (str, optional): First day to include (YYYY-MM-DD).
+        - end (str, optional): Last day to include (YYYY-MM-DD).
+        - platform (str, optional): 'amazon', 'flipkart' or 'all'. Defaults to 'all'.
+
+    Returns:
+        - 200: The time series buckets for the product.
+        - 400: If the granularity, platform or a date is invalid.
+        - 404: If the product does not exist or does not belong to the logged-in user.
+
+    Response JSON structure:
+    {
+        "product_id": <int>,
+        "granularity": <str>,
+        "platform": <str>,
+        "buckets": [
+            {
+                "period": <str>,            # First day of the bucket (YYYY-MM-DD)
+                "positive": <int>,
+                "negative": <int>,
+                "neutral": <int>,
+                "total": <int>,
+                "average_rating": <float>   # null if no review in the bucket has a rating
+            },
+            ...
+        ]
+    }
+    """
+    granularity = request.args.get('granularity', 'day').lower()
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": "Invalid granularity. Choose from ['day', 'week', 'month']."}), 400
+
+    platform = request.args.get('platform', 'all').lower()
+    if platform not in ['all', 'amazon', 'flipkart']:
+        return jsonify({"error": "Invalid platform. Choose from ['amazon', 'flipkart', 'all']."}), 400
+    platform_enum = None if platform == 'all' else ReviewSource[platform.upper()]
+
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else None
+    except ValueError:
+        return jsonify({"error": "Invalid date. Use the format YYYY-MM-DD."}), 400
+
+    product = Product.query.filter_by(id=product_id, created_by=current_user.id, deleting=False).first()
+    if not product:
+        return jsonify({"message": "Product not found or does not belong to the logged-in user."}), 404
+
+    return jsonify({
+        "product_id": product_id,
+        "granularity": granularity,
+        "platform": platform,
+        "buckets": sentiment_timeseries(product_id, granularity, start, end, platform_enum)
+    }), 200
 
 
 # SENTIMENT SUMMARY
 @app.route('/sentiment_summary/<int:product_id>', methods=['GET'])
 @login_required
 @handle_errors
+@cached_response
 def get_sentiment_summary(product_id):
     """
     Retrieves a sentiment summary for a specific product based on reviews from one or more platforms 
@@ -1319,12 +1815,13 @@ def get_sentiment_summary(product_id):
         return jsonify({"error": "Invalid platform. Choose from ['amazon', 'flipkart', 'all']."}), 400
     
     try:
-        # Query sentiment summaries based on the platform
+        # Query sentiment summaries based on the platform, skipping products being deleted
+        summaries = SentimentSummary.query.join(Product).filter(SentimentSummary.product_id == product_id, Product.deleting.is_(False))
         if platform == 'all':
-            summaries = SentimentSummary.query.filter_by(product_id=product_id).all()
+            summaries = summaries.all()
         else:
             platform_enum = ReviewSource[platform.upper()]
-            summaries = SentimentSummary.query.filter_by(product_id=product_id, platform=platform_enum).all()
+            summaries = summaries.filter(SentimentSummary.platform == platform_enum).all()
         
         if not summaries:
             return jsonify({"error": "No sentiment summary found for the specified product and platform."}), 404
@@ -1411,6 +1908,7 @@ def get_sentiment_summary(product_id):
 @app.route('/dashboard', methods=['GET'])
 @login_required
 @handle_errors
+@cached_response
 def get_dashboard_data():
     """
     Retrieves dashboard data for the current logged-in user. This includes aggregated data from sentiment analysis 
@@ -1435,87 +1933,15 @@ def get_dashboard_data():
         - 500: Internal server error in case of unexpected errors.
     """
     try:
-        # Get total reviews analyzed (counting reviews for products created by the current user)
-        total_reviews = db.session.query(Review).join(Product).filter(Product.created_by == current_user.id).count()
-
-        # Get total products for the current user
-        total_products = db.session.query(Product).filter_by(created_by=current_user.id).count()
-
-        # Get pending scraping tasks (from ScrapingTasks table)
-        pending_scraping_tasks = db.session.query(ScrapingTask).filter_by(status=Status.PENDING, created_by=current_user.id).count()
-
-        # Get details of pending scraping tasks
-        pending_scraping_task_details = db.session.query(ScrapingTask).filter_by(status=Status.PENDING, created_by=current_user.id).all()
-
-        # Get product_ids created by the current user
-        user_product_ids = db.session.query(Product.id).filter_by(created_by=current_user.id).all()
-        user_product_ids = [prod[0] for prod in user_product_ids]  # Extract product ids from the query result
-
-        # Aggregate sentiment summary counts (from SentimentSummary table)
-        total_positive_reviews = db.session.query(db.func.sum(SentimentSummary.positive_count)) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)).scalar() or 0
-
-        total_negative_reviews = db.session.query(db.func.sum(SentimentSummary.negative_count)) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)).scalar() or 0
-
-        total_neutral_reviews = db.session.query(db.func.sum(SentimentSummary.neutral_count)) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)).scalar() or 0
-
-        # Get average rating across all products for the current user
-        average_rating = db.session.query(db.func.avg(SentimentSummary.average_rating)) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)).scalar() or 0
-        # Get the most common rating (most rating)
-        most_rating = db.session.query(SentimentSummary.most_rating) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)) \
-            .group_by(SentimentSummary.most_rating) \
-            .order_by(db.func.count().desc()).first()
-            
-        # Product with most positive reviews
-        product_with_most_positive_reviews = db.session.query(SentimentSummary.product_id, db.func.sum(SentimentSummary.positive_count).label('total_positive')) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)) \
-            .group_by(SentimentSummary.product_id) \
-            .order_by(db.func.sum(SentimentSummary.positive_count).desc()).first()
-
-        # Product with most negative reviews
-        product_with_most_negative_reviews = db.session.query(SentimentSummary.product_id, db.func.sum(SentimentSummary.negative_count).label('total_negative')) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)) \
-            .group_by(SentimentSummary.product_id) \
-            .order_by(db.func.sum(SentimentSummary.negative_count).desc()).first()
-
-        # Product with most neutral reviews
-        product_with_most_neutral_reviews = db.session.query(SentimentSummary.product_id, db.func.sum(SentimentSummary.neutral_count).label('total_neutral')) \
-            .filter(SentimentSummary.product_id.in_(user_product_ids)) \
-            .group_by(SentimentSummary.product_id) \
-            .order_by(db.func.sum(SentimentSummary.neutral_count).desc()).first()
-
-
-        # Prepare response data
-        response_data = {
-            "total_reviews": total_reviews,
-            "total_products": total_products,
-            "pending_scraping_tasks": pending_scraping_tasks,
-            "pending_scraping_task_details": [
-                {
-                    "task_id": task.id,
-                    "status": task.status.name,
-                    "created_at": task.created_at,
-                    "message": task.message,
-                    "platform": task.platform.name,
-                    "product_id": task.product_id
-                } for task in pending_scraping_task_details
-            ],
-            "total_positive_reviews": total_positive_reviews,
-            "total_negative_reviews": total_negative_reviews,
-            "total_neutral_reviews": total_neutral_reviews,
-            "average_rating": average_rating,
-            "most_rating": most_rating[0] if most_rating else 0,
-            "product_with_most_positive_reviews": product_with_most_positive_reviews[0] if product_with_most_positive_reviews else None,
-            "product_with_most_negative_reviews": product_with_most_negative_reviews[0] if product_with_most_negative_reviews else None,
-            "product_with_most_neutral_reviews": product_with_most_neutral_reviews[0] if product_with_most_neutral_reviews else None
-        }
+        # The statistics are materialized per user and kept up to date on every write,
+        # so this is a single primary key read
+        aggregate = db.session.get(DashboardAggregate, current_user.id)
+        if not aggregate:
+            aggregate = refresh_dashboard_aggregate(current_user.id)
+            db.session.commit()
 
         # Return the dashboard data
-        return jsonify(response_data), 200
+        return jsonify(dashboard_response(aggregate)), 200
 
     except Exception as e:
         print(e)
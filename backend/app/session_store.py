@@ -0,0 +1,89 @@
+"""
+Encrypted store of the marketplace sessions the scrapers sign in to.
+
+After the scraping browser signs in, its cookies are saved under the account's name in
+SESSION_STORE_DIR, encrypted with Fernet (AES with an HMAC) under SESSION_STORE_KEY, or a
+key derived from SECRET_KEY when it is not set. The next scrapes load them into their HTTP
+client and browser, so they are signed in from the first page. Cookies past their expiry
+are dropped on load, and a session older than SESSION_MAX_AGE is not used at all. A file
+that does not decrypt (another key, or tampered with) is treated as missing.
+
+The fallback SECRET_KEY of config.py is in the repository, so a key derived from it
+protects nothing: with neither SESSION_STORE_KEY nor SECRET_KEY set, no session is saved
+or loaded, every scrape signs in again, and a warning says so.
+"""
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import time
+from app import app
+from config import DEFAULT_SECRET_KEY
+
+
+def session_key():
+    """The Fernet key of the store, or None when only the public fallback SECRET_KEY is configured."""
+    key = app.config['SESSION_STORE_KEY']
+    if key:
+        return key.encode()
+    if app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY:
+        return None
+    return base64.urlsafe_b64encode(hashlib.sha256(app.config['SECRET_KEY'].encode()).digest())
+
+
+def warn_no_key(name, action):
+    app.logger.warning(f'Not {action} the session of {name}: set SESSION_STORE_KEY or SECRET_KEY to store sessions encrypted')
+
+
+def session_path(name):
+    # Account names (e-mail addresses, phone numbers) are not written to the file names
+    return os.path.join(app.config['SESSION_STORE_DIR'], hashlib.sha256(name.encode()).hexdigest()[:32] + '.session')
+
+
+def load_session(name):
+    """The unexpired cookies (as Selenium cookie dicts) saved for `name`, or None."""
+    from cryptography.fernet import Fernet, InvalidToken
+
+    key = session_key()
+    if key is None:
+        warn_no_key(name, 'loading')
+        return None
+    try:
+        with open(session_path(name), 'rb') as f:
+            token = f.read()
+        session = json.loads(Fernet(key).decrypt(token, ttl=app.config['SESSION_MAX_AGE']))
+    except FileNotFoundError:
+        return None
+    except (InvalidToken, ValueError):
+        app.logger.info(f'Discarding the saved session of {name}: expired, or not readable with this key')
+        discard_session(name)
+        return None
+    now = time.time()
+    cookies = [cookie for cookie in session['cookies'] if cookie.get('expiry') is None or cookie['expiry'] > now]
+    return cookies or None
+
+
+def save_session(name, cookies):
+    """Saves the cookies of a signed-in session for `name`, replacing the previous ones."""
+    from cryptography.fernet import Fernet
+
+    key = session_key()
+    if key is None:
+        warn_no_key(name, 'saving')
+        return
+    directory = app.config['SESSION_STORE_DIR']
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    token = Fernet(key).encrypt(json.dumps({'cookies': list(cookies)}).encode())
+    # Written to a temporary file and renamed, so concurrent scrapes never read half a file
+    fd, temporary = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(token)
+    os.replace(temporary, session_path(name))
+
+
+def discard_session(name):
+    try:
+        os.remove(session_path(name))
+    except FileNotFoundError:
+        pass
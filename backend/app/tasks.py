@@ -1,42 +1,38 @@
 # tasks.py
-from selenium import webdriver
-import os
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
-from selenium.webdriver.common.action_chains import ActionChains
-
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
+# Selenium, NLTK and scikit-learn take seconds to import, so they are imported where they are
+# first used (in the scraper threads and the analysis request) instead of when the app starts.
+# The scrapers fetch pages over HTTP and only start Chrome for the pages that need it (see app/fetcher.py).
 from bs4 import BeautifulSoup
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
 import random
 import string
 import time
-from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
+import math
+from functools import lru_cache
+from urllib.parse import urlparse, urlunparse, parse_qs, urlencode, urljoin
 import json
 from app import app,db
 from app.models import ScrapingTask, RawReview, Status, ReviewSource
+from app.parsers import parse_rating, parse_review_date
+from app.writer import write_serializer
+from app.reaper import is_product_deleting, check_product, ProductDeleted
+from app.metrics import ScrapeMeter
+from app.fetcher import Fetcher
+from app.leases import worker_id, lease_expiry, run_with_lease
+from app.jobs import job_handler, enqueue_job, run_in_workers
+from datetime import date, datetime, timedelta
+from sqlalchemy.exc import IntegrityError
 
-import pandas as pd
-import pickle
 import re
-import nltk
-
-if os.environ.get('FLASK_ENV') != 'production':
-    nltk.download('stopwords')
-    nltk.download('punkt')
-    nltk.download('wordnet')
-from nltk.corpus import stopwords
-from nltk import word_tokenize
-from nltk.stem import WordNetLemmatizer
-import plotly.graph_objs as go
-from wordcloud import WordCloud
-from io import BytesIO
-import base64
-import matplotlib.pyplot as plt
-from sklearn.feature_extraction.text import CountVectorizer
+import threading
+import uuid
+
+# NLTK data used by preprocess_text, as (resource path, downloader package). Nothing is
+# downloaded at runtime; install it with `python -m nltk.downloader stopwords punkt_tab wordnet`.
+NLTK_RESOURCES = (
+    ('corpora/stopwords', 'stopwords'),
+    ('tokenizers/punkt_tab', 'punkt_tab'),
+    ('corpora/wordnet', 'wordnet'),
+)
 
 
 # Function to remove the 'page' parameter and add a new one
@@ -71,11 +67,11 @@ def generate_ref(pagenumber):
 
 # Helper to build the product URL
 def get_product_url(asin, ref, star='all_stars', format='all_formats', pagenumber=1):
-    return f"https://www.amazon.in/product-reviews/{asin}/ref={ref}?ie=UTF8&reviewerType=all_reviews&filterByStar={star}&formatType={format}&pageNumber={pagenumber}"
+    return f"{app.config['AMAZON_BASE_URL']}/product-reviews/{asin}/ref={ref}?ie=UTF8&reviewerType=all_reviews&filterByStar={star}&formatType={format}&pageNumber={pagenumber}"
 
-# Function to extract reviews from a page
+# Function to extract reviews from a page (its source, or the page parsed already)
 def extract_reviews_from_page(page_source):
-    soup = BeautifulSoup(page_source, 'html.parser')
+    soup = page_source if isinstance(page_source, BeautifulSoup) else BeautifulSoup(page_source, 'html.parser')
    
     reviews = soup.find_all('div', {'data-hook': 'review'})
     extracted_reviews = []
@@ -101,263 +97,340 @@ def extract_reviews_from_page(page_source):
     return extracted_reviews
 
 
+# Database writes of the scrapers, run by the writer thread (see app/writer.py)
+def create_scraping_task(task_id, fsn_asin, platform, product_id, created_by, leased=True):
+    # Leased to this process, which runs the scrape (see app/leases.py); a scrape queued for a
+    # worker is not, the lease of its job covers it (see app/jobs.py)
+    check_product(product_id)
+    db.session.add(ScrapingTask(id=task_id, fsn_asin=fsn_asin, platform=platform, status=Status.PENDING, created_by=created_by, product_id=product_id,
+                                owner=worker_id() if leased else None, lease_expires_at=lease_expiry() if leased else None))
+
+def set_task_status(task_id, status, message=None):
+    task = db.session.get(ScrapingTask, task_id)
+    if task is None:  # Removed together with its deleted product
+        return
+    task.status = status
+    if status != Status.PENDING:
+        task.finished_at = datetime.now()
+    if message is not None:
+        task.message = message
+
+def store_raw_reviews(task_id, product_id, raw_reviews):
+    # Saves the scraped reviews and completes the task in the same transaction
+    check_product(product_id)
+    db.session.add_all(RawReview(task_id=task_id, **review) for review in raw_reviews)
+    set_task_status(task_id, Status.COMPLETED)
+
+def fail_task(task_id, message):
+    write_serializer.run(set_task_status, task_id, Status.FAILED, message)
+
+def check_cancelled(product_id):
+    # Stops a scrape whose product was deleted in the meantime
+    if is_product_deleting(product_id):
+        raise ProductDeleted(f'Cancelled: product {product_id} deleted')
+
+
+def parse_amazon_page(page):
+    """Parser for Fetcher.fetch_pages: the reviews of an Amazon page, and whether it has a next page."""
+    soup = BeautifulSoup(page.text, 'html.parser')
+    next_button = soup.find(class_='a-last')
+    return extract_reviews_from_page(soup), next_button is not None and 'a-disabled' not in next_button.get('class', [])
+
+def extract_flipkart_reviews(soup):
+    # Returns None when the page has no review list
+    main_div = soup.find('div', class_='DOjaWF gdgoEp col-9-12')
+    if main_div is None:
+        return None
+    review_list = []
+    for div in main_div.find_all("div", class_="cPHDOP col-12-12"):
+        review_dict = {}
+        row_elements = div.find_all(class_="row")
+        for row in row_elements:
+            try:
+                review_dict['rating'] = row.find(class_='XQDdHH Ga3i8K').get_text()
+            except:
+                pass
+            try:
+                review_dict['title'] = row.find('p', class_='z9E0IG').get_text()
+            except:
+                pass
+            try:
+                review_text = row.find(class_='ZmyHeo')
+                review_dict['review'] = review_text.get_text(separator=" ", strip=True).split('<span>')[0].rstrip(' READ MORE')
+            except:
+                pass
+        try:
+            userAndDate = div.find(class_='row gHqwa8').find(class_='row')
+            userAndDate = userAndDate.find_all('p')
+            review_dict['buyer'] = userAndDate[0].get_text()
+            review_dict['date'] = userAndDate[-1].get_text()
+        except:
+            pass
+        review_list.append(review_dict)
+    return review_list
+
+def parse_flipkart_page(page):
+    """Parser for Fetcher.fetch_pages: the reviews of a Flipkart page, and whether it has a next page."""
+    soup = BeautifulSoup(page.text, 'html.parser')
+    reviews = extract_flipkart_reviews(soup)
+    if reviews is None:
+        return [], False
+    nav_element = soup.find('nav', class_='WSL9JP')
+    return reviews, nav_element is not None and nav_element.find(class_='_9QVEpD') is not None
+
+# Markup of server-rendered pages; a page without it is loaded in Chrome (see app/fetcher.py)
+AMAZON_REVIEW_LIST = 'cm_cr-review_list'
+FLIPKART_REVIEWS_LINK = '_23J90q RcXBOT'
+FLIPKART_REVIEW_LIST = 'DOjaWF gdgoEp col-9-12'
+
+
 def scrape_flipkart_reviews(fsn, task_id, product_id, **kwargs):
     with app.app_context():
+        fetcher = None
         try:
             print('starting reviews fetch')
-            created_by = kwargs.get('created_by')
-            task = ScrapingTask(id=task_id, fsn_asin=fsn, platform=ReviewSource.FLIPKART, status=Status.PENDING, created_by=created_by, product_id = product_id)
-            db.session.add(task)
-            db.session.commit()
-            chrome_options = Options()
-
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--window-size=1920x1080')
-            chrome_options.add_argument('--disable-extensions')
-            chrome_options.add_argument('--disable-infobars')
-            chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-
-            # ChromeDriver Service
-            service = Service("/usr/bin/chromedriver")  # Adjust path as needed
-
-            driver = webdriver.Chrome(service=service, options=chrome_options)
-            product_url = f'https://www.flipkart.com/product/p/itme?pid={fsn}'
+            # Pages are fetched over HTTP, and only loaded in Chrome when they need it
+            fetcher = Fetcher()
+            product_url = f"{app.config['FLIPKART_BASE_URL']}/product/p/itme?pid={fsn}"
+            max_pages = 1000  # a bound for a pager that never ends; listings end well before
             review_list = []
 
-            try:
-                driver.get(product_url)
-
-                # Close popup if present
-                try:
-                    close_button = driver.find_element(By.XPATH, "//span[@role='button' and contains(@class, '_30XB9F') and text()='✕']")
-                    close_button.click()
-                except NoSuchElementException:
-                    pass
-
-                # Navigate to reviews section
-                try:
-                    div_element = WebDriverWait(driver, 5).until(
-                        EC.presence_of_element_located((By.XPATH, "//div[contains(@class, '_23J90q RcXBOT')]/span[contains(text(), 'All') and contains(text(), 'reviews')]"))
-                    )
-                    review_page_anchor = div_element.find_element(By.XPATH, "./ancestor::a")
-                    review_page_anchor.click()
-                except TimeoutException:
-                    task.status = Status.FAILED
-                    task.message = "Reviews section not found. Timeout error"
-                    db.session.commit()
-                    return json.dumps({"success": False, "message": "Reviews section not found.", "error": 'Timeout Error'})
-
-                # Scraping loop
-                page = 1
-                flag = True
-                while flag:
-                    try:
-                        main_div = WebDriverWait(driver, 10).until(
-                            EC.presence_of_element_located((By.XPATH, "//div[contains(@class, 'DOjaWF gdgoEp col-9-12')]"))
-                        )
-                        soup = BeautifulSoup(main_div.get_attribute('outerHTML'), 'html.parser')
-                        nested_divs = soup.find_all("div", class_="cPHDOP col-12-12")
-
-                        for div in nested_divs:
-                            review_dict = {}
-                            row_elements = div.find_all(class_="row")
-                            for row in row_elements:
-                                try:
-                                    review_dict['rating'] = row.find(class_='XQDdHH Ga3i8K').get_text()
-                                except:
-                                    pass
-                                try:
-                                    review_dict['title'] = row.find('p', class_='z9E0IG').get_text()
-                                except:
-                                    pass
-                                try:
-                                    review_text = row.find(class_='ZmyHeo')
-                                    review_dict['review'] = review_text.get_text(separator=" ", strip=True).split('<span>')[0].rstrip(' READ MORE')
-                                except:
-                                    pass
-                            try:
-                                userAndDate = div.find(class_='row gHqwa8').find(class_='row')
-                                userAndDate = userAndDate.find_all('p')
-                                review_dict['buyer'] = userAndDate[0].get_text()
-                                review_dict['date'] = userAndDate[-1].get_text()
-                            except:
-                                pass
-                            review_list.append(review_dict)
-                    except TimeoutException:
-                        flag = False
-
-                    # Navigate to next page if available
-                    try:
-                        nav_element = WebDriverWait(driver, 10).until(
-                            EC.presence_of_element_located((By.XPATH, "//nav[@class='WSL9JP']"))
-                        )
-                        next_button = nav_element.find_element(By.CLASS_NAME, "_9QVEpD")
-                        page += 1
-                        updated_url = update_url_with_page_parameter(driver.current_url, page_value=page)
-                        driver.get(updated_url)
-                    except (NoSuchElementException, TimeoutException):
-                        flag = False
-            except Exception as e:
-                task.status = Status.FAILED
-                task.message = str(e)
-                db.session.commit()
-                return json.dumps({"success": False, "message": "An unexpected error occurred.", "error": str(e)})
-            finally:
-                driver.quit()
-                db.session.commit()
+            # Find the link to the reviews section
+            product_page = fetcher.fetch(product_url, expect=FLIPKART_REVIEWS_LINK)
+            soup = BeautifulSoup(product_page.text, 'html.parser')
+            reviews_url = None
+            for div_element in soup.select('div._23J90q.RcXBOT'):
+                span = div_element.find('span', string=lambda text: text and 'All' in text and 'reviews' in text)
+                review_page_anchor = div_element.find_parent('a', href=True)
+                if span and review_page_anchor:
+                    reviews_url = urljoin(product_page.final_url, review_page_anchor['href'])
+                    break
+            if reviews_url is None:
+                fail_task(task_id, "Reviews section not found.")
+                return json.dumps({"success": False, "message": "Reviews section not found.", "error": 'Not found'})
+
+            # Scraping loop, several pages at a time
+            meter = ScrapeMeter(ReviewSource.FLIPKART)
+            pages = fetcher.fetch_pages(
+                lambda page: update_url_with_page_parameter(reviews_url, page_value=page),
+                parse_flipkart_page, max_pages, expect=FLIPKART_REVIEW_LIST
+            )
+            for reviews in pages:
+                check_cancelled(product_id)
+                meter.page()
+                review_list.extend(reviews)
+            fetcher.close()
+            meter.finish()
             review_list = [d for d in review_list if d]
             print('completed reviews fetching')
-            for review in review_list:
-                new_review = RawReview(
-                    task_id=task_id,
-                    title=review.get('title'),
-                    rating=review.get('rating'),
-                    body=review.get('review'),
-                    author=review.get('buyer'),
-                    date=review.get('date'),
-                    platform=ReviewSource.FLIPKART,
-                    product_id=product_id
-                )
-                db.session.add(new_review)
-            task.status = Status.COMPLETED
-            db.session.commit()
+            scraped_on = date.today()
+            raw_reviews = [
+                {
+                    'title': review.get('title'),
+                    'rating': review.get('rating'),
+                    'rating_value': parse_rating(ReviewSource.FLIPKART, review.get('rating')),
+                    'body': review.get('review'),
+                    'author': review.get('buyer'),
+                    'date': review.get('date'),
+                    'posted_on': parse_review_date(ReviewSource.FLIPKART, review.get('date'), scraped_on),
+                    'platform': ReviewSource.FLIPKART,
+                    'product_id': product_id
+                }
+                for review in review_list
+            ]
+            write_serializer.run(store_raw_reviews, task_id, product_id, raw_reviews)
             return json.dumps({"success": True, "message": "Scraping completed successfully.",'reviews': review_list})  # Return scraped reviews
         except Exception as e:
-            task.status = Status.FAILED
-            task.message = str(e)
-            db.session.commit()
+            fail_task(task_id, str(e))
+            return json.dumps({"success": False, "message": "An unexpected error occurred.", "error": str(e)})
         finally:
-            driver.quit()
-            return 
-            
+            if fetcher is not None:
+                fetcher.close()
+
+
+class SignInError(Exception):
+    pass
+
+def amazon_sign_in(driver):
+    # Signs in on the Amazon sign-in page the browser was redirected to
+    from selenium.webdriver.common.by import By
+
+    page_wait = app.config['AMAZON_PAGE_WAIT']
+    if not app.config['AMAZON_EMAIL'] or not app.config['AMAZON_PASSWORD']:
+        raise SignInError('Amazon asked to sign in, but AMAZON_EMAIL and AMAZON_PASSWORD are not set')
+    try:
+        email_element = driver.find_element(By.ID, 'ap_email')
+        email_element.send_keys(app.config['AMAZON_EMAIL'])
+        time.sleep(page_wait)
+        second_continue_button = driver.find_element(By.XPATH, "//input[@id='continue' and @class='a-button-input']")
+        second_continue_button.click()
+        time.sleep(page_wait)
+        password_field = driver.find_element(By.ID, "ap_password")
+        password_field.send_keys(app.config['AMAZON_PASSWORD'])
+
+        # Step 4: Submit the form (assuming there is a 'signInSubmit' button)
+        sign_in_button = driver.find_element(By.ID, "signInSubmit")
+        sign_in_button.click()
+
+        time.sleep(page_wait)
+    except Exception as e:
+        raise SignInError(str(e)) from e
+    if '/ap/signin' in driver.current_url:
+        raise SignInError('Amazon did not accept the sign-in')
+
 def scrape_amazon_reviews(asin, task_id, product_id, **kwargs):
     with app.app_context():
+        fetcher = None
         try:
             
-            created_by = kwargs.get('created_by')
             print('started amazon reviews fetch')
-            task = ScrapingTask(id=task_id, fsn_asin=asin, platform=ReviewSource.AMAZON, status=Status.PENDING, created_by=created_by, product_id=product_id)
-            db.session.add(task)
-            db.session.commit()
             max_pages = 100
             all_reviews = []
-            chrome_options = Options()
-
-            chrome_options.add_argument('--headless')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--window-size=1920x1080')
-            chrome_options.add_argument('--disable-extensions')
-            chrome_options.add_argument('--disable-infobars')
-            chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
-            # ChromeDriver Service
-            service = Service("/usr/bin/chromedriver")  # Adjust path as needed
-            driver = webdriver.Chrome(service=service, options=chrome_options)
+            # Pages are fetched over HTTP, and only loaded in Chrome (which signs in) when they need it;
+            # the session of the last sign-in is reused
+            fetcher = Fetcher(sign_in=amazon_sign_in, page_wait=app.config['AMAZON_PAGE_WAIT'],
+                              session=f"amazon:{app.config['AMAZON_EMAIL']}")
+            meter = ScrapeMeter(ReviewSource.AMAZON)
+
+            def scrape_star_filter(star):
+                # The pages of one star filter in order; the filters run on the fetcher's threads
+                with app.app_context():
+                    reviews = []
+                    pages = fetcher.fetch_pages(
+                        lambda page: get_product_url(asin=asin, ref=generate_ref(page), star=star, format=formatType[0], pagenumber=page),
+                        parse_amazon_page, max_pages, expect=AMAZON_REVIEW_LIST, window=1
+                    )
+                    for page_reviews in pages:
+                        check_cancelled(product_id)
+                        meter.page()
+                        reviews.extend(page_reviews)
+                    return reviews
 
-            try:
-                for star in filterByStar:
-                    ref = generate_ref(1)
-                    product_url = get_product_url(asin=asin, ref=ref, star=star, format=formatType[0])
-
-                    try:
-                        driver.get(product_url)
-                        time.sleep(3)
-                        current_url = driver.current_url
-                        if "/ap/signin" in current_url:
-                            try:
-                                email_element = driver.find_element(By.ID, 'ap_email')
-                                email_element.send_keys('8368918163')
-                                time.sleep(2)
-                                second_continue_button = driver.find_element(By.XPATH, "//input[@id='continue' and @class='a-button-input']")
-                                second_continue_button.click()
-                                time.sleep(3)
-                                password_field = driver.find_element(By.ID, "ap_password")
-                                password_field.send_keys("Vaibhav@123")  # Replace with your actual password
-
-                                # Step 4: Submit the form (assuming there is a 'signInSubmit' button)
-                                sign_in_button = driver.find_element(By.ID, "signInSubmit")
-                                sign_in_button.click()
-
-                                # Optional: Add more wait or verification to ensure login success
-                                time.sleep(3)
-                            except Exception as e:
-                                task.status = Status.FAILED
-                                task.message = 'Login issue at amazon'+str(e)
-                                db.session.commit()
-                                return json.dumps({"success": False, "message": "Failed to load amazon.", "error": str(e)})
-                    except Exception as e:
-                        task.status = Status.FAILED
-                        task.message = str(e)
-                        db.session.commit()
-                        return json.dumps({"success": False, "message": "Failed to load the initial page.", "error": str(e)})
-
-                    current_page = 1
-                    while current_page <= max_pages:
-                        try:
-                            # Extract reviews
-                            reviews = extract_reviews_from_page(driver.page_source)
-                            all_reviews.extend(reviews)
-
-                            # Check if there is a next page
-                            try:
-                                next_button = driver.find_element(By.CLASS_NAME, 'a-last')
-                                if 'a-disabled' in next_button.get_attribute('class'):
-                                    break  # Stop if there's no next page
-                            except Exception as e:
-                                break
-                            finally:
-                                # Generate URL for the next page and navigate
-                                current_page+=1
-
-                            current_ref = generate_ref(current_page)
-                            product_url = get_product_url(asin=asin, ref=current_ref, star=star, format=formatType[0], pagenumber=current_page)
-                            driver.get(product_url)
-                            time.sleep(3)
-                        except Exception as e:
-                            task.status = Status.FAILED
-                            task.message = str(e)
-                            db.session.commit()
-                            return json.dumps({"success": False, "message": "Error during scraping process.", "error": str(e)})
-
-            except Exception as e:
-                task.status = Status.FAILED
-                task.message = str(e)
-                db.session.commit()
-                return json.dumps({"success": False, "message": "An unexpected error occurred.", "error": str(e)})
-            finally:
-                driver.quit()
+            for reviews in fetcher.map(scrape_star_filter, filterByStar):
+                all_reviews.extend(reviews)
+            fetcher.close()
+            meter.finish()
 
             print('completed amazon reviews fetch')
-            for review in all_reviews:
-                new_review = RawReview(
-                    task_id=task_id,
-                    title=review.get('title'),
-                    rating=review.get('rating'),
-                    body=review.get('body'),
-                    author=review.get('author'),
-                    date=review.get('date'),
-                    platform=ReviewSource.AMAZON,
-                    product_id = product_id
-                )
-                db.session.add(new_review)
-            task.status = Status.COMPLETED
-            db.session.commit()
+            raw_reviews = [
+                {
+                    'title': review.get('title'),
+                    'rating': review.get('rating'),
+                    'rating_value': parse_rating(ReviewSource.AMAZON, review.get('rating')),
+                    'body': review.get('body'),
+                    'author': review.get('author'),
+                    'date': review.get('date'),
+                    'posted_on': parse_review_date(ReviewSource.AMAZON, review.get('date')),
+                    'platform': ReviewSource.AMAZON,
+                    'product_id': product_id
+                }
+                for review in all_reviews
+            ]
+            write_serializer.run(store_raw_reviews, task_id, product_id, raw_reviews)
             
             return json.dumps({"success": True, "message": "Scraping completed successfully.", "reviews": all_reviews})
+        except SignInError as e:
+            fail_task(task_id, 'Login issue at amazon'+str(e))
+            return json.dumps({"success": False, "message": "Failed to load amazon.", "error": str(e)})
         except Exception as e:
-            task.status = Status.FAILED
-            task.message = str(e)
-            db.session.commit()
+            fail_task(task_id, str(e))
+            return json.dumps({"success": False, "message": "An unexpected error occurred.", "error": str(e)})
         finally:
-            driver.quit()
-            return 
-    
+            if fetcher is not None:
+                fetcher.close()
+
+
+SCRAPERS = {
+    ReviewSource.AMAZON: scrape_amazon_reviews,
+    ReviewSource.FLIPKART: scrape_flipkart_reviews,
+}
+# Serializes the check for a running or fresh scrape with the start of a new one in this
+# process; the unique index on running tasks covers the other gunicorn workers
+scrape_start_lock = threading.Lock()
+
+def running_scrape(platform, platform_id):
+    return ScrapingTask.query.filter_by(platform=platform, fsn_asin=platform_id, status=Status.PENDING).first()
+
+def fresh_scrape(platform, platform_id, product_id):
+    # The newest scrape of the listing completed within the platform's SCRAPE_FRESHNESS_TTL
+    ttl = app.config['SCRAPE_FRESHNESS_TTL'][platform.name.lower()]
+    return ScrapingTask.query.filter(
+        ScrapingTask.platform == platform,
+        ScrapingTask.fsn_asin == platform_id,
+        ScrapingTask.product_id == product_id,
+        ScrapingTask.status == Status.COMPLETED,
+        ScrapingTask.finished_at >= datetime.now() - timedelta(seconds=ttl),
+    ).order_by(ScrapingTask.finished_at.desc()).first()
+
+def start_scrape(platform, platform_id, product_id, created_by, force=False):
+    """
+    Single-flight start of a scrape of a listing. Returns (task, state): the running scrape of
+    the listing ('running'), else its scrape completed within the freshness TTL unless `force`
+    ('fresh'), else a new task whose scrape was started on a thread, or queued for the workers
+    with JOB_EXECUTOR=worker ('started').
+    """
+    with scrape_start_lock:
+        task = running_scrape(platform, platform_id)
+        if task:
+            return task, 'running'
+        task = None if force else fresh_scrape(platform, platform_id, product_id)
+        if task:
+            return task, 'fresh'
+        task_id = str(uuid.uuid4())
+        try:
+            write_serializer.run(create_scraping_task, task_id, platform_id, platform, product_id, created_by, leased=not run_in_workers())
+        except IntegrityError:
+            # Another worker started one in the meantime; a new transaction sees it
+            db.session.rollback()
+            task = running_scrape(platform, platform_id)
+            if task:
+                return task, 'running'
+            raise
+        if run_in_workers():
+            payload = {'platform': platform.name, 'platform_id': platform_id, 'task_id': task_id, 'product_id': product_id}
+            enqueue_job('scrape', payload, created_by, job_id=task_id)
+        else:
+            threading.Thread(target=run_with_lease, args=(task_id, SCRAPERS[platform], platform_id, task_id, product_id)).start()
+        return ScrapingTask(id=task_id, fsn_asin=platform_id, platform=platform, status=Status.PENDING,
+                            product_id=product_id, created_by=created_by, created_at=datetime.now()), 'started'
+
+def fail_scrape_task(payload, error):
+    # Writer job, in the transaction failing the scrape job: its task is not left PENDING,
+    # which would keep the listing from being scraped again
+    task = db.session.get(ScrapingTask, payload['task_id'])
+    if task is not None and task.status == Status.PENDING:
+        set_task_status(task.id, Status.FAILED, (error or 'Scrape job failed')[:200])
+
+@job_handler('scrape', on_failure=fail_scrape_task)
+def run_scrape_job(payload):
+    # The scraper records its outcome on the task; the job only keeps the summary
+    result = json.loads(SCRAPERS[ReviewSource[payload['platform']]](payload['platform_id'], payload['task_id'], payload['product_id']))
+    return {'success': result['success'], 'message': result['message'], 'reviews': len(result.get('reviews', []))}
+
+def missing_nltk_resources():
+    """Returns the downloader packages of the NLTK data that is not installed locally."""
+    import nltk
+    missing = []
+    for path, package in NLTK_RESOURCES:
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(package)
+    return missing
+
+@lru_cache(maxsize=None)
+def text_tools():
+    """Loads NLTK once, on the first review preprocessed: (stop words, tokenizer, lemmatizer)."""
+    missing = missing_nltk_resources()
+    if missing:
+        raise LookupError(f"NLTK data missing: {', '.join(missing)}. Install it with `python -m nltk.downloader {' '.join(missing)}`")
+    from nltk.corpus import stopwords
+    from nltk import word_tokenize
+    from nltk.stem import WordNetLemmatizer
+    return set(stopwords.words("english")), word_tokenize, WordNetLemmatizer()
 
 def preprocess_text(text):
+    stop_words, word_tokenize, lemmatizer = text_tools()
     # Make text lowercase and remove links, text in square brackets, punctuation, and words containing numbers
     text = str(text)
     text = text.lower()
@@ -369,16 +442,14 @@ def preprocess_text(text):
     text = cleaned_text.strip()
 
     # Remove stop words
-    stop_words = set(stopwords.words("english"))
     words = text.split()
     filtered_words = [word for word in words if word not in stop_words]
     text = ' '.join(filtered_words).strip()
 
     # Tokenize
-    tokens = nltk.word_tokenize(text)
+    tokens = word_tokenize(text)
 
     # Lemmatize
-    lemmatizer = WordNetLemmatizer()
     lem_tokens = [lemmatizer.lemmatize(token) for token in tokens]
 
     
@@ -387,9 +458,14 @@ def preprocess_text(text):
 def convert_rating(rating):
     """
     Convert rating from string format 'X out of 5 stars' to a float.
+    Ratings already parsed at ingest are passed through as floats.
     If rating is invalid or None, returns None.
     """
-    if pd.isna(rating) or not rating.strip():
+    if rating is None or (isinstance(rating, float) and math.isnan(rating)):
+        return None
+    if isinstance(rating, (int, float)):
+        return float(rating)
+    if not rating.strip():
         return None
     
     try:
@@ -419,6 +495,8 @@ def word_distribution(text_data, top_n=50):
         "features": [],
         "frequency": []
     }
+    from sklearn.feature_extraction.text import CountVectorizer
+
     # Initialize CountVectorizer with max_features to limit to top N tokens
     vectorizer = CountVectorizer(max_features=top_n)
     
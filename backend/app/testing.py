@@ -0,0 +1,183 @@
+"""
+Pytest helpers, loaded by conftest.py with `pytest_plugins = ['app.testing']`.
+
+The schema is created once per test session, from the models and the migrations. Every
+test that needs data gets a user of its own (`user`), so tests do not see each other's
+products and tasks, and `client` is a test client logged in as that user.
+"""
+import importlib.util
+import os
+import threading
+import time
+import uuid
+import pytest
+from app import app, db
+from app.migrations import upgrade
+from app.models import User, Product, ProductPlatform, ReviewSource, ScrapingTask, Status
+from app.querycount import assert_max_queries
+
+
+@pytest.fixture(scope='session', autouse=True)
+def database():
+    with app.app_context():
+        db.create_all()
+    upgrade()
+    return db
+
+
+@pytest.fixture
+def user(database):
+    """The id of a new user."""
+    with app.app_context():
+        name = f'test-{uuid.uuid4().hex[:12]}'
+        user = User(username=name, email=f'{name}@example.com', password_hash='-')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+        session['_fresh'] = True
+    return client
+
+
+def add_products(user_id, count, platforms=(ReviewSource.AMAZON, ReviewSource.FLIPKART)):
+    """Adds `count` products of the user, listed on the platforms; returns their ids."""
+    with app.app_context():
+        products = [Product(name=f'Product {i}', description='Test product', created_by=user_id) for i in range(count)]
+        db.session.add_all(products)
+        db.session.flush()
+        for product in products:
+            for platform in platforms:
+                prefix = 'B' if platform == ReviewSource.AMAZON else 'ACC'
+                db.session.add(ProductPlatform(product_id=product.id, platform=platform,
+                                               platform_id=f'{prefix}{uuid.uuid4().hex[:13].upper()}'))
+        db.session.commit()
+        return [product.id for product in products]
+
+
+def add_task(user_id, product_id, platform=ReviewSource.AMAZON, status=Status.PENDING, **columns):
+    """Adds a scraping task of the product's listing on the platform; returns its id."""
+    with app.app_context():
+        listing = ProductPlatform.query.filter_by(product_id=product_id, platform=platform).one()
+        task = ScrapingTask(id=str(uuid.uuid4()), fsn_asin=listing.platform_id, platform=platform, status=status,
+                            product_id=product_id, created_by=user_id, **columns)
+        db.session.add(task)
+        db.session.commit()
+        return task.id
+
+
+def write_model_pickle(path, texts, labels):
+    """Writes a `models.p` like the real one (a TF-IDF vectorizer, `logreg` and `svm`) trained on the texts."""
+    import pickle
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC
+
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2))
+    X = vectorizer.fit_transform(texts)
+    models = {'vectorizer': vectorizer, 'logreg': LogisticRegression().fit(X, labels), 'svm': SVC(kernel='linear').fit(X, labels)}
+    with open(path, 'wb') as f:
+        pickle.dump(models, f)
+
+
+# A tiny corpus to train the models of `model_files` on
+TRAINING_TEXTS = ['great product love it', 'awful waste of money', 'it is okay', 'love the great battery',
+                  'broke after a day awful', 'okay for the price', 'great value', 'terrible awful quality', 'fine okay']
+TRAINING_LABELS = ['Positive', 'Negative', 'Neutral'] * 3  # the labels of the real models
+
+
+@pytest.fixture
+def model_files(tmp_path, monkeypatch):
+    """
+    A `models.p` trained on TRAINING_TEXTS and its converted package, used by the app (and by
+    the inference processes it spawns) instead of the real models. Returns their config.
+    """
+    from app import model_store
+
+    config = {'MODEL_PICKLE': str(tmp_path / 'models.p'), 'MODEL_PACKAGE': str(tmp_path / 'models')}
+    write_model_pickle(config['MODEL_PICKLE'], TRAINING_TEXTS, TRAINING_LABELS)
+    model_store.convert_pickle(config['MODEL_PICKLE'], config['MODEL_PACKAGE'])
+    for name, path in config.items():
+        monkeypatch.setitem(app.config, name, path)
+        monkeypatch.setenv(name, path)
+    monkeypatch.setattr(model_store, '_bundle', None)
+    return config
+
+
+@pytest.fixture
+def nltk_data():
+    """Skips a test that preprocesses texts when the NLTK data is not installed."""
+    from app.tasks import missing_nltk_resources
+    missing = missing_nltk_resources()
+    if missing:
+        pytest.skip(f"NLTK data missing; install it with `python -m nltk.downloader {' '.join(missing)}`")
+
+
+def wait_until(predicate, timeout=5):
+    """Polls `predicate` until it returns a true value, which is returned, or the timeout passes."""
+    deadline = time.monotonic() + timeout
+    while not (result := predicate()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return result
+
+
+def load_gunicorn_config():
+    """The gunicorn.conf.py module, to call its server hooks."""
+    path = os.path.join(os.path.dirname(app.root_path), 'gunicorn.conf.py')
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class LocalRedis:
+    """
+    In-memory stand-in for the redis-py client calls of the response cache (`get`, and `set`
+    with an expiry in seconds). One instance shared by several caches plays a Redis server
+    shared by several processes.
+    """
+
+    def __init__(self):
+        self.values = {}  # key -> (expires_at or None, value)
+        self.lock = threading.Lock()
+
+    def get(self, name):
+        with self.lock:
+            entry = self.values.get(name)
+            if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+                self.values.pop(name, None)
+                return None
+            return entry[1]
+
+    def set(self, name, value, ex=None):
+        # Values are stored and returned as bytes, as by Redis
+        with self.lock:
+            self.values[name] = (time.monotonic() + ex if ex else None, value if isinstance(value, bytes) else str(value).encode())
+
+
+@pytest.fixture
+def uncached(monkeypatch):
+    """Turns the response cache off, so every request runs its endpoint."""
+    from app.cache import response_cache
+    monkeypatch.setattr(response_cache, 'enabled', False)
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Fails a test when a block issues more SQL statements than its budget, so endpoints that
+    start querying once per row fail CI:
+
+        def test_products_query_count(client, query_budget):
+            with query_budget(4):
+                client.get('/products')
+
+    `query_budget(limit, n_plus_one_threshold=None)` also fails on a statement repeated at
+    least `n_plus_one_threshold` times. The counter it yields lists the statements.
+    """
+    return assert_max_queries
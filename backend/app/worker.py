@@ -0,0 +1,118 @@
+"""
+Worker process for the scrapes and analyses queued with JOB_EXECUTOR=worker (see app/jobs.py).
+
+Runs `--concurrency` jobs at a time (WORKER_CONCURRENCY by default), of the kinds given
+with `--kinds`, so scraping workers (with Chrome) and analysis workers (with the models)
+can run on different machines; start as many as the load needs, against the same database
+and JOB_BROKER_URL as the API. A heartbeat thread renews the leases of the running jobs and
+requeues the jobs of workers that died, and the product reaper (app/reaper.py) finishes
+deletions interrupted by a restart. SIGTERM or Ctrl-C stops taking jobs and exits once
+the running ones finish.
+
+    python -m app.worker [--concurrency 2] [--kinds scrape,analysis]
+"""
+import argparse
+import signal
+import threading
+import traceback
+from app import app, db
+# The job handlers are registered by app.tasks and app.routes, which the app imports
+from app.jobs import JOB_HANDLERS, broker, finish_job, recover_jobs, renew_job_leases
+from app.leases import worker_id
+from app.models import Job, JobStatus
+from app.reaper import product_reaper
+from app.writer import write_serializer
+
+
+class Worker:
+    def __init__(self, concurrency, kinds, poll_interval, heartbeat_interval):
+        self.concurrency = concurrency
+        self.kinds = kinds
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = worker_id()
+        self.running = set()
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def run(self):
+        app.logger.info(f"Worker {self.owner} running {', '.join(self.kinds)} jobs, {self.concurrency} at a time")
+        threading.Thread(target=self.heartbeat, name='job-heartbeat', daemon=True).start()
+        threads = [threading.Thread(target=self.work, name=f'job-runner-{n}') for n in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        app.logger.info(f'Worker {self.owner} stopped')
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def work(self):
+        try:
+            while not self.stopping.is_set():
+                try:
+                    job_id = broker.claim(self.owner, self.kinds, self.poll_interval)
+                except Exception:
+                    app.logger.exception('Taking a job failed')
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                if job_id is not None:
+                    self.execute(job_id)
+        finally:
+            broker.close()
+
+    def execute(self, job_id):
+        with self.lock:
+            self.running.add(job_id)
+        try:
+            with app.app_context():
+                job = db.session.get(Job, job_id)
+                kind, payload = job.kind, job.payload
+            app.logger.info(f'Running {kind} job {job_id}')
+            try:
+                result = JOB_HANDLERS[kind](payload)
+            except Exception as e:
+                app.logger.error(f'{kind} job {job_id} failed:\n{traceback.format_exc()}')
+                write_serializer.run(finish_job, job_id, self.owner, JobStatus.FAILED, error=str(e) or type(e).__name__)
+            else:
+                write_serializer.run(finish_job, job_id, self.owner, JobStatus.COMPLETED, result=result)
+        finally:
+            with self.lock:
+                self.running.discard(job_id)
+
+    def heartbeat(self):
+        # The first sweep requeues the jobs of workers that died before this one started
+        while True:
+            try:
+                with self.lock:
+                    job_ids = list(self.running)
+                if job_ids:
+                    write_serializer.run(renew_job_leases, job_ids, self.owner)
+                recover_jobs()
+            except Exception:
+                app.logger.exception('Renewing job leases failed')
+            self.stopping.wait(self.heartbeat_interval)
+            if self.stopping.is_set() and not self.running:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=app.config['WORKER_CONCURRENCY'], help='jobs run at a time')
+    parser.add_argument('--kinds', default=','.join(sorted(JOB_HANDLERS)), help='comma-separated kinds of jobs to run')
+    args = parser.parse_args()
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in JOB_HANDLERS]
+    if unknown:
+        parser.error(f"unknown kind of job {unknown[0]}, choose from {', '.join(sorted(JOB_HANDLERS))}")
+    app.logger.setLevel('INFO')
+    worker = Worker(args.concurrency, kinds, app.config['WORKER_POLL_INTERVAL'], app.config['TASK_HEARTBEAT_INTERVAL'])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    product_reaper.start()
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Single-writer queue for background database writes.
+
+SQLite allows one writer at a time. Instead of every scraper thread and analysis request
+opening its own write transaction (and failing with "database is locked" when they
+collide), they hand a function to `write_serializer`. One thread runs those functions and
+commits them in batches: jobs queued within `WRITE_BATCH_WAIT` of each other share one
+transaction. If a job raises, the batch is rolled back and its jobs are retried in one
+transaction each, so a failing job does not take the others down with it.
+
+Jobs use `db.session`, which inside the writer thread is the writer's own session, so pass
+ids and plain values in rather than ORM objects loaded by another session.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from app import app, db
+from app.metrics import Gauge, timer
+
+
+class WriteSerializer:
+    def __init__(self, enabled=True, batch_size=50, batch_wait=0.02):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.jobs = queue.Queue()
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.committed = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Queues `func(*args, **kwargs)` and returns a Future resolved once it is committed."""
+        future = Future()
+        if not self.enabled:
+            # Commit right away in a session of its own, as the writer thread would
+            future.set_running_or_notify_cancel()
+            with app.app_context():
+                self._commit_batch([(future, func, args, kwargs)])
+            return future
+        self._ensure_started()
+        self.jobs.put((future, func, args, kwargs))
+        return future
+
+    def run(self, func, *args, **kwargs):
+        """Like `submit`, but waits for the commit and returns the job's result (or raises its error)."""
+        return self.submit(func, *args, **kwargs).result()
+
+    def _ensure_started(self):
+        with self.lock:
+            # A forked worker process inherits the object but not the thread
+            if self.thread is None or self.pid != os.getpid() or not self.thread.is_alive():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._work, name='db-writer', daemon=True)
+                self.thread.start()
+
+    def _next_batch(self):
+        batch = []
+        job = self.jobs.get()
+        deadline = time.monotonic() + self.batch_wait
+        while True:
+            if job[0].set_running_or_notify_cancel():
+                batch.append(job)
+            if len(batch) >= self.batch_size:
+                return batch
+            try:
+                job = self.jobs.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                with app.app_context(), timer('write_batch'):
+                    self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        try:
+            results = [func(*args, **kwargs) for _, func, args, kwargs in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][0].set_exception(e)
+            else:
+                for job in batch:
+                    self._commit_batch([job])
+            return
+        self.batches += 1
+        self.committed += len(batch)
+        for (future, _, _, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+def create_write_serializer(config):
+    return WriteSerializer(
+        enabled=config.get('SERIALIZE_WRITES', True),
+        batch_size=config.get('WRITE_BATCH_SIZE', 50),
+        batch_wait=config.get('WRITE_BATCH_WAIT', 0.02),
+    )
+
+
+write_serializer = create_write_serializer(app.config)
+Gauge('sentimentscout_write_queue_depth', 'Jobs waiting for the writer thread.', write_serializer.jobs.qsize)
@@ -0,0 +1,75 @@
+"""
+Page loads of the scraping browser with and without resource blocking.
+
+Loads Amazon and Flipkart review pages from the marketplace stand-in (benchmarks/marketplace.py,
+with `assets`, so the pages pull in a stylesheet and web font, product images and an
+analytics script like the live ones) in headless Chrome set up by `browser_profile()`: once
+loading everything and once blocking images, stylesheets, fonts and trackers. Reports the
+mean and median load time of a page (to its load event), and the requests and bytes the
+marketplace served per page. Needs Chrome and the chromedriver at the path the scrapers use.
+
+    python -m benchmarks.browser_blocking [--pages 20] [--latency 0.02]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+CHROMEDRIVER = '/usr/bin/chromedriver'
+
+
+def load_pages(driver, urls):
+    """Loads the pages in turn; returns the seconds each took."""
+    times = []
+    for url in urls:
+        started = time.perf_counter()
+        driver.get(url)  # returns once the page's load event has fired
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=20, help='pages to load per platform and profile')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the marketplace takes per request')
+    args = parser.parse_args()
+    if not os.path.exists(CHROMEDRIVER):
+        sys.exit(f'chromedriver not found at {CHROMEDRIVER}, where the scrapers look for it')
+
+    # The marketplace imports the app, which opens its database when it is first imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    from app.fetcher import browser_profile, create_chrome_driver
+    from benchmarks.marketplace import MarketplaceServer
+
+    server = MarketplaceServer(pages=args.pages, latency=args.latency, assets=True)
+    urls = {
+        'amazon': [f'{server.url}/product-reviews/B000000001/ref=cm_cr_arp_d_paging_btm_next_{page}?pageNumber={page}'
+                   for page in range(1, args.pages + 1)],
+        'flipkart': [f'{server.url}/product/product-reviews/itme?pid=ACC0000000000001&page={page}'
+                     for page in range(1, args.pages + 1)],
+    }
+    print(f'{args.pages} pages per platform, {args.latency * 1000:.0f} ms a request')
+    print(f"  {'platform':<9} {'blocking':<8} {'mean ms':>8} {'median ms':>9} {'requests':>8} {'KB/page':>8}")
+    with server:
+        for platform, platform_urls in urls.items():
+            for block in (False, True):
+                driver = create_chrome_driver(browser_profile(block_resources=block))
+                try:
+                    driver.get(platform_urls[0])  # warm up Chrome
+                    requests_before = sum(server.stats[key] for key in ('amazon_pages', 'flipkart_pages', 'asset_requests'))
+                    bytes_before = server.stats['bytes']
+                    times = load_pages(driver, platform_urls)
+                finally:
+                    driver.quit()
+                requests = sum(server.stats[key] for key in ('amazon_pages', 'flipkart_pages', 'asset_requests')) - requests_before
+                transferred = server.stats['bytes'] - bytes_before
+                print(f"  {platform:<9} {'on' if block else 'off':<8} {statistics.mean(times) * 1000:8.1f} "
+                      f"{statistics.median(times) * 1000:9.1f} {requests / len(times):8.1f} {transferred / len(times) / 1024:8.1f}")
+    print('Requests and KB are per page, as served by the marketplace (blocked requests never reach it).')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+POST /classify latency benchmark.
+
+Sends batches of 1, 100 and 10k texts to the endpoint through the Flask test client (with
+login disabled), on the configured inference pool, and reports the latency percentiles per
+batch size against the p99 targets below. Needs the NLTK data the preprocessing uses.
+
+    python -m benchmarks.classify_api [--runs 200] [--model svm] [--ndjson]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# The endpoint does not use the database; keep the app's background jobs off the real one
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db'))
+
+from app import app, db
+from app.tasks import missing_nltk_resources
+
+# p99 latency targets by batch size, in milliseconds
+P99_TARGET_MS = {1: 50, 100: 250, 10000: 10000}
+
+WORDS = ('the agent solved my issue quickly great support still waiting for a refund after three weeks '
+         'terrible service okay experience nothing special delivery was late product works well').split()
+
+
+def make_texts(count, seed):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, size=rng.integers(5, 60))) for _ in range(count)]
+
+
+def percentile(values, p):
+    return float(np.percentile(values, p)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=200, help='requests per batch size (at most 20 for 10k texts)')
+    parser.add_argument('--model', default='svm')
+    parser.add_argument('--ndjson', action='store_true', help='send NDJSON instead of a JSON array')
+    args = parser.parse_args()
+    missing = missing_nltk_resources()
+    if missing:
+        sys.exit(f"NLTK data missing: {', '.join(missing)}. Install it with `python -m nltk.downloader {' '.join(missing)}`")
+
+    app.config['LOGIN_DISABLED'] = True
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    def send(texts):
+        if args.ndjson:
+            body = ''.join(json.dumps(text) + '\n' for text in texts)
+            return client.post(f'/classify?model_name={args.model}', data=body, content_type='application/x-ndjson')
+        return client.post(f'/classify?model_name={args.model}', json=texts)
+
+    # Warm up: start the inference pool and load the models and NLTK in its workers
+    response = send(make_texts(10, 0))
+    if response.status_code != 200:
+        sys.exit(f'/classify failed: {response.status_code} {response.get_json()}')
+
+    print(f"model {args.model}, {'NDJSON' if args.ndjson else 'JSON array'} bodies:")
+    print(f"  {'texts':>6} {'runs':>5} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'texts/s':>9}  p99 target")
+    for size, target in P99_TARGET_MS.items():
+        runs = args.runs if size < 10000 else min(args.runs, 20)
+        latencies = []
+        for run in range(runs):
+            texts = make_texts(size, run + 1)
+            started = time.perf_counter()
+            response = send(texts)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+        p99 = percentile(latencies, 99)
+        print(f'  {size:>6} {runs:>5} {percentile(latencies, 50):9.1f} {p99:9.1f} {max(latencies) * 1000:9.1f} '
+              f"{size / statistics.mean(latencies):9.0f}  {target} ms {'ok' if p99 <= target else 'MISSED'}")
+
+
+if __name__ == '__main__':
+    main()
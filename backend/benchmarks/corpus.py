@@ -0,0 +1,191 @@
+"""
+Seeded synthetic review corpus, and stand-in models trained on it.
+
+`generate_reviews(count, seed)` makes reviews shaped like the scraped ones: Amazon rows
+with '4.0 out of 5 stars' ratings and 'Reviewed in India on 17 July 2023' dates, Flipkart
+rows with bare digit ratings, canned titles and 'Mar, 2021' or '11 months ago' dates, a
+few missing ratings, and bodies whose length and wording follow the rating. The same
+seed always gives the same corpus, so benchmark runs compare like with like.
+
+`build_standin_models(path)` trains a TF-IDF vectorizer, a logistic regression and a
+linear SVC on a generated corpus and pickles them the way `models.p` is laid out, so the
+benchmarks run without the real models (and their numbers do not depend on them):
+
+    python -m benchmarks.corpus --models /tmp/standin/models.p [--train 5000]
+    python -m benchmarks.corpus --reviews 1000 > reviews.jsonl
+"""
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.models import ReviewSource
+from app.parsers import parse_rating, parse_review_date
+
+# Dates are relative to a fixed scrape date, so the corpus does not change from day to day
+SCRAPED_ON = datetime(2024, 6, 30, 12, 0)
+
+RATING_WEIGHTS = {5: 0.48, 4: 0.2, 3: 0.1, 2: 0.07, 1: 0.15}
+MISSING_RATING_RATE = 0.02
+# Share of reviews whose wording disagrees with their rating, as in real reviews
+MIXED_RATE = 0.12
+
+ASPECTS = ('battery', 'camera', 'display', 'sound', 'build quality', 'packaging', 'delivery',
+           'performance', 'charging', 'price', 'design', 'fit', 'material', 'customer service')
+WORDS = {
+    'Positive': {
+        'adjectives': ('excellent', 'great', 'amazing', 'superb', 'fantastic', 'solid', 'impressive', 'perfect'),
+        'phrases': ('worth every penny', 'highly recommend it', 'works like a charm', 'very happy with this purchase',
+                    'exceeded my expectations', 'value for money', 'using it daily without issues'),
+        'amazon_titles': ('Great product', 'Excellent value for money', 'Loved it', 'Best purchase this year',
+                          'Works perfectly', 'Highly recommended', 'Five stars'),
+        'flipkart_titles': ('Terrific purchase', 'Wonderful', 'Just wow!', 'Classy product', 'Worth every penny',
+                            'Brilliant', 'Perfect product!', 'Must buy!', 'Simply awesome'),
+    },
+    'Neutral': {
+        'adjectives': ('okay', 'average', 'decent', 'fine', 'acceptable', 'fair', 'ordinary'),
+        'phrases': ('does the job', 'nothing special', 'as expected for the price', 'could be better',
+                    'some good some bad', 'not sure yet'),
+        'amazon_titles': ('Okay product', 'Average', 'Decent for the price', 'It is fine', 'Mixed feelings'),
+        'flipkart_titles': ('Good', 'Nice', 'Decent product', 'Fair', 'Good choice', 'Pretty good'),
+    },
+    'Negative': {
+        'adjectives': ('terrible', 'poor', 'awful', 'cheap', 'flimsy', 'disappointing', 'horrible', 'useless'),
+        'phrases': ('waste of money', 'stopped working after a week', 'do not buy', 'asked for a refund',
+                    'returned it', 'very disappointed', 'worst purchase ever'),
+        'amazon_titles': ('Waste of money', 'Very disappointed', 'Stopped working', 'Poor quality', 'Do not buy'),
+        'flipkart_titles': ('Useless product', 'Waste of money!', 'Very poor', 'Not recommended at all',
+                            'Did not meet expectations', 'Worst experience ever!', 'Hated it!', 'Unsatisfactory'),
+    },
+}
+AUTHORS = ('Amazon Customer', 'Flipkart Customer', 'Rahul', 'Priya Sharma', 'Ankit K', 'Sneha', 'Vikram Singh',
+           'Pooja', 'Arjun Mehta', 'Neha Gupta', 'Rohit', 'Kavya R')
+
+
+def label_for(rating):
+    if rating >= 4:
+        return 'Positive'
+    if rating <= 2:
+        return 'Negative'
+    return 'Neutral'
+
+
+def make_body(rng, label):
+    words = WORDS[label]
+    # Mostly short reviews with a long tail, like the scraped ones
+    sentences = min(1 + int(rng.lognormal(0.6, 0.7)), 25)
+    parts = []
+    for _ in range(sentences):
+        if rng.random() < 0.5:
+            parts.append(f"The {rng.choice(ASPECTS)} is {rng.choice(words['adjectives'])}.")
+        else:
+            parts.append(f"{str(rng.choice(words['phrases'])).capitalize()}.")
+    return ' '.join(parts)
+
+
+def amazon_date(day):
+    return f'Reviewed in India on {day.day} {day:%B %Y}'
+
+
+def flipkart_date(day):
+    days = (SCRAPED_ON.date() - day).days
+    if days < 30:
+        return f'{max(days, 1)} days ago'
+    if days < 365:
+        return f'{days // 30} months ago'
+    return f'{day:%b}, {day.year}'
+
+
+def generate_reviews(count, seed=0, platform=None):
+    """
+    Returns `count` reviews as dicts of RawReview columns (title, body, rating, rating_value,
+    author, date, posted_on, platform) plus the `label` their wording was written for.
+    Platforms alternate at random unless `platform` (a ReviewSource) is given.
+    """
+    rng = np.random.default_rng(seed)
+    ratings = rng.choice(list(RATING_WEIGHTS), size=count, p=list(RATING_WEIGHTS.values()))
+    labels = list(WORDS)
+    reviews = []
+    for rating in ratings:
+        source = platform or (ReviewSource.AMAZON if rng.random() < 0.5 else ReviewSource.FLIPKART)
+        label = label_for(rating)
+        if rng.random() < MIXED_RATE:
+            label = labels[rng.integers(len(labels))]
+        day = SCRAPED_ON.date() - timedelta(days=int(rng.integers(1, 3 * 365)))
+        if source == ReviewSource.AMAZON:
+            rating_text = f'{rating}.0 out of 5 stars'
+            title = str(rng.choice(WORDS[label]['amazon_titles']))
+            date_text = amazon_date(day)
+            body = make_body(rng, label)
+        else:
+            rating_text = str(rating)
+            title = str(rng.choice(WORDS[label]['flipkart_titles']))
+            date_text = flipkart_date(day)
+            body = make_body(rng, label) + ('READ MORE' if rng.random() < 0.3 else '')
+        if rng.random() < MISSING_RATING_RATE:
+            rating_text = None
+        reviews.append({
+            'title': title,
+            'body': body,
+            'rating': rating_text,
+            'rating_value': parse_rating(source, rating_text),
+            'author': str(rng.choice(AUTHORS)),
+            'date': date_text,
+            'posted_on': parse_review_date(source, date_text, SCRAPED_ON),
+            'platform': source,
+            'label': label,
+        })
+    return reviews
+
+
+def build_standin_models(path, count=5000, seed=1):
+    """
+    Trains stand-in models on `count` generated reviews, preprocessed as the analysis does,
+    and pickles them to `path` as {'vectorizer', 'logreg', 'svm'}. Needs the NLTK data.
+    """
+    import pickle
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.svm import SVC
+    from app.tasks import preprocess_text
+
+    reviews = generate_reviews(count, seed)
+    texts = [preprocess_text(review['title'] + ' ' + review['body']) for review in reviews]
+    labels = [review['label'] for review in reviews]
+    vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=2)
+    vectors = vectorizer.fit_transform(texts)
+    # A memory address the vectorizer keeps to skip a check; pickled, it would make the
+    # models' version (the hash of the file) differ on every run
+    del vectorizer._stop_words_id
+    model_data = {
+        'vectorizer': vectorizer,
+        'logreg': LogisticRegression(max_iter=1000).fit(vectors, labels),
+        'svm': SVC(kernel='linear').fit(vectors, labels),
+    }
+    with open(path, 'wb') as f:
+        pickle.dump(model_data, f)
+    return model_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', metavar='PATH', help='write stand-in models to PATH')
+    parser.add_argument('--train', type=int, default=5000, help='reviews to train the stand-in models on')
+    parser.add_argument('--reviews', type=int, help='write this many reviews to stdout as JSON lines')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not args.models and not args.reviews:
+        parser.error('nothing to do: pass --models and/or --reviews')
+    if args.models:
+        build_standin_models(args.models, args.train, args.seed + 1)
+        print(f'Stand-in models written to {args.models}', file=sys.stderr)
+    if args.reviews:
+        for review in generate_reviews(args.reviews, args.seed):
+            row = {**review, 'platform': review['platform'].name, 'posted_on': review['posted_on'].isoformat() if review['posted_on'] else None}
+            sys.stdout.write(json.dumps(row) + '\n')
+
+
+if __name__ == '__main__':
+    main()
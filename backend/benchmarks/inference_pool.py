@@ -0,0 +1,87 @@
+"""
+Inference pool benchmark.
+
+Simulates concurrent analyses: client threads each classify a product's worth of texts,
+first the way the analyse route used to (one transform and predict per review in the
+request thread), then through the inference pool, and reports the throughput, the latency
+per analysis and the pool's batch-size histogram.
+
+    python -m benchmarks.inference_pool [--clients 8] [--texts 500] [--processes 2] [--model svm]
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import numpy as np
+
+from app.inference import InferencePool
+from app.model_store import get_models
+
+WORDS = ('great good excellent love works well battery quality product price terrible bad poor '
+         'waste money broke stopped working okay average nothing special fast delivery value').split()
+
+
+def make_texts(count, seed):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, size=rng.integers(5, 40))) for _ in range(count)]
+
+
+def per_review(texts, model_name):
+    models = get_models()
+    return [models.models[model_name].predict(models.vectorizer.transform([text]))[0] for text in texts]
+
+
+def run_clients(classify, workloads):
+    """Runs one thread per workload; returns the wall time and each analysis' latency."""
+    latencies = [None] * len(workloads)
+
+    def client(i):
+        started = time.perf_counter()
+        classify(workloads[i])
+        latencies[i] = time.perf_counter() - started
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(len(workloads))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies
+
+
+def report(name, wall, latencies, texts):
+    print(f'  {name:<12} {texts / wall:9.0f} texts/s   latency median {statistics.median(latencies) * 1000:7.0f} ms   '
+          f'max {max(latencies) * 1000:7.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--texts', type=int, default=500, help='texts per analysis')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--max-batch-size', type=int, default=256)
+    parser.add_argument('--max-wait', type=float, default=0.01)
+    parser.add_argument('--model', default='svm')
+    args = parser.parse_args()
+
+    get_models()
+    workloads = [make_texts(args.texts, seed) for seed in range(args.clients)]
+    total = args.clients * args.texts
+    print(f'{args.clients} concurrent analyses of {args.texts} texts, model {args.model}:')
+
+    wall, latencies = run_clients(lambda texts: per_review(texts, args.model), workloads)
+    report('per review', wall, latencies, total)
+
+    pool = InferencePool(args.processes, args.max_batch_size, args.max_wait)
+    pool.predict(workloads[0][:1], args.model)  # Start the worker processes
+    wall, latencies = run_clients(lambda texts: pool.predict(texts, args.model), workloads)
+    report(f'pool ({args.processes})', wall, latencies, total)
+
+    print('  batch sizes: ' + ', '.join(
+        f'<={bound}: {count}' for bound, count in pool.stats()['batch_size_histogram'].items() if count
+    ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""
+Local stand-in for the Amazon and Flipkart review pages.
+
+Serves the pages the scrapers in app/tasks.py walk through, with the markup their parsers
+and locators expect, for any ASIN or FSN:
+
+    /product-reviews/<asin>/ref=...?filterByStar=...&pageNumber=N    Amazon reviews, 10 a page
+    /ap/signin                                                       Amazon sign-in (email, then password)
+    /product/p/itme?pid=<fsn>                                        Flipkart product page
+    /product/product-reviews/itme?pid=<fsn>&page=N                   Flipkart reviews, 10 a page
+
+The reviews come from benchmarks/corpus.py, seeded by the ASIN or FSN, so every run
+serves the same ones. Each listing has `pages` pages of reviews (fewer for the Amazon
+star filters); every page waits `latency` seconds plus up to `jitter` more, and
+`fail_rate` of them answer 503 while `hang_rate` of them stall for `hang_seconds` first,
+to exercise the scrapers' timeouts. With `signin`, Amazon redirects to /ap/signin until a
+sign-in sets its session cookie. With `assets`, the pages also load what the live ones do
+besides the reviews (a stylesheet and its web font, product images and an analytics
+script, from /static and /gtag/js), to measure what a browser downloads; `stats['bytes']`
+counts the bytes served.
+
+Point the scrapers at it with AMAZON_BASE_URL and FLIPKART_BASE_URL (and AMAZON_PAGE_WAIT=0
+to drop the scraper's settling time), or use it from a benchmark through `MarketplaceServer`:
+
+    python -m benchmarks.marketplace [--port 8765] [--pages 5] [--latency 0.05] [--signin] [--fail-rate 0.1] [--assets]
+"""
+import argparse
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from html import escape
+from urllib.parse import quote
+
+from flask import Flask, Response, abort, redirect, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from app.models import ReviewSource
+from benchmarks.corpus import generate_reviews
+
+PAGE_SIZE = 10
+SESSION_COOKIE = 'session-token'
+
+# The reviews each Amazon star filter shows, by rating
+STAR_FILTERS = {
+    'all_stars': None,
+    'five_star': {5},
+    'four_star': {4},
+    'three_star': {3},
+    'two_star': {2},
+    'one_star': {1},
+    'positive': {4, 5},
+    'critical': {1, 2, 3},
+}
+
+PAGE = '<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title></head><body>{body}</body></html>'
+# Sizes of the assets, about those of the live pages
+ASSETS = {
+    'site.css': 60_000,
+    'site.woff2': 40_000,
+    'product.jpg': 35_000,
+}
+PAGE_IMAGES = 12
+ASSETS_HEAD = '<link rel="stylesheet" href="/static/site.css">'
+ASSETS_TAIL = (''.join(f'<img src="/static/product.jpg?n={n}" width="64" height="64">' for n in range(PAGE_IMAGES))
+               + '<script async src="/gtag/js?id=G-STANDIN"></script>')
+ANALYTICS_SCRIPT = 'window.dataLayer = window.dataLayer || []; dataLayer.push({event: "page_view"});' * 500
+
+
+def render_amazon_page(asin, reviews, page, pages):
+    items = []
+    for review in reviews:
+        stars = (f'<i data-hook="review-star-rating" class="a-icon a-icon-star"><span class="a-icon-alt">{escape(review["rating"])}</span></i>'
+                 if review['rating'] else '')
+        items.append(
+            f'<div id="R{asin}{len(items)}" data-hook="review" class="a-section review aok-relative">'
+            f'<div class="a-profile-content"><span class="a-profile-name">{escape(review["author"])}</span></div>'
+            f'<a data-hook="review-title" class="a-size-base a-link-normal review-title" href="#">{stars}'
+            f'<span class="a-letter-space"></span><span>{escape(review["title"])}</span></a>'
+            f'<span data-hook="review-date" class="a-size-base a-color-secondary review-date">{escape(review["date"])}</span>'
+            f'<span data-hook="review-body" class="a-size-base review-text review-text-content"><span>{escape(review["body"])}</span></span>'
+            '</div>'
+        )
+    last = '<li class="a-disabled a-last">Next page</li>' if page >= pages else '<li class="a-last"><a href="#">Next page</a></li>'
+    body = (f'<div id="cm_cr-review_list" class="a-section review-views">{"".join(items)}'
+            f'<ul class="a-pagination"><li class="a-disabled">Previous page</li>{last}</ul></div>')
+    return PAGE.format(title=f'Amazon.in:Customer reviews: {asin}', body=body)
+
+
+def render_amazon_signin(return_to, email=None):
+    if email is None:
+        fields = ('<input type="email" id="ap_email" name="email">'
+                  '<span class="a-button-inner"><input id="continue" class="a-button-input" type="submit"></span>')
+    else:
+        fields = (f'<input type="hidden" name="email" value="{escape(email)}">'
+                  '<input type="password" id="ap_password" name="password">'
+                  '<input id="signInSubmit" type="submit">')
+    body = (f'<form name="signIn" method="post" action="/ap/signin">'
+            f'<input type="hidden" name="openid.return_to" value="{escape(return_to)}">{fields}</form>')
+    return PAGE.format(title='Amazon Sign-In', body=body)
+
+
+def render_flipkart_product(fsn, count):
+    body = (
+        '<div class="JFPqaw"><span role="button" class="_30XB9F">✕</span></div>'
+        f'<a href="/product/product-reviews/itme?pid={quote(fsn)}&amp;lid=LST{quote(fsn)}&amp;marketplace=FLIPKART">'
+        f'<div class="_23J90q RcXBOT"><span>All {count} reviews</span></div></a>'
+    )
+    return PAGE.format(title=f'Flipkart product {fsn}', body=body)
+
+
+def render_flipkart_page(fsn, reviews, page, pages):
+    items = []
+    for review in reviews:
+        rating = f'<div class="XQDdHH Ga3i8K">{escape(review["rating"])}<img src="data:," class="Rza2QY"></div>' if review['rating'] else ''
+        items.append(
+            '<div class="cPHDOP col-12-12"><div class="EKFha-"><div class="col EPCmJX Ma1fCG">'
+            f'<div class="row">{rating}<p class="z9E0IG">{escape(review["title"])}</p></div>'
+            f'<div class="row"><div class="ZmyHeo"><div><div class="">{escape(review["body"])}</div></div></div></div>'
+            '<div class="row gHqwa8"><div class="row">'
+            f'<p class="_2NsDsF AwS1CA">{escape(review["author"])}</p><p class="MztJPv">Certified Buyer</p>'
+            f'<p class="_2NsDsF">{escape(review["date"])}</p>'
+            '</div></div></div></div></div>'
+        )
+    links = ''.join(f'<a class="cn++Ap" href="#">{number}</a>' for number in range(1, pages + 1))
+    next_link = '' if page >= pages else '<a class="_9QVEpD" href="#"><span>Next</span></a>'
+    body = (f'<div class="DOjaWF gdgoEp col-9-12">{"".join(items)}'
+            f'<div class="cPHDOP col-12-12"><nav class="WSL9JP">{links}{next_link}</nav></div></div>')
+    return PAGE.format(title=f'Flipkart reviews {fsn}', body=body)
+
+
+def asset_body(name):
+    # Random filler of the asset's size; the stylesheet also loads the font
+    if name == 'site.css':
+        filler = random.Random(name).randbytes(ASSETS[name] // 2).hex()
+        return f'@font-face {{ font-family: Site; src: url(/static/site.woff2); }} body {{ font-family: Site; }} /* {filler} */'
+    return random.Random(name).randbytes(ASSETS[name])
+
+
+def create_marketplace(pages=5, latency=0.0, jitter=0.0, signin=False, fail_rate=0.0, hang_rate=0.0,
+                       hang_seconds=30.0, seed=0, assets=False):
+    """The stand-in marketplace as a Flask app; `app.stats` counts what it served."""
+    marketplace = Flask(__name__)
+    marketplace.stats = Counter()
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    listings = {}
+
+    def listing(platform, product_key):
+        # The reviews of a listing, generated on its first page view
+        key = (platform, product_key)
+        with lock:
+            if key not in listings:
+                listings[key] = generate_reviews(pages * PAGE_SIZE, zlib.crc32(product_key.encode()), platform)
+            return listings[key]
+
+    def serve_page(kind):
+        with lock:
+            hang, fail, wait = rng.random() < hang_rate, rng.random() < fail_rate, latency + rng.uniform(0, jitter)
+            marketplace.stats[kind] += 1
+            marketplace.stats['hung'] += hang
+            marketplace.stats['failed'] += fail
+        if hang:
+            time.sleep(hang_seconds)
+        time.sleep(wait)
+        if fail:
+            abort(503)
+
+    @marketplace.after_request
+    def count_bytes(response):
+        if assets and response.mimetype == 'text/html':
+            data = response.get_data(as_text=True).replace('</head>', ASSETS_HEAD + '</head>', 1)
+            response.set_data(data.replace('</body>', ASSETS_TAIL + '</body>', 1))
+        with lock:
+            marketplace.stats['bytes'] += response.calculate_content_length() or 0
+        return response
+
+    @marketplace.route('/static/<name>')
+    def asset(name):
+        if name not in ASSETS:
+            abort(404)
+        marketplace.stats['asset_requests'] += 1
+        mimetypes = {'css': 'text/css', 'woff2': 'font/woff2', 'jpg': 'image/jpeg'}
+        return Response(asset_body(name), mimetype=mimetypes[name.rsplit('.', 1)[1]])
+
+    @marketplace.route('/gtag/js')
+    def analytics():
+        marketplace.stats['asset_requests'] += 1
+        return Response(ANALYTICS_SCRIPT, mimetype='application/javascript')
+
+    def page_of(items, number):
+        count = max(1, -(-len(items) // PAGE_SIZE))
+        number = min(max(number, 1), count)
+        return items[(number - 1) * PAGE_SIZE:number * PAGE_SIZE], number, count
+
+    @marketplace.route('/product-reviews/<asin>/', defaults={'ref': ''})
+    @marketplace.route('/product-reviews/<asin>/<path:ref>')
+    def amazon_reviews(asin, ref):
+        if signin and request.cookies.get(SESSION_COOKIE) is None:
+            marketplace.stats['signin_redirects'] += 1
+            return redirect(f'/ap/signin?openid.return_to={quote(request.full_path)}')
+        serve_page('amazon_pages')
+        ratings = STAR_FILTERS.get(request.args.get('filterByStar', 'all_stars'))
+        reviews = [review for review in listing(ReviewSource.AMAZON, asin)
+                   if ratings is None or (review['rating_value'] is not None and int(review['rating_value']) in ratings)]
+        reviews, page, count = page_of(reviews, request.args.get('pageNumber', 1, type=int))
+        return render_amazon_page(asin, reviews, page, count)
+
+    @marketplace.route('/ap/signin', methods=['GET', 'POST'])
+    def amazon_signin():
+        return_to = request.values.get('openid.return_to', '/')
+        if request.method == 'GET' or not request.form.get('email'):
+            return render_amazon_signin(return_to)
+        if not request.form.get('password'):
+            return render_amazon_signin(return_to, request.form['email'])
+        marketplace.stats['signins'] += 1
+        response = redirect(return_to)
+        response.set_cookie(SESSION_COOKIE, 'signed-in')
+        return response
+
+    @marketplace.route('/<slug>/p/<item>')
+    def flipkart_product(slug, item):
+        fsn = request.args.get('pid', '')
+        serve_page('flipkart_pages')
+        return render_flipkart_product(fsn, len(listing(ReviewSource.FLIPKART, fsn)))
+
+    @marketplace.route('/<slug>/product-reviews/<item>')
+    def flipkart_reviews(slug, item):
+        fsn = request.args.get('pid', '')
+        serve_page('flipkart_pages')
+        reviews, page, count = page_of(listing(ReviewSource.FLIPKART, fsn), request.args.get('page', 1, type=int))
+        return render_flipkart_page(fsn, reviews, page, count)
+
+    return marketplace
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class MarketplaceServer:
+    """
+    Runs the stand-in marketplace on a local port (a free one by default) in a background
+    thread, as a context manager. Requests are not logged unless `log_requests` is set.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, log_requests=False, **options):
+        self.app = create_marketplace(**options)
+        handler = WSGIRequestHandler if log_requests else QuietRequestHandler
+        self.server = make_server(host, port, self.app, threaded=True, request_handler=handler)
+        self.url = f'http://{host}:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def stats(self):
+        return self.app.stats
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=5, help='review pages per listing')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every page waits')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many seconds more at random')
+    parser.add_argument('--signin', action='store_true', help='make Amazon redirect to /ap/signin until signed in')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of pages answering 503')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='share of pages stalling before they answer')
+    parser.add_argument('--hang-seconds', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--assets', action='store_true', help='make the pages load a stylesheet, a font, images and analytics')
+    args = parser.parse_args()
+    server = MarketplaceServer(
+        args.host, args.port, log_requests=True, pages=args.pages, latency=args.latency, jitter=args.jitter, signin=args.signin,
+        fail_rate=args.fail_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds, seed=args.seed,
+        assets=args.assets,
+    )
+    print(f'Serving the marketplace stand-in on {server.url}; scrape it with '
+          f'AMAZON_BASE_URL={server.url} FLIPKART_BASE_URL={server.url} AMAZON_PAGE_WAIT=0')
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Model memory per worker.
+
+Forks worker processes the way gunicorn does and has each of them classify a few
+texts, then reads their private and proportional memory from /proc/<pid>/smaps_rollup.
+This runs for the pickled models and the memory-mapped package, each loaded either in
+every worker or once in the parent before forking (gunicorn --preload). Memory that the
+workers share is only counted in PSS, split between them, so "private" is what every
+added worker costs. Linux only.
+
+    python -m benchmarks.model_memory [--workers 3] [--package models] [--pickle models.p]
+"""
+import argparse
+import json
+import os
+import sys
+
+from app.model_store import load_pickle, load_package
+
+TEXTS = [
+    'great product works well and the battery lasts long',
+    'terrible quality stopped working after a week waste of money',
+    'okay for the price nothing special',
+]
+
+
+def smaps_rollup():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values
+
+
+def classify(bundle):
+    vectors = bundle.vectorizer.transform(TEXTS)
+    for model in bundle.models.values():
+        model.predict(vectors)
+
+
+def measure(loader, path, preload, workers):
+    """Returns the mean private and PSS memory (MB) of `workers` forked workers."""
+    bundle = loader(path) if loader and preload else None
+    # The workers stay alive until the parent closes `release`, so their sharing is measured together
+    release_read, release = os.pipe()
+    reports = []
+    for _ in range(workers):
+        read_end, write_end = os.pipe()
+        if os.fork() == 0:
+            os.close(read_end)
+            os.close(release)
+            worker_bundle = bundle or (loader(path) if loader else None)
+            if worker_bundle:
+                classify(worker_bundle)
+            with os.fdopen(write_end, 'w') as f:
+                f.write(json.dumps(smaps_rollup()))
+            os.read(release_read, 1)
+            os._exit(0)
+        os.close(write_end)
+        reports.append(read_end)
+    results = []
+    for read_end in reports:
+        with os.fdopen(read_end) as f:
+            results.append(json.loads(f.read()))
+    os.close(release)
+    os.close(release_read)
+    for _ in reports:
+        os.wait()
+    private = sum(r['Private_Clean'] + r['Private_Dirty'] for r in results) / workers
+    pss = sum(r['Pss'] for r in results) / workers
+    return private, pss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--package', default='models')
+    parser.add_argument('--pickle', default='models.p')
+    args = parser.parse_args()
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('This benchmark needs Linux /proc/<pid>/smaps_rollup.')
+    if not os.path.exists(os.path.join(args.package, 'manifest.json')):
+        sys.exit(f'No model package at {args.package}; build it with `python convert_model.py`.')
+
+    # Import what the workers will use up front, so the baseline includes it
+    import scipy.sparse, sklearn.svm, sklearn.linear_model, sklearn.feature_extraction.text  # noqa: F401
+
+    base_private, base_pss = measure(None, None, False, args.workers)
+    print(f'{args.workers} workers, memory per worker on top of an idle worker '
+          f'({base_private:.1f} MB private, {base_pss:.1f} MB PSS):')
+    print(f"  {'format':<9} {'loaded':<12} {'private MB':>10} {'PSS MB':>8}")
+    for name, loader, path in (('pickle', load_pickle, args.pickle), ('package', load_package, args.package)):
+        for preload in (False, True):
+            private, pss = measure(loader, path, preload, args.workers)
+            print(f"  {name:<9} {'in parent' if preload else 'per worker':<12} "
+                  f'{private - base_private:10.2f} {pss - base_pss:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Analysis pipeline benchmark on a synthetic corpus.
+
+Times each stage of an analysis, the way `classify_multiple_reviews` runs it, and the
+analysis end to end through POST /reviews/analyse, at 1k, 10k and 100k generated reviews
+(see benchmarks/corpus.py):
+
+    fill_missing_ratings   rating parsing and imputation on the review DataFrame
+    preprocess             preprocess_text over every review
+    classify               the inference pool (the prediction cache is disabled)
+    word_distribution      top word counts
+    word_cloud             word cloud rendering
+    end_to_end             the request, for a new product whose raw reviews are in the database
+
+Like pytest-benchmark, each benchmark runs for at least `--min-rounds` rounds and then
+until `--max-time` seconds have passed, and reports the min, max, mean, standard
+deviation and median, plus the throughput (reviews per second at the mean) and the peak
+memory allocated during an extra, untimed round traced with tracemalloc. The models are
+stand-ins trained on the same corpus unless `--models` points at a pickle.
+
+`--save` stores the results as a baseline; `--compare` prints the change of each benchmark
+against one and exits with status 1 when a mean time or peak memory grew by more than
+`--tolerance`. Baselines are only comparable on the same machine, corpus seed and models.
+Needs the NLTK data the preprocessing uses. The end-to-end analysis stores every review
+with its own lookup, so at 100k reviews each round takes minutes; leave 100000 out of
+`--sizes` for a quick run.
+
+    python -m benchmarks.pipeline [--sizes 1000,10000,100000] [--stages preprocess,classify]
+                                  [--save [PATH]] [--compare [PATH]] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+STAGES = ('fill_missing_ratings', 'preprocess', 'classify', 'word_distribution', 'word_cloud', 'end_to_end')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'pipeline_baseline.json')
+
+
+class Context:
+    """What the stages of one corpus size work on, prepared outside the timings."""
+
+    def __init__(self, reviews, model_name):
+        import pandas as pd
+        from app.tasks import fill_missing_ratings, preprocess_text
+
+        self.reviews = reviews
+        self.model_name = model_name
+        self.frame = pd.DataFrame([
+            {'review_text': review['title'], 'review_desc': review['body'],
+             'rating': review['rating_value'] if review['rating_value'] is not None else review['rating']}
+            for review in reviews
+        ])
+        data = self.frame.copy()
+        fill_missing_ratings(data)
+        self.overall = data['review_text'] + ' ' + data['review_desc']
+        self.processed = self.overall.apply(preprocess_text)
+        self.texts = self.processed.tolist()
+
+
+def bench_fill_missing_ratings(context):
+    from app.tasks import fill_missing_ratings
+    data = context.frame.copy()
+    return lambda: fill_missing_ratings(data)
+
+
+def bench_preprocess(context):
+    from app.tasks import preprocess_text
+    return lambda: context.overall.apply(preprocess_text)
+
+
+def bench_classify(context):
+    from app.inference import inference_pool
+    return lambda: inference_pool.predict(context.texts, context.model_name)
+
+
+def bench_word_distribution(context):
+    from app.tasks import word_distribution
+    return lambda: word_distribution(context.processed)
+
+
+def bench_word_cloud(context):
+    from app.routes import render_word_cloud
+    text = ' '.join(context.texts)
+    return lambda: render_word_cloud(text, 'amazon')
+
+
+def bench_end_to_end(context):
+    from app import app
+    product_id = seed_product(context.reviews)
+    client = app.test_client()
+
+    def analyse():
+        response = client.post(f'/reviews/analyse/{product_id}?platform=amazon&model_name={context.model_name}')
+        assert response.status_code == 200, response.get_json()
+    return analyse
+
+
+BENCHMARKS = {stage: globals()[f'bench_{stage}'] for stage in STAGES}
+
+
+def seed_product(reviews):
+    """Adds a product with the reviews as its Amazon raw reviews; returns its id."""
+    from sqlalchemy import insert
+    from app import app, db
+    from app.models import User, Product, ProductPlatform, ScrapingTask, RawReview, ReviewSource, Status
+
+    with app.app_context():
+        user = User.query.filter_by(username='benchmark').first()
+        if not user:
+            user = User(username='benchmark', email='benchmark@example.com', password_hash='-')
+            db.session.add(user)
+            db.session.flush()
+        product = Product(name='Benchmark product', description='Synthetic reviews', created_by=user.id)
+        db.session.add(product)
+        db.session.flush()
+        asin = f'B{product.id:09d}'
+        db.session.add(ProductPlatform(product_id=product.id, platform=ReviewSource.AMAZON, platform_id=asin))
+        task = ScrapingTask(id=str(uuid.uuid4()), fsn_asin=asin, product_id=product.id, platform=ReviewSource.AMAZON,
+                            status=Status.COMPLETED, created_by=user.id)
+        db.session.add(task)
+        db.session.flush()
+        columns = ('title', 'body', 'rating', 'rating_value', 'author', 'date', 'posted_on')
+        rows = [{**{column: review[column] for column in columns}, 'task_id': task.id,
+                 'product_id': product.id, 'platform': ReviewSource.AMAZON} for review in reviews]
+        db.session.execute(insert(RawReview), rows)
+        db.session.commit()
+        return product.id
+
+
+def run(name, size, make, min_rounds, max_time, memory):
+    """Times `make()`'s function like pytest-benchmark; returns the statistics."""
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_rounds or time.perf_counter() - started < max_time:
+        func = make()
+        round_started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - round_started)
+    result = {
+        'size': size,
+        'rounds': len(times),
+        'min': min(times),
+        'max': max(times),
+        'mean': statistics.mean(times),
+        'stddev': statistics.stdev(times) if len(times) > 1 else 0.0,
+        'median': statistics.median(times),
+    }
+    result['throughput'] = size / result['mean']
+    if memory:
+        func = make()
+        tracemalloc.start()
+        try:
+            func()
+            result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def machine_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_results(results, baseline, tolerance):
+    """Prints the results table; returns the names of the benchmarks that regressed."""
+    compared = baseline.get('benchmarks', {}) if baseline else {}
+    header = f"{'Name':<28} {'Min':>9} {'Max':>9} {'Mean':>9} {'StdDev':>8} {'Median':>9} {'Rounds':>6} {'reviews/s':>10} {'Peak MB':>8}"
+    if baseline:
+        header += f" {'vs baseline':>22}"
+    print(header)
+    print('-' * len(header))
+    regressions = []
+    for name, result in results.items():
+        line = (f"{name:<28} {result['min']:9.4f} {result['max']:9.4f} {result['mean']:9.4f} {result['stddev']:8.4f} "
+                f"{result['median']:9.4f} {result['rounds']:>6} {result['throughput']:10.0f} "
+                f"{result['peak_mb'] if 'peak_mb' in result else float('nan'):8.1f}")
+        base = compared.get(name)
+        if base:
+            time_change = result['mean'] / base['mean'] - 1
+            memory_change = result['peak_mb'] / base['peak_mb'] - 1 if base.get('peak_mb') and 'peak_mb' in result else 0.0
+            regressed = time_change > tolerance or memory_change > tolerance
+            if regressed:
+                regressions.append(name)
+            line += f" {time_change:+7.1%} time {memory_change:+6.1%} mem{' REGRESSION' if regressed else ''}"
+        elif baseline:
+            line += f" {'(not in baseline)':>22}"
+        print(line)
+    print('Times in seconds.')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated corpus sizes')
+    parser.add_argument('--stages', default=','.join(STAGES), help='comma-separated stages to benchmark')
+    parser.add_argument('--model', default='svm')
+    parser.add_argument('--models', metavar='PICKLE', help='models to use instead of stand-ins trained on the corpus')
+    parser.add_argument('--seed', type=int, default=0, help='corpus seed')
+    parser.add_argument('--min-rounds', type=int, default=3)
+    parser.add_argument('--max-time', type=float, default=5.0, help='seconds to keep adding rounds for')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced round measuring peak memory')
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, metavar='PATH', help='compare with a stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed growth of mean time and peak memory')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+    stages = [stage.strip() for stage in args.stages.split(',')]
+    unknown = [stage for stage in stages if stage not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown stage {unknown[0]}, choose from {', '.join(STAGES)}")
+
+    # Keep the benchmark off the real database, models and prediction cache
+    workdir = tempfile.mkdtemp(prefix='sentimentscout-benchmark-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'benchmark.db')
+    os.environ['MODEL_PACKAGE'] = os.path.join(workdir, 'no-package')
+    os.environ['MODEL_PICKLE'] = args.models or os.path.join(workdir, 'models.p')
+    os.environ['PREDICTION_CACHE_ENABLED'] = 'false'
+    os.environ.setdefault('FLASK_ENV', 'production')
+
+    from app import app, db
+    from app.migrations import upgrade
+    from app.model_store import get_models
+    from app.tasks import missing_nltk_resources
+    from benchmarks.corpus import build_standin_models, generate_reviews
+
+    missing = missing_nltk_resources()
+    if missing:
+        sys.exit(f"NLTK data missing: {', '.join(missing)}. Install it with `python -m nltk.downloader {' '.join(missing)}`")
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if not args.models:
+        print('Training stand-in models...', file=sys.stderr)
+        build_standin_models(os.environ['MODEL_PICKLE'])
+    for key in ('MODEL_PACKAGE', 'MODEL_PICKLE'):
+        app.config[key] = os.environ[key]
+    app.config['PREDICTION_CACHE_ENABLED'] = False
+    app.config['LOGIN_DISABLED'] = True
+    app.logger.setLevel('ERROR')  # the end-to-end analyses would log their query counts
+    with app.app_context():
+        db.create_all()
+    upgrade()
+    models_version = get_models().version
+    if baseline and (baseline.get('seed'), baseline.get('models_version')) != (args.seed, models_version):
+        print('Warning: the baseline was made with another corpus seed or models; the comparison is not like for like.',
+              file=sys.stderr)
+
+    corpus = generate_reviews(max(sizes), args.seed)
+    # Warm up: start the inference pool, load NLTK and the plotting libraries
+    warm_up = Context(corpus[:100], args.model)
+    for stage in stages:
+        BENCHMARKS[stage](warm_up)()
+
+    results = {}
+    for size in sizes:
+        print(f'Preparing {size} reviews...', file=sys.stderr)
+        context = Context(corpus[:size], args.model)
+        for stage in stages:
+            name = f'{stage}[{size}]'
+            print(f'Running {name}...', file=sys.stderr)
+            results[name] = run(name, size, lambda: BENCHMARKS[stage](context), args.min_rounds, args.max_time,
+                                not args.no_memory)
+
+    regressions = print_results(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'machine_info': machine_info(),
+                'seed': args.seed,
+                'model': args.model,
+                'models_version': models_version,
+                'benchmarks': results,
+            }, f, indent=2)
+        print(f'Baseline saved to {args.save}')
+    if regressions:
+        sys.exit(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+End-to-end scrape throughput against the local marketplace stand-in.
+
+Starts benchmarks/marketplace.py on a free port, points AMAZON_BASE_URL and
+FLIPKART_BASE_URL at it and runs the scrapers of app/tasks.py the way the scrape routes
+start them: one thread per scrape, `--scrapes` of them at once per platform, each for its
+own product. Reports the pages the marketplace served, the reviews stored, the scrapes that
+completed, the pages and reviews per second and the CPU time per page (of this process and
+the Chrome and chromedriver processes it started).
+
+The Amazon scraper waits AMAZON_PAGE_WAIT seconds after every page (3 by default, 0 here
+unless `--page-wait` is given), so that wait dominates its throughput against the live site.
+`--fetcher` picks SCRAPE_FETCHER: 'http' (the default) fetches the pages over HTTP and only
+loads the sign-in pages in Chrome, 'browser' loads every page in Chrome. Chrome and the
+chromedriver at the path the scrapers use are needed for 'browser', and for `--signin`.
+
+    python -m benchmarks.scrape_throughput [--platform amazon] [--scrapes 4] [--pages 5] [--fetcher browser]
+                                           [--latency 0.05] [--signin] [--fail-rate 0.05]
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+CHROMEDRIVER = '/usr/bin/chromedriver'
+
+
+def seed_products(count, platform):
+    """Adds `count` products listed on the platform; returns their (product id, ASIN or FSN)."""
+    from app import db
+    from app.models import User, Product, ProductPlatform
+
+    user = User.query.filter_by(username='benchmark').first()
+    if not user:
+        user = User(username='benchmark', email='benchmark@example.com', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+    products = []
+    for i in range(count):
+        product = Product(name=f'Benchmark product {i}', description='Marketplace stand-in', created_by=user.id)
+        db.session.add(product)
+        db.session.flush()
+        listing_id = f'B{product.id:09d}' if platform.name == 'AMAZON' else f'ACC{product.id:013d}'
+        db.session.add(ProductPlatform(product_id=product.id, platform=platform, platform_id=listing_id))
+        products.append((product.id, listing_id))
+    db.session.commit()
+    return products, user.id
+
+
+def run_scrapes(platform, scrapes):
+    """Runs the scrapes concurrently; returns the wall time and their task ids."""
+    from app import app
+    from app.leases import run_with_lease
+    from app.tasks import SCRAPERS, create_scraping_task
+    from app.writer import write_serializer
+
+    with app.app_context():
+        products, user_id = seed_products(scrapes, platform)
+        task_ids = [str(uuid.uuid4()) for _ in products]
+        # The tasks are created first, as start_scrape does
+        for (product_id, listing_id), task_id in zip(products, task_ids):
+            write_serializer.run(create_scraping_task, task_id, listing_id, platform, product_id, user_id)
+    threads = [
+        threading.Thread(target=run_with_lease, args=(task_id, SCRAPERS[platform], listing_id, task_id, product_id))
+        for (product_id, listing_id), task_id in zip(products, task_ids)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, task_ids
+
+
+def task_results(task_ids):
+    from app import app, db
+    from app.models import ScrapingTask, RawReview, Status
+
+    with app.app_context():
+        tasks = ScrapingTask.query.filter(ScrapingTask.id.in_(task_ids)).all()
+        completed = sum(task.status == Status.COMPLETED for task in tasks)
+        failures = [task.message for task in tasks if task.status == Status.FAILED]
+        reviews = db.session.query(RawReview).filter(RawReview.task_id.in_(task_ids)).count()
+    return completed, failures, reviews
+
+
+def cpu_seconds():
+    # This process's CPU time, plus that of the child processes (Chrome) that have exited
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--platform', choices=('amazon', 'flipkart', 'both'), default='both')
+    parser.add_argument('--scrapes', type=int, default=1, help='concurrent scrapes per platform')
+    parser.add_argument('--pages', type=int, default=5, help='review pages per listing')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds the marketplace takes per page')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--signin', action='store_true', help='make Amazon ask to sign in first')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of pages answering 503')
+    parser.add_argument('--hang-rate', type=float, default=0.0, help='share of pages stalling for --hang-seconds')
+    parser.add_argument('--hang-seconds', type=float, default=15.0)
+    parser.add_argument('--page-wait', type=float, default=0.0, help='AMAZON_PAGE_WAIT for the Amazon scraper')
+    parser.add_argument('--fetcher', choices=('http', 'browser'), default='http', help='SCRAPE_FETCHER')
+    parser.add_argument('--concurrency', type=int, help='SCRAPE_CONCURRENCY')
+    args = parser.parse_args()
+    if (args.fetcher == 'browser' or args.signin) and not os.path.exists(CHROMEDRIVER):
+        sys.exit(f'chromedriver not found at {CHROMEDRIVER}, where the scrapers look for it')
+
+    # Keep the scrapes off the real database; the app reads it when it is first imported
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    from app import app, db
+    from app.migrations import upgrade
+    from app.models import ReviewSource
+    from benchmarks.marketplace import MarketplaceServer
+
+    server = MarketplaceServer(
+        pages=args.pages, latency=args.latency, jitter=args.jitter, signin=args.signin, fail_rate=args.fail_rate,
+        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds,
+    )
+    app.config['AMAZON_BASE_URL'] = app.config['FLIPKART_BASE_URL'] = server.url
+    app.config['AMAZON_PAGE_WAIT'] = args.page_wait
+    app.config['SCRAPE_FETCHER'] = args.fetcher
+    if args.concurrency:
+        app.config['SCRAPE_CONCURRENCY'] = args.concurrency
+    with app.app_context():
+        db.create_all()
+    upgrade()
+    platforms = [ReviewSource.AMAZON, ReviewSource.FLIPKART] if args.platform == 'both' else [ReviewSource[args.platform.upper()]]
+    print(f'Marketplace stand-in at {server.url}: {args.pages} pages a listing, {args.latency * 1000:.0f} ms a page'
+          f"{', sign-in required' if args.signin else ''}{f', {args.fail_rate:.0%} failing' if args.fail_rate else ''}; "
+          f"fetching with {args.fetcher}")
+    print(f"  {'platform':<9} {'scrapes':>7} {'completed':>9} {'pages':>6} {'reviews':>8} {'seconds':>8} {'pages/s':>8} "
+          f"{'reviews/s':>9} {'CPU ms/page':>11}")
+    with server:
+        for platform in platforms:
+            page_key = f'{platform.name.lower()}_pages'
+            pages_before = server.stats[page_key]
+            cpu_before = cpu_seconds()
+            elapsed, task_ids = run_scrapes(platform, args.scrapes)
+            # The marketplace runs in this process too; its share of the CPU time is small next to parsing
+            cpu = cpu_seconds() - cpu_before
+            pages = server.stats[page_key] - pages_before
+            completed, failures, reviews = task_results(task_ids)
+            print(f'  {platform.name.lower():<9} {args.scrapes:>7} {completed:>9} {pages:>6} {reviews:>8} {elapsed:8.1f} '
+                  f'{pages / elapsed:8.2f} {reviews / elapsed:9.1f} {cpu / max(pages, 1) * 1000:11.1f}')
+            for message in failures:
+                print(f'    failed: {message}')
+    print(f'Marketplace: {dict(server.stats)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+SQLite concurrency stress test.
+
+Runs reader threads issuing the dashboard and reviews-page queries, first on an idle
+database and then while writer threads insert raw reviews as fast as they can, and
+reports read latency percentiles for both phases together with write throughput and
+errors. `--baseline` runs the same load with a rollback journal and every thread
+committing on its own, i.e. the setup before the SQLite profile and the writer queue.
+
+    python -m benchmarks.sqlite_concurrency [--readers 8] [--writers 4] [--seconds 10] [--baseline]
+
+Uses a throwaway database file unless DATABASE_URL is set.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+
+from app import app, db
+from app.migrations import upgrade
+from app.models import User, Product, ProductPlatform, RawReview, Review, ReviewSource, Sentiment
+from app.writer import write_serializer
+
+SEED_REVIEWS = 20000
+WRITE_BATCH = 20
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+    upgrade()
+    with app.app_context():
+        if db.session.query(User).first():
+            return
+        user = User(username='stress', email='stress@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        product = Product(name='Stress product', description='', created_by=user.id)
+        db.session.add(product)
+        db.session.flush()
+        db.session.add(ProductPlatform(product_id=product.id, platform=ReviewSource.AMAZON, platform_id='B0STRESS00'))
+        sentiments = list(Sentiment)
+        db.session.add_all(
+            Review(product_id=product.id, review_text=f'review {i}', rating=i % 5 + 1, source=ReviewSource.AMAZON,
+                   sentiment=sentiments[i % 3], relevance_score=1.0)
+            for i in range(SEED_REVIEWS)
+        )
+        db.session.commit()
+
+
+def read_once():
+    db.session.query(Review).join(Product).filter(Product.created_by == 1).count()
+    Review.query.filter(Review.product_id == 1, Review.id > 100).order_by(Review.id).limit(101).all()
+    db.session.rollback()
+
+
+def insert_raw_reviews(worker, n):
+    db.session.add_all(
+        RawReview(task_id=f'stress-{worker}', title='title', rating='5.0 out of 5 stars', rating_value=5.0,
+                  body='body ' * 40, author='author', date='', platform=ReviewSource.AMAZON, product_id=1)
+        for _ in range(n)
+    )
+
+
+def reader(stop, latencies, errors):
+    with app.app_context():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                read_once()
+            except Exception as e:
+                errors.append(str(e))
+                db.session.rollback()
+                continue
+            latencies.append(time.perf_counter() - started)
+
+
+def writer(worker, stop, written, errors):
+    while not stop.is_set():
+        try:
+            write_serializer.run(insert_raw_reviews, worker, WRITE_BATCH)
+            written.append(WRITE_BATCH)
+        except Exception as e:
+            errors.append(str(e))
+
+
+def run_phase(readers, writers, seconds):
+    stop = threading.Event()
+    latencies, read_errors, written, write_errors = [], [], [], []
+    threads = [threading.Thread(target=reader, args=(stop, latencies, read_errors)) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i, stop, written, write_errors)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, read_errors, sum(written), write_errors
+
+
+def percentile(values, p):
+    return sorted(values)[min(int(len(values) * p / 100), len(values) - 1)] * 1000 if values else float('nan')
+
+
+def report(name, seconds, result):
+    latencies, read_errors, written, write_errors = result
+    print(f'{name}:')
+    print(f'  reads       {len(latencies) / seconds:8.0f}/s  errors {len(read_errors)}')
+    print(f'  latency ms  p50 {percentile(latencies, 50):.2f}  p95 {percentile(latencies, 95):.2f}  '
+          f'p99 {percentile(latencies, 99):.2f}  max {max(latencies, default=0) * 1000:.2f}'
+          + (f'  mean {statistics.mean(latencies) * 1000:.2f}' if latencies else ''))
+    if written or write_errors:
+        print(f'  writes      {written / seconds:8.0f} rows/s  errors {len(write_errors)}')
+    for error in sorted(set(read_errors + write_errors))[:3]:
+        print(f'  ! {error.splitlines()[0]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--baseline', action='store_true',
+                        help='rollback journal and direct commits from every thread')
+    args = parser.parse_args()
+
+    if args.baseline:
+        app.config['SQLITE_PRAGMAS'] = {'journal_mode': 'DELETE', 'busy_timeout': 5000}
+        write_serializer.enabled = False
+    seed()
+    with app.app_context():
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    print(f'journal_mode={journal_mode} serialized writes={write_serializer.enabled} '
+          f'readers={args.readers} writers={args.writers}')
+
+    report('idle', args.seconds, run_phase(args.readers, 0, args.seconds))
+    report('heavy writes', args.seconds, run_phase(args.readers, args.writers, args.seconds))
+    if write_serializer.enabled and write_serializer.batches:
+        print(f'writer: {write_serializer.committed} jobs in {write_serializer.batches} commits')
+
+
+if __name__ == '__main__':
+    main()
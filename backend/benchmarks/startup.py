@@ -0,0 +1,91 @@
+"""
+Startup benchmark.
+
+Starts fresh interpreters that import the app, the way every gunicorn worker (or dev
+server reload) does, and reports the import time and resident memory per worker. It
+then reports what the first analysis request pays to load the deferred dependencies,
+and the slowest modules imported at startup.
+
+    python -m benchmarks.startup [--runs 5] [--top 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in a fresh interpreter; prints the measurements as JSON
+PROBE = r'''
+import json, resource, sys, time
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:  # No procfs (macOS): fall back to the peak, reported in bytes there
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+
+started = time.perf_counter()
+import app
+result = {'import_seconds': time.perf_counter() - started, 'rss_mb': rss_mb(), 'modules': len(sys.modules)}
+
+if '--deferred' in sys.argv:
+    # What the first analysis request loads on top of the app
+    started = time.perf_counter()
+    import pandas, numpy, PIL.Image, wordcloud, matplotlib.pyplot, sklearn.feature_extraction.text, nltk
+    result['deferred_seconds'] = time.perf_counter() - started
+    result['deferred_rss_mb'] = rss_mb()
+
+print(json.dumps(result))
+'''
+
+
+def probe(*args):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE, *args], cwd=BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    """Returns the `top` modules with the highest cumulative import time, from `-X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BACKEND_DIR, check=True,
+        capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.runs)]
+    import_times = [run['import_seconds'] for run in runs]
+    print(f"import app     median {statistics.median(import_times) * 1000:7.0f} ms   "
+          f"min {min(import_times) * 1000:.0f} ms   max {max(import_times) * 1000:.0f} ms   ({args.runs} runs)")
+    print(f"rss per worker median {statistics.median(run['rss_mb'] for run in runs):7.1f} MB   "
+          f"modules loaded {runs[0]['modules']}")
+
+    deferred = probe('--deferred')
+    print(f"first analysis loads deferred imports in {deferred['deferred_seconds'] * 1000:.0f} ms, "
+          f"rss grows to {deferred['deferred_rss_mb']:.1f} MB")
+
+    print(f'slowest imports at startup (cumulative):')
+    for cumulative, name in slowest_imports(args.top):
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
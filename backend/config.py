@@ -3,15 +3,144 @@ from datetime import timedelta
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Public, as it is in the repository: nothing that must stay secret may depend on it
+DEFAULT_SECRET_KEY = 'you-will-never-guess-i-am-from-iitm-diploma'
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess-i-am-from-iitm-diploma'  # Fallback if not set
+    SECRET_KEY = os.environ.get('SECRET_KEY') or DEFAULT_SECRET_KEY  # Fallback if not set
     REMEMBER_COOKIE_DURATION = timedelta(days=3)  # Can be adjusted as needed
     
     # Use DATABASE_URL for production databases (e.g., PostgreSQL, MySQL)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'sentimentScout.db')
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # Avoids unnecessary overhead for modification tracking
+
+    # SQLite profile, applied to every new connection (see app/database.py). WAL lets readers
+    # run while a write is in progress and busy_timeout makes a blocked writer wait for the
+    # lock instead of failing with "database is locked".
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',  # Durable in WAL mode, only the last commits can be lost on power failure
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),  # milliseconds
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    }
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite:///') and ':memory:' not in SQLALCHEMY_DATABASE_URI:
+        # One pooled connection per gunicorn thread plus the scraper threads and the writer
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': 10,
+            'max_overflow': 10,
+            'pool_timeout': 30,
+            'connect_args': {'check_same_thread': False},
+        }
+
+    # Background writes (scrapers, analysis results) are applied by a single writer thread
+    # that commits them in batches, so they never compete with each other for SQLite's lock.
+    # Set SERIALIZE_WRITES=false on a server database to commit them from the calling thread.
+    SERIALIZE_WRITES = os.environ.get(
+        'SERIALIZE_WRITES', str(SQLALCHEMY_DATABASE_URI.startswith('sqlite'))
+    ).lower() == 'true'
+    WRITE_BATCH_SIZE = 50  # jobs committed together at most
+    WRITE_BATCH_WAIT = 0.02  # seconds to wait for more jobs before committing a batch
+
+    # Sentiment models: the memory-mapped package built by convert_model.py, or the pickle it
+    # is converted from when the package has not been built
+    MODEL_PACKAGE = os.environ.get('MODEL_PACKAGE') or os.path.join(basedir, 'models')
+    MODEL_PICKLE = os.environ.get('MODEL_PICKLE') or os.path.join(basedir, 'models.p')
+
+    # Reviews are classified by a pool of worker processes (per gunicorn worker) that combines
+    # the texts of concurrent analyses into batches; 0 classifies on a thread in-process instead
+    INFERENCE_PROCESSES = int(os.environ.get('INFERENCE_PROCESSES', 2))
+    INFERENCE_MAX_BATCH_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 256))  # texts per batch
+    INFERENCE_MAX_WAIT = float(os.environ.get('INFERENCE_MAX_WAIT', 0.01))  # seconds to wait for a batch to fill
+    CLASSIFY_MAX_TEXTS = int(os.environ.get('CLASSIFY_MAX_TEXTS', 10000))  # texts per POST /classify request
+    # Labels predicted for a preprocessed text are kept per model version, so analyses only classify new texts
+    PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'true').lower() == 'true'
+
+    # Marketplaces the scrapers load review pages from; point them at a stand-in such as
+    # benchmarks/marketplace.py to test the scrapers without the live sites
+    AMAZON_BASE_URL = os.environ.get('AMAZON_BASE_URL', 'https://www.amazon.in').rstrip('/')
+    FLIPKART_BASE_URL = os.environ.get('FLIPKART_BASE_URL', 'https://www.flipkart.com').rstrip('/')
+    AMAZON_PAGE_WAIT = float(os.environ.get('AMAZON_PAGE_WAIT', 3))  # seconds to let an Amazon page settle after loading
+
+    # How the scrapers fetch pages (app/fetcher.py): 'http' fetches them from a connection pool,
+    # SCRAPE_CONCURRENCY at a time, and loads only the pages that need it in Chrome; 'browser'
+    # loads every page in Chrome
+    SCRAPE_FETCHER = os.environ.get('SCRAPE_FETCHER', 'http')
+    SCRAPE_CONCURRENCY = int(os.environ.get('SCRAPE_CONCURRENCY', 4))
+    SCRAPE_TIMEOUT = float(os.environ.get('SCRAPE_TIMEOUT', 20))  # seconds a page may take to load
+    SCRAPE_RETRIES = int(os.environ.get('SCRAPE_RETRIES', 2))  # retries of a page answering a server error
+    # Chrome skips images, stylesheets, fonts and trackers (app/fetcher.py BLOCKED_URLS); more
+    # URL patterns to block can be given comma-separated
+    SCRAPE_BLOCK_RESOURCES = os.environ.get('SCRAPE_BLOCK_RESOURCES', 'true').lower() == 'true'
+    SCRAPE_BLOCKED_URLS = [url for url in os.environ.get('SCRAPE_BLOCKED_URLS', '').split(',') if url]
+
+    # A scrape request joins the running scrape of the same listing, and reuses the reviews of
+    # one completed less than this many seconds ago unless it is made with ?force=true
+    SCRAPE_FRESHNESS_TTL = {
+        'amazon': int(os.environ.get('AMAZON_SCRAPE_TTL', 6 * 3600)),
+        'flipkart': int(os.environ.get('FLIPKART_SCRAPE_TTL', 6 * 3600)),
+    }
+
+    # Running scrapes hold a lease on their task that their process renews every
+    # TASK_HEARTBEAT_INTERVAL seconds (app/leases.py). The task of a process that stopped
+    # renewing it for TASK_LEASE_SECONDS is started again by another one, up to
+    # TASK_MAX_ATTEMPTS times, or failed with TASK_ORPHAN_ACTION=fail.
+    TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS', 120))
+    TASK_HEARTBEAT_INTERVAL = int(os.environ.get('TASK_HEARTBEAT_INTERVAL', 30))
+    TASK_ORPHAN_ACTION = os.environ.get('TASK_ORPHAN_ACTION', 'requeue')
+    TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 3))
+
+    # Where scrapes and analyses run: 'thread' runs them in the API process that received the
+    # request; 'worker' queues them for `python -m app.worker` processes (app/jobs.py), which
+    # can run on other machines. JOB_BROKER_URL is the queue: unset for the jobs table of the
+    # database, or a redis:// or amqp:// URL (needs kombu).
+    JOB_EXECUTOR = os.environ.get('JOB_EXECUTOR', 'thread')
+    JOB_BROKER_URL = os.environ.get('JOB_BROKER_URL')
+    # With a JOB_BROKER_URL, a job still queued this many seconds after it was published is
+    # published again: its message may have been lost with the broker, or never sent
+    JOB_REPUBLISH_AFTER = float(os.environ.get('JOB_REPUBLISH_AFTER', 600))
+    JOB_RESULT_WAIT = float(os.environ.get('JOB_RESULT_WAIT', 30))  # most seconds an analysis request may ?wait for its job
+    WORKER_CONCURRENCY = int(os.environ.get('WORKER_CONCURRENCY', 2))  # jobs a worker runs at a time
+    WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 1.0))  # seconds between polls of an empty queue
+
+    # Amazon account the scraper signs in with when Amazon asks it to
+    AMAZON_EMAIL = os.environ.get('AMAZON_EMAIL')
+    AMAZON_PASSWORD = os.environ.get('AMAZON_PASSWORD')
+    # Signed-in sessions are saved encrypted (app/session_store.py) and reused by later scrapes
+    # for up to SESSION_MAX_AGE seconds. SESSION_STORE_KEY is a Fernet key
+    # (`Fernet.generate_key()`); by default one is derived from SECRET_KEY, if SECRET_KEY is
+    # set. With neither, sessions are not saved and every scrape signs in again.
+    SESSION_STORE_DIR = os.environ.get('SESSION_STORE_DIR') or os.path.join(basedir, 'sessions')
+    SESSION_STORE_KEY = os.environ.get('SESSION_STORE_KEY')
+    SESSION_MAX_AGE = int(os.environ.get('SESSION_MAX_AGE', 7 * 24 * 3600))
+
+    # Deleted products are removed by a background reaper in transactions of at most this many rows
+    PRODUCT_DELETE_BATCH_SIZE = 1000
+    PRODUCT_REAPER_INTERVAL = 60  # seconds between sweeps for products left marked as deleting
+
+    # Per-user response cache for the read endpoints. 'redis' is shared by all processes; 'memory'
+    # keeps a bounded LRU in each process, which only sees its own invalidations, so with several
+    # gunicorn workers or app.worker processes responses can be stale for RESPONSE_CACHE_TTL
+    # seconds. 'redis' is the default when REDIS_URL is set.
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'redis' if os.environ.get('REDIS_URL') else 'memory')
+    RESPONSE_CACHE_REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES = 2048
+    RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
     
+    # Stage timings, the Server-Timing header and the Prometheus /metrics endpoint (see app/metrics.py)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # SQL statements are counted and timed per request; requests over these thresholds are logged
+    # (see app/querycount.py), as are statements slower than SLOW_QUERY_THRESHOLD seconds
+    QUERY_ACCOUNTING_ENABLED = os.environ.get('QUERY_ACCOUNTING_ENABLED', 'true').lower() == 'true'
+    QUERY_COUNT_THRESHOLD = int(os.environ.get('QUERY_COUNT_THRESHOLD', 30))  # statements per request
+    QUERY_TIME_THRESHOLD = float(os.environ.get('QUERY_TIME_THRESHOLD', 0.5))  # seconds in the database per request
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))  # executions of one statement per request
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD', 0.1))  # seconds
+
     # For Production Logging and Error Handling
     if os.environ.get('FLASK_ENV') == 'production':
         DEBUG = False
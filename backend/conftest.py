@@ -0,0 +1,16 @@
+"""
+Test setup. The app reads DATABASE_URL when it is imported, so it is pointed at a
+temporary SQLite database here, before the fixtures of app/testing.py import it: the tests
+never touch sentimentScout.db or a database configured in the environment.
+
+    python -m pytest
+"""
+import os
+import tempfile
+
+TEST_DIRECTORY = tempfile.mkdtemp(prefix='sentimentscout-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(TEST_DIRECTORY, 'test.db')
+os.environ['SESSION_STORE_DIR'] = os.path.join(TEST_DIRECTORY, 'sessions')
+os.environ['INFERENCE_PROCESSES'] = '0'
+
+pytest_plugins = ['app.testing']
@@ -0,0 +1,14 @@
+"""
+Converts the pickled sentiment models into the memory-mapped model package that the
+app loads instead (see app/model_store.py), and checks that the package reproduces the
+original vectors and predictions.
+
+    python convert_model.py [models.p] [models]
+"""
+import sys
+from app.model_store import convert_pickle
+
+source = sys.argv[1] if len(sys.argv) > 1 else 'models.p'
+destination = sys.argv[2] if len(sys.argv) > 2 else 'models'
+manifest = convert_pickle(source, destination)
+print(f"Converted {source} into {destination} (version {manifest['version']}, models: {', '.join(manifest['models'])})")
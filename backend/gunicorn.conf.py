@@ -0,0 +1,40 @@
+"""
+Gunicorn settings, used by the Dockerfile: `gunicorn -c gunicorn.conf.py app:app`.
+
+With `preload_app` the app is imported in the master process and the sentiment models are
+loaded there before the workers are forked, so every worker shares them instead of loading
+its own copy. Set GUNICORN_PRELOAD=false to load them in each worker on first use.
+
+Every worker starts its scraping task lease keeper (app/leases.py) and its product reaper
+(app/reaper.py) as soon as it has loaded the app, so the tasks and deletions of workers that
+died are picked up after a restart even if no request comes in.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def when_ready(server):
+    # Runs in the master once the app is loaded, before any worker is forked
+    if preload_app:
+        from app.model_store import get_models
+        get_models()
+    from config import Config
+    if workers > 1 and Config.RESPONSE_CACHE_ENABLED and Config.RESPONSE_CACHE_BACKEND == 'memory':
+        server.log.warning(
+            f'The response cache is per worker (RESPONSE_CACHE_BACKEND=memory): a change made through one of the '
+            f'{workers} workers shows up in the others after up to {Config.RESPONSE_CACHE_TTL} seconds. '
+            f'Set REDIS_URL to share the cache.'
+        )
+
+
+def post_worker_init(worker):
+    # Runs in each worker once it has loaded the app; the first sweeps recover orphaned tasks
+    # and finish interrupted deletions
+    from app.leases import task_leases
+    from app.reaper import product_reaper
+    task_leases.start()
+    product_reaper.start()
@@ -1,6 +1,8 @@
 from app import app, db
 from app.models import User, Product, ProductPlatform, Review, SentimentSummary
+from app.migrations import upgrade
 
 with app.app_context():
     db.create_all()
+upgrade()
 print("Database initialized.")
@@ -5,10 +5,8 @@ call minorvenv\Scripts\activate
 set "deactivated=0"
 setlocal
 
-:: Check if the database exists, and initialize it if it doesn't
-if not exist "sentimentScout.db" (
-    python init_db.py
-)
+:: Initialize the database and apply any pending migrations
+python init_db.py
 
 :: Run the application
 python run.py
@@ -1,5 +1,12 @@
+import os
 from app import app
+from app.leases import task_leases
+from app.reaper import product_reaper
 
 if __name__ == '__main__':
+    # The reloader serves the app from a child process, where the lease keeper and the reaper have to run
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        task_leases.start()
+        product_reaper.start()
     app.run(debug=True)
  
@@ -15,10 +15,8 @@ function deactivate_venv {
 # Trap exit signals to ensure venv deactivation
 trap deactivate_venv EXIT SIGINT SIGTERM
 
-# Initialize the database if it doesn't exist
-if [ ! -f "sentimentScout.db" ]; then
-    python init_db.py
-fi
+# Initialize the database and apply any pending migrations
+python init_db.py
 
 # Run the application
 python run.py
@@ -7,6 +7,12 @@ call minorvenv\Scripts\activate
 :: Install dependencies
 pip install -r requirements.txt
 
+:: Download the NLTK data used for review preprocessing (the app never downloads it at runtime)
+python -m nltk.downloader stopwords punkt_tab wordnet
+
+:: Convert the pickled sentiment models into the memory-mapped model package
+python convert_model.py models.p models
+
 :: Deactivate the virtual environment
 call minorvenv\Scripts\deactivate
 
@@ -9,6 +9,12 @@ source minorvenv/bin/activate
 # Install dependencies
 pip install -r requirements.txt
 
+# Download the NLTK data used for review preprocessing (the app never downloads it at runtime)
+python -m nltk.downloader stopwords punkt_tab wordnet
+
+# Convert the pickled sentiment models into the memory-mapped model package
+python convert_model.py models.p models
+
 # Deactivate the venv
 deactivate
 
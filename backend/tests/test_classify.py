@@ -0,0 +1,62 @@
+"""POST /classify reads JSON arrays and NDJSON, and rejects malformed or oversized bodies."""
+import json
+import pytest
+from app import app
+from app.inference import classify_batch
+from app.tasks import preprocess_text
+
+TEXTS = ['The agent solved my issue, great service', 'Still waiting for a refund, awful', 'It is okay']
+
+
+@pytest.fixture
+def classify(client, model_files):
+    def post(body, content_type='application/json', model_name='logreg'):
+        return client.post(f'/classify?model_name={model_name}', data=body, content_type=content_type)
+    return post
+
+
+def expected_labels(texts, model_name='logreg'):
+    return classify_batch(model_name, [preprocess_text(text) for text in texts])
+
+
+def test_json_array(classify, nltk_data):
+    response = classify(json.dumps(TEXTS))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['model_name'] == 'logreg'
+    assert [result['label'] for result in body['results']] == expected_labels(TEXTS)
+    assert all(set(result['scores']) == {'Negative', 'Neutral', 'Positive'} for result in body['results'])
+
+
+def test_ndjson(classify, nltk_data):
+    lines = [json.dumps(TEXTS[0]), '', json.dumps({'text': TEXTS[1], 'id': 7}), '   ', json.dumps(TEXTS[2])]
+    response = classify('\n'.join(lines) + '\n', content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert [result['label'] for result in response.get_json()['results']] == expected_labels(TEXTS)
+
+
+def test_malformed_ndjson_reports_its_line(classify):
+    # The third item is on the fifth line, after two blank ones
+    lines = [json.dumps(TEXTS[0]), '', json.dumps(TEXTS[1]), '', '{"text": "unterminated']
+    response = classify('\n'.join(lines), content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid JSON on line 5.'
+
+
+def test_item_without_text(classify):
+    response = classify(json.dumps([TEXTS[0], {'body': 'no text field'}]))
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Item 1 is not a text')
+
+
+@pytest.mark.parametrize('content_type', ['application/json', 'application/x-ndjson'])
+def test_too_many_texts(classify, monkeypatch, content_type):
+    monkeypatch.setitem(app.config, 'CLASSIFY_MAX_TEXTS', 2)
+    body = json.dumps(TEXTS) if content_type == 'application/json' else '\n'.join(map(json.dumps, TEXTS))
+    response = classify(body, content_type=content_type)
+    assert response.status_code == 413
+    assert response.get_json()['error'] == 'Too many texts, at most 2 per request.'
+
+
+def test_unknown_model(classify):
+    assert classify(json.dumps(TEXTS), model_name='unknown').status_code == 404
@@ -0,0 +1,51 @@
+"""The dashboard rows are refreshed with the writes, recomputing only what the writes changed."""
+from sqlalchemy import update
+from app import app, db
+from app.dashboard import compute_dashboard
+from app.models import DashboardAggregate, ScrapingTask, Status
+from app.querycount import count_queries
+from app.tasks import set_task_status
+from app.testing import add_products, add_task
+
+
+def stored_dashboard(user_id):
+    with app.app_context():
+        aggregate = db.session.get(DashboardAggregate, user_id)
+        return {field: getattr(aggregate, field) for field in compute_dashboard(user_id)}, compute_dashboard(user_id)
+
+
+def test_task_update_recomputes_only_pending_tasks(user):
+    task_id = add_task(user, add_products(user, 1)[0])
+    with app.app_context():
+        with count_queries() as counter:
+            set_task_status(task_id, Status.PENDING, 'Scraped page 2')
+            db.session.commit()
+    # the task's load and update, then the dashboard row's load, the pending tasks and its update
+    assert counter.count == 5
+    stored, computed = stored_dashboard(user)
+    assert stored == computed
+    assert stored['pending_scraping_task_details'][0]['message'] == 'Scraped page 2'
+
+
+def test_lease_update_does_not_refresh_the_dashboard(user):
+    task_id = add_task(user, add_products(user, 1)[0])
+    with app.app_context():
+        task = db.session.get(ScrapingTask, task_id)
+        task.owner = 'another-host:1'
+        task.attempts += 1
+        with count_queries() as counter:
+            db.session.commit()
+    assert counter.count == 1
+
+
+def test_new_product_refreshes_every_count(user):
+    add_products(user, 2)
+    stored, computed = stored_dashboard(user)
+    assert stored == computed
+    assert stored['total_products'] == 2
+
+    with app.app_context():
+        db.session.execute(update(DashboardAggregate).where(DashboardAggregate.user_id == user).values(total_products=0))
+        db.session.commit()
+    add_products(user, 1)
+    assert stored_dashboard(user)[0]['total_products'] == 3
@@ -0,0 +1,106 @@
+"""Ensemble analyses: the majority vote, its tie-break, and the majority stored on each review."""
+from datetime import date
+import pytest
+from app import app, db
+from app.ensemble import ensemble_report, majority_vote
+from app.models import ProductPlatform, RawReview, Review, ReviewSource, Sentiment
+from app.routes import store_analysis_results
+from app.testing import add_products, add_task
+from app.writer import write_serializer
+
+
+def test_majority_wins():
+    labels = {'svm': 'Negative', 'logreg': 'Positive', 'nb': 'Positive'}
+    assert majority_vote(labels, ('svm', 'logreg', 'nb')) == 'Positive'
+
+
+def test_tie_goes_to_the_requested_model():
+    labels = {'svm': 'Negative', 'logreg': 'Positive'}
+    assert majority_vote(labels, ('svm', 'logreg')) == 'Negative'
+    assert majority_vote(labels, ('logreg', 'svm')) == 'Positive'
+    # Three-way tie
+    labels['nb'] = 'Neutral'
+    assert majority_vote(labels, ('nb', 'svm', 'logreg')) == 'Neutral'
+
+
+def test_report():
+    predictions = [
+        {'svm': 'Positive', 'logreg': 'Positive'},
+        {'svm': 'Negative', 'logreg': 'Positive'},
+        {'svm': 'Neutral', 'logreg': 'Negative'},
+    ]
+    majorities, report = ensemble_report(('logreg', 'svm'), predictions)
+    assert majorities == ['Positive', 'Positive', 'Negative']
+    assert report['majority'] == {'positive_reviews': 2, 'negative_reviews': 1, 'neutral_reviews': 0}
+    assert report['models']['logreg']['agreement_with_majority'] == 1.0
+    assert report['models']['svm']['agreement_with_majority'] == round(1 / 3, 4)
+    assert report['agreement_rate'] == round(1 / 3, 4)
+
+
+def review_rows(sentiments, majorities):
+    return [
+        {'overall_review': f'Review {i}', 'rating': 4.0, 'Sentiment': sentiment, 'Majority': majority,
+         'date': 'Reviewed on 1 March 2024', 'posted_on': date(2024, 3, 1), 'author': f'Author {i}'}
+        for i, (sentiment, majority) in enumerate(zip(sentiments, majorities))
+    ]
+
+
+@pytest.fixture
+def listing(user):
+    product_id = add_products(user, 1)[0]
+    with app.app_context():
+        platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=ReviewSource.AMAZON).one().platform_id
+    return product_id, platform_id
+
+
+def stored_majorities(product_id):
+    with app.app_context():
+        return [review.majority_sentiment for review in Review.query.filter_by(product_id=product_id).order_by(Review.id)]
+
+
+def test_majority_is_stored_on_the_reviews(listing):
+    product_id, platform_id = listing
+    rows = review_rows(['Negative', 'Positive'], ['Positive', 'Positive'])
+    write_serializer.run(store_analysis_results, product_id, ReviewSource.AMAZON, platform_id, {}, rows)
+    assert stored_majorities(product_id) == [Sentiment.POSITIVE, Sentiment.POSITIVE]
+
+    # A new ensemble analysis updates it
+    rows = review_rows(['Negative', 'Positive'], ['Negative', 'Neutral'])
+    write_serializer.run(store_analysis_results, product_id, ReviewSource.AMAZON, platform_id, {}, rows)
+    assert stored_majorities(product_id) == [Sentiment.NEGATIVE, Sentiment.NEUTRAL]
+
+
+@pytest.fixture
+def scraped_listing(user, listing):
+    product_id, platform_id = listing
+    task_id = add_task(user, product_id)
+    with app.app_context():
+        db.session.add_all(
+            RawReview(task_id=task_id, title=title, body=body, rating='4.0 out of 5 stars', rating_value=4.0,
+                      date='Reviewed on 1 March 2024', posted_on=date(2024, 3, 1), author='Author',
+                      product_id=product_id, platform=ReviewSource.AMAZON)
+            for title, body in [('Great', 'love the great battery'), ('Awful', 'broke after a day, awful'),
+                                ('Okay', 'it is okay for the price')]
+        )
+        db.session.commit()
+    return product_id
+
+
+def test_unknown_ensemble_model(client, model_files, scraped_listing):
+    response = client.post(f'/reviews/analyse/{scraped_listing}?platform=amazon&model_name=svm&ensemble=svm,unknown')
+    assert response.status_code == 404
+    assert response.get_json()['error'] == "Model 'unknown' not found."
+
+
+def test_ensemble_analysis(client, model_files, nltk_data, scraped_listing):
+    response = client.post(f'/reviews/analyse/{scraped_listing}?platform=amazon&model_name=svm&ensemble=all')
+    assert response.status_code == 200
+    ensemble = response.get_json()['ensemble']
+    assert set(ensemble['models']) == {'svm', 'logreg'}
+    majorities = stored_majorities(scraped_listing)
+    assert ensemble['majority'] == {
+        'positive_reviews': majorities.count(Sentiment.POSITIVE),
+        'negative_reviews': majorities.count(Sentiment.NEGATIVE),
+        'neutral_reviews': majorities.count(Sentiment.NEUTRAL),
+    }
+    assert len(majorities) == 3
@@ -0,0 +1,84 @@
+"""The HTTP fetcher against the marketplace stand-in: paging, and the pages it hands to Chrome."""
+import zlib
+import pytest
+from app import app
+from app.fetcher import Fetcher, Page, browser_reason
+from app.models import ReviewSource
+from app.tasks import AMAZON_REVIEW_LIST, get_product_url, parse_amazon_page
+from benchmarks.corpus import generate_reviews
+from benchmarks.marketplace import PAGE_SIZE, MarketplaceServer
+
+ASIN = 'B0STANDIN1'
+PAGES = 4
+
+
+@pytest.fixture
+def marketplace(request, monkeypatch):
+    with MarketplaceServer(pages=PAGES, **getattr(request, 'param', {})) as server:
+        monkeypatch.setitem(app.config, 'AMAZON_BASE_URL', server.url)
+        yield server
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    monkeypatch.setitem(app.config, 'SCRAPE_FETCHER', 'http')
+    monkeypatch.setitem(app.config, 'SCRAPE_CONCURRENCY', 3)
+    monkeypatch.setitem(app.config, 'SCRAPE_TIMEOUT', 5)
+    fetcher = Fetcher()
+    browser_loads = []
+
+    def fetch_in_browser(url, expect=None):
+        # There is no Chrome in the tests: record what would have been loaded in it
+        browser_loads.append(url)
+        return Page(url, 200, '', via='browser')
+
+    monkeypatch.setattr(fetcher, 'fetch_in_browser', fetch_in_browser)
+    fetcher.browser_loads = browser_loads
+    yield fetcher
+    fetcher.close()
+
+
+def page_url(number):
+    return get_product_url(ASIN, 'ref', pagenumber=number)
+
+
+def test_every_page_is_fetched_in_order(marketplace, fetcher):
+    def parse(page):
+        reviews, has_next = parse_amazon_page(page)
+        return (page.url, reviews), has_next
+
+    results = list(fetcher.fetch_pages(page_url, parse, max_pages=20, expect=AMAZON_REVIEW_LIST))
+
+    assert [url for url, reviews in results] == [page_url(number) for number in range(1, PAGES + 1)]
+    listing = generate_reviews(PAGES * PAGE_SIZE, zlib.crc32(ASIN.encode()), ReviewSource.AMAZON)
+    assert [review['body'] for url, reviews in results for review in reviews] == [review['body'] for review in listing]
+    assert fetcher.pages['browser'] == 0 and fetcher.browser_loads == []
+
+
+def test_pager_stops_on_the_last_page(marketplace, fetcher):
+    results = list(fetcher.fetch_pages(page_url, parse_amazon_page, max_pages=20, window=1))
+    assert len(results) == PAGES
+    assert marketplace.stats['amazon_pages'] == PAGES
+    # With a window, at most the rest of the window is fetched past the last page
+    assert len(list(fetcher.fetch_pages(page_url, parse_amazon_page, max_pages=20))) == PAGES
+    assert marketplace.stats['amazon_pages'] <= 2 * PAGES + fetcher.concurrency - 1
+
+
+@pytest.mark.parametrize('marketplace', [{'signin': True}], indirect=True)
+def test_sign_in_redirect_is_loaded_in_the_browser(marketplace, fetcher):
+    page = fetcher.http.get(page_url(1))
+    assert '/ap/signin' in page.final_url
+    assert browser_reason(page, AMAZON_REVIEW_LIST) == 'sign-in'
+
+    assert fetcher.fetch(page_url(1), AMAZON_REVIEW_LIST).via == 'browser'
+    assert fetcher.browser_loads == [page_url(1)]
+
+
+@pytest.mark.parametrize('marketplace', [{'fail_rate': 1.0}], indirect=True)
+def test_unavailable_page_is_treated_as_a_captcha(marketplace, fetcher):
+    page = fetcher.http.get(page_url(1))
+    assert page.status == 503
+    assert browser_reason(page, AMAZON_REVIEW_LIST) == 'captcha'
+
+    assert fetcher.fetch(page_url(1), AMAZON_REVIEW_LIST).via == 'browser'
+    assert fetcher.pages == {}
@@ -0,0 +1,56 @@
+"""The inference pool batches submissions across worker processes and returns results in input order."""
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.inference import InferencePool, classify_batch
+
+
+@pytest.fixture
+def pool(model_files, request):
+    pool = InferencePool(processes=request.param, max_batch_size=4, max_wait=0.05)
+    yield pool
+    pool.executor.shutdown(cancel_futures=True)
+
+
+def texts(count, prefix):
+    words = ['great', 'awful', 'okay', 'love', 'broke', 'price', 'value', 'terrible', 'fine']
+    return [f'{prefix} {words[i % len(words)]} {words[(i * 5) % len(words)]}' for i in range(count)]
+
+
+@pytest.mark.parametrize('pool', [1], indirect=True)
+def test_labels_come_back_in_input_order(pool):
+    requests = [texts(10, 'first'), texts(3, 'second'), texts(7, 'third')]
+    with ThreadPoolExecutor(len(requests)) as submitters:
+        results = list(submitters.map(lambda request: pool.predict(request, 'logreg'), requests))
+
+    # Each request was split over several batches, shared with the other requests
+    assert results == [classify_batch('logreg', request) for request in requests]
+    stats = pool.stats()
+    assert stats['texts'] == 20
+    assert stats['batches'] >= 5
+    assert sum(stats['batch_size_histogram'].values()) == stats['batches']
+    assert set(stats['batch_size_histogram']) == {'1', '2', '4'}
+
+
+@pytest.mark.parametrize('pool', [1], indirect=True)
+def test_several_models_and_scores(pool):
+    request = texts(6, 'scored')
+    labels = pool.predict(request, ('logreg', 'svm'))
+    assert [result['logreg'] for result in labels] == classify_batch('logreg', request)
+    scored = pool.predict(request, 'svm', scores=True)
+    assert [result['label'] for result in scored] == classify_batch('svm', request)
+    assert all(set(result['scores']) == {'Negative', 'Neutral', 'Positive'} for result in scored)
+
+
+@pytest.mark.parametrize('pool', [0], indirect=True)
+def test_cancelled_chunks_are_not_counted(pool):
+    pool.submit(['warm up'], 'logreg').result()
+    # The dispatcher cannot take the chunks from the queue while the condition is held
+    with pool.condition:
+        first = pool.submit(texts(3, 'kept'), 'logreg')
+        pool.submit(texts(1, 'cancelled'), 'logreg')  # fits in the same batch
+        pool.pending[-1].future.cancel()
+
+    assert len(first.result(timeout=5)) == 3
+    stats = pool.stats()
+    assert (stats['batches'], stats['texts']) == (2, 4)
+    assert stats['batch_size_histogram'] == {'1': 1, '2': 0, '4': 1}
@@ -0,0 +1,217 @@
+"""
+Worker mode: analyses answer with their job right away, failed or abandoned scrape jobs
+fail their task, and the messages of the KombuBroker are neither lost nor run twice.
+"""
+import queue
+from collections import deque
+from types import SimpleNamespace
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError
+from app import app, db
+from app import jobs, routes
+from app.jobs import JOB_HANDLERS, KombuBroker, claim_job, enqueue_job, recover_jobs
+from app.models import Job, JobStatus, ProductPlatform, ReviewSource, ScrapingTask, Status
+from app.tasks import start_scrape
+from app.testing import add_products
+from app.worker import Worker
+from app.writer import write_serializer
+
+
+@pytest.fixture
+def worker_mode(monkeypatch):
+    monkeypatch.setitem(app.config, 'JOB_EXECUTOR', 'worker')
+
+
+@pytest.fixture
+def listing(user):
+    product_id = add_products(user, 1, platforms=(ReviewSource.FLIPKART,))[0]
+    with app.app_context():
+        fsn = ProductPlatform.query.filter_by(product_id=product_id).first().platform_id
+    return product_id, fsn
+
+
+def queue_scrape(user, listing):
+    product_id, fsn = listing
+    with app.app_context():
+        task, state = start_scrape(ReviewSource.FLIPKART, fsn, product_id, user)
+    assert state == 'started'
+    return task.id
+
+
+def task_and_job(task_id):
+    with app.app_context():
+        return db.session.get(ScrapingTask, task_id).status, db.session.get(Job, task_id).status
+
+
+def test_abandoned_scrape_job_fails_its_task(user, listing, worker_mode):
+    task_id = queue_scrape(user, listing)
+    # Its last allowed run was on a worker that died
+    with app.app_context():
+        db.session.execute(update(Job).where(Job.id == task_id).values(
+            status=JobStatus.RUNNING, owner='dead-host:1', attempts=app.config['TASK_MAX_ATTEMPTS'],
+            lease_expires_at=datetime.now() - timedelta(minutes=5)))
+        db.session.commit()
+
+    assert task_id in recover_jobs()
+    assert task_and_job(task_id) == (Status.FAILED, JobStatus.FAILED)
+    # The listing can be scraped again
+    assert queue_scrape(user, listing) != task_id
+
+
+def test_failed_scrape_job_fails_its_task(user, listing, worker_mode, monkeypatch):
+    task_id = queue_scrape(user, listing)
+
+    def crash(payload):
+        raise RuntimeError('Chrome did not start')
+
+    monkeypatch.setitem(JOB_HANDLERS, 'scrape', crash)
+    worker = Worker(1, ['scrape'], 0.1, 30)
+    assert write_serializer.run(claim_job, task_id, worker.owner)
+    worker.execute(task_id)
+
+    assert task_and_job(task_id) == (Status.FAILED, JobStatus.FAILED)
+    with app.app_context():
+        assert db.session.get(ScrapingTask, task_id).message == 'Chrome did not start'
+    assert queue_scrape(user, listing) != task_id
+
+
+def test_analysis_answers_with_its_job(client, listing, worker_mode, monkeypatch):
+    def wait_for_job(job_id, timeout):
+        raise AssertionError('The request waited for the job')
+
+    monkeypatch.setattr(routes, 'wait_for_job', wait_for_job)
+    response = client.post(f'/reviews/analyse/{listing[0]}?platform=flipkart')
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body['status_url'] == f"/jobs/{body['job_id']}"
+
+    job = client.get(body['status_url']).get_json()
+    assert (job['kind'], job['status'], job['result']) == ('analysis', 'QUEUED', None)
+
+
+def test_analysis_waits_when_asked(client, listing, worker_mode, monkeypatch):
+    waits = []
+    done = SimpleNamespace(status=JobStatus.COMPLETED, result={'status': 200, 'response': {'message': 'Analysed'}}, error=None)
+
+    def wait_for_job(job_id, timeout):
+        waits.append(timeout)
+        return done
+
+    monkeypatch.setattr(routes, 'wait_for_job', wait_for_job)
+    response = client.post(f'/reviews/analyse/{listing[0]}?platform=flipkart&wait=2.5')
+    assert (response.status_code, response.get_json()) == (200, {'message': 'Analysed'})
+    # Capped at JOB_RESULT_WAIT
+    client.post(f"/reviews/analyse/{listing[0]}?platform=flipkart&wait={app.config['JOB_RESULT_WAIT'] * 10}")
+    assert waits == [2.5, app.config['JOB_RESULT_WAIT']]
+
+    for wait in ('soon', 'nan', '-1'):
+        assert client.post(f'/reviews/analyse/{listing[0]}?platform=flipkart&wait={wait}').status_code == 400
+    assert len(waits) == 2
+
+
+def test_analysis_of_a_vanished_job(client, listing, worker_mode, monkeypatch):
+    monkeypatch.setattr(routes, 'wait_for_job', lambda job_id, timeout: None)
+    response = client.post(f'/reviews/analyse/{listing[0]}?platform=flipkart&wait=5')
+    assert response.status_code == 404
+    assert 'job_id' in response.get_json()
+
+
+class MemoryQueue:
+    """The SimpleQueue calls of KombuBroker, in memory; a message is gone once acknowledged."""
+
+    def __init__(self):
+        self.messages = deque()
+        self.acked = []
+
+    def put(self, payload):
+        self.messages.append(payload)
+
+    def get(self, block=True, timeout=None):
+        if not self.messages:
+            raise queue.Empty
+        return MemoryMessage(self, self.messages.popleft())
+
+
+class MemoryMessage:
+    def __init__(self, simple_queue, payload):
+        self.queue = simple_queue
+        self.payload = payload
+
+    def ack(self):
+        self.queue.acked.append(self.payload['job_id'])
+
+    def requeue(self):
+        self.queue.messages.appendleft(self.payload)
+
+
+class MemoryBroker(KombuBroker):
+    def __init__(self):
+        self.queues = {}
+
+    def queue(self, kind):
+        return self.queues.setdefault(kind, MemoryQueue())
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def kombu_broker(monkeypatch):
+    broker = MemoryBroker()
+    monkeypatch.setattr(jobs, 'broker', broker)
+    return broker
+
+
+def queue_analysis(user):
+    return enqueue_job('analysis', {'product_id': 0, 'platform': 'amazon', 'model_name': 'svm', 'ensemble': None}, user)
+
+
+def test_message_is_acknowledged_once_its_job_is_claimed(user, kombu_broker, monkeypatch):
+    job_id = queue_analysis(user)
+    analyses = kombu_broker.queue('analysis')
+
+    def database_down(job_id, owner):
+        raise OperationalError('UPDATE jobs', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(jobs, 'claim_job', database_down)
+    with pytest.raises(OperationalError):
+        kombu_broker.claim('host-1:1', ['analysis'], 0.1)
+    # Back in the queue for another try, or another worker
+    assert analyses.acked == [] and list(analyses.messages) == [{'job_id': job_id}]
+
+    monkeypatch.setattr(jobs, 'claim_job', claim_job)
+    assert kombu_broker.claim('host-1:1', ['analysis'], 0.1) == job_id
+    assert analyses.acked == [job_id]
+
+    # A duplicate is acknowledged without running the job again
+    kombu_broker.publish(job_id, 'analysis')
+    assert kombu_broker.claim('host-2:1', ['analysis'], 0.1) is None
+    assert analyses.acked == [job_id, job_id] and not analyses.messages
+
+
+def make_overdue(job_id):
+    with app.app_context():
+        db.session.execute(update(Job).where(Job.id == job_id).values(lease_expires_at=datetime.now() - timedelta(seconds=1)))
+        db.session.commit()
+
+
+def test_lost_message_is_published_again(user, kombu_broker):
+    job_id = queue_analysis(user)
+    analyses = kombu_broker.queue('analysis')
+    analyses.messages.clear()  # lost with the broker
+
+    assert job_id not in recover_jobs()
+    make_overdue(job_id)
+    assert job_id in recover_jobs()
+    assert list(analyses.messages) == [{'job_id': job_id}]
+    # Not again until JOB_REPUBLISH_AFTER has passed once more
+    assert job_id not in recover_jobs()
+    assert kombu_broker.claim('host-1:1', ['analysis'], 0.1) == job_id
+
+
+def test_database_broker_does_not_republish(user):
+    job_id = queue_analysis(user)
+    make_overdue(job_id)
+    assert job_id not in recover_jobs()
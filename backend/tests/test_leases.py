@@ -0,0 +1,94 @@
+"""Leases on scraping tasks: orphans are recovered at worker startup, restarted up to TASK_MAX_ATTEMPTS, and claimed once."""
+import threading
+from datetime import datetime, timedelta
+from app import app, db
+from app import leases, reaper
+from app.leases import TaskLeases
+from app.models import ScrapingTask, Status
+from app.reaper import ProductReaper
+from app.testing import add_products, add_task, load_gunicorn_config, wait_until
+
+
+def test_worker_startup_recovers_orphaned_tasks(user, monkeypatch):
+    task_id = add_task(user, add_products(user, 1)[0], owner='dead-host:1',
+                       lease_expires_at=datetime.now() - timedelta(minutes=5), attempts=1)
+
+    monkeypatch.setitem(app.config, 'TASK_ORPHAN_ACTION', 'fail')
+    monkeypatch.setattr(leases, 'task_leases', TaskLeases(heartbeat_interval=3600))
+    monkeypatch.setattr(reaper, 'product_reaper', ProductReaper(interval=3600))
+    load_gunicorn_config().post_worker_init(worker=None)
+
+    def task_status():
+        with app.app_context():
+            status = db.session.get(ScrapingTask, task_id).status
+        return status if status != Status.PENDING else None
+
+    assert wait_until(task_status) == Status.FAILED
+
+
+def expire_lease(task_id, **columns):
+    with app.app_context():
+        task = db.session.get(ScrapingTask, task_id)
+        task.owner, task.lease_expires_at = 'dead-host:1', datetime.now() - timedelta(minutes=5)
+        for name, value in columns.items():
+            setattr(task, name, value)
+        db.session.commit()
+
+
+def test_orphaned_task_is_restarted_until_it_runs_out_of_attempts(user, monkeypatch):
+    from app.tasks import SCRAPERS
+
+    product_id = add_products(user, 1)[0]
+    task_id = add_task(user, product_id)
+    expire_lease(task_id)
+    restarts = []
+    monkeypatch.setitem(app.config, 'TASK_ORPHAN_ACTION', 'requeue')
+    monkeypatch.setitem(app.config, 'TASK_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(leases, 'run_with_lease', lambda task_id, func, *args: restarts.append((task_id, func, args)))
+
+    # The first run was attempt 1
+    for attempt in (2, 3):
+        assert task_id in leases.recover_orphans()
+        with app.app_context():
+            task = db.session.get(ScrapingTask, task_id)
+            assert (task.status, task.attempts, task.owner) == (Status.PENDING, attempt, leases.worker_id())
+            assert task.lease_expires_at > datetime.now()
+            scraper = SCRAPERS[task.platform]
+            restart = (task_id, scraper, (task.fsn_asin, task_id, product_id))
+        assert wait_until(lambda: [run for run in restarts if run[0] == task_id] == [restart] * (attempt - 1))
+        expire_lease(task_id)
+
+    # A fourth attempt is one more than TASK_MAX_ATTEMPTS allows
+    assert task_id in leases.recover_orphans()
+    with app.app_context():
+        task = db.session.get(ScrapingTask, task_id)
+        assert (task.status, task.attempts) == (Status.FAILED, 4)
+        assert task.message == 'Abandoned after 3 interrupted attempts'
+    assert len([run for run in restarts if run[0] == task_id]) == 2
+
+
+def test_only_one_worker_claims_an_orphan(user):
+    task_id = add_task(user, add_products(user, 1)[0])
+    expire_lease(task_id)
+    now = datetime.now()
+    ready = threading.Barrier(2)
+    claims = {}
+
+    def claim(owner):
+        # Each claimer has a connection of its own, as the workers do
+        with app.app_context():
+            ready.wait()
+            claims[owner] = leases.claim_task(task_id, owner, now)
+            db.session.commit()
+
+    claimers = [threading.Thread(target=claim, args=(f'host-{i}:1',)) for i in range(2)]
+    for claimer in claimers:
+        claimer.start()
+    for claimer in claimers:
+        claimer.join()
+
+    assert sorted(claims.values(), key=str) == [2, None]
+    winner = next(owner for owner, attempts in claims.items() if attempts)
+    with app.app_context():
+        task = db.session.get(ScrapingTask, task_id)
+        assert (task.owner, task.attempts) == (winner, 2)
@@ -0,0 +1,28 @@
+"""The model package is only loaded while it was converted from the current models.p."""
+import os
+from app.model_store import MappedVectorizer, load_models, model_version
+from app.testing import TRAINING_LABELS, TRAINING_TEXTS, write_model_pickle
+
+
+def test_package_of_the_current_pickle_is_loaded(model_files):
+    bundle = load_models(model_files)
+    assert isinstance(bundle.vectorizer, MappedVectorizer)
+    assert bundle.version == model_version(model_files['MODEL_PICKLE'])
+
+
+def test_package_of_a_replaced_pickle_is_not_loaded(model_files):
+    old_version = load_models(model_files).version
+    write_model_pickle(model_files['MODEL_PICKLE'], TRAINING_TEXTS + ['great great great'], TRAINING_LABELS + ['Positive'])
+
+    bundle = load_models(model_files)
+    assert not isinstance(bundle.vectorizer, MappedVectorizer)
+    assert bundle.version == model_version(model_files['MODEL_PICKLE']) != old_version
+    assert 'logreg' in bundle.models and 'svm' in bundle.models
+
+
+def test_package_is_loaded_without_a_pickle(model_files):
+    version = model_version(model_files['MODEL_PICKLE'])
+    os.unlink(model_files['MODEL_PICKLE'])
+    bundle = load_models(model_files)
+    assert isinstance(bundle.vectorizer, MappedVectorizer)
+    assert bundle.version == version
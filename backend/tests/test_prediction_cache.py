@@ -0,0 +1,43 @@
+"""Cached predictions are reused by the same models and missed once models.p changes."""
+import pytest
+from app import app, db
+from app import model_store
+from app.models import PredictionCache
+from app.prediction_cache import predict, store_predictions, text_hash
+from app.testing import TRAINING_LABELS, TRAINING_TEXTS, write_model_pickle
+from app.writer import write_serializer
+
+
+@pytest.fixture(autouse=True)
+def cache_enabled(monkeypatch):
+    monkeypatch.setitem(app.config, 'PREDICTION_CACHE_ENABLED', True)
+
+
+def cached_predict(texts):
+    with app.app_context():
+        results, stats = predict(texts, 'logreg')
+    write_serializer.run(lambda: None)  # the new labels are stored by the writer thread
+    return results, stats
+
+
+def test_replacing_models_misses_the_cache(model_files, monkeypatch):
+    texts = ['great battery love it', 'awful quality broke']
+    assert cached_predict(texts)[1]['misses'] == 2
+    assert cached_predict(texts)[1]['hits'] == 2
+
+    # A new models.p, with the package of the old one left in place, loaded by a restarted process
+    write_model_pickle(model_files['MODEL_PICKLE'], TRAINING_TEXTS + ['great great great'], TRAINING_LABELS + ['Positive'])
+    monkeypatch.setattr(model_store, '_bundle', None)
+    results, stats = cached_predict(texts)
+    assert stats['misses'] == 2
+    assert len(results) == 2
+
+
+def test_labels_cached_by_another_process_are_skipped(model_files):
+    version = model_store.get_models().version
+    labels = {text_hash('cached twice'): {'logreg': 'Positive', 'svm': 'Positive'}}
+    # Two processes classified the same text before either stored it
+    write_serializer.run(store_predictions, version, labels)
+    write_serializer.run(store_predictions, version, labels)
+    with app.app_context():
+        assert db.session.query(PredictionCache).filter_by(text_hash=text_hash('cached twice')).count() == 2
@@ -0,0 +1,77 @@
+"""SQL statement budgets of the read endpoints and of the analysis upsert."""
+from datetime import date, timedelta
+import pytest
+from app import app, db
+from app.models import ProductPlatform, Review, ReviewSource
+from app.routes import store_analysis_results
+from app.testing import add_products
+from app.writer import write_serializer
+
+
+def review_rows(count, start=0):
+    return [
+        {
+            'overall_review': f'Review number {i}',
+            'rating': float(i % 5 + 1),
+            'Sentiment': ('positive', 'neutral', 'negative')[i % 3],
+            'date': f'Reviewed on {date(2024, 1, 1) + timedelta(days=i % 30)}',
+            'posted_on': date(2024, 1, 1) + timedelta(days=i % 30),
+            'author': f'Author {i}',
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def analyse(product_id, rows, platform=ReviewSource.AMAZON):
+    """Stores the classified rows of the product the way an analysis does."""
+    with app.app_context():
+        platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=platform).first().platform_id
+    summary_values = {'positive_count': 1, 'negative_count': 1, 'neutral_count': 1, 'word_cloud': '',
+                      'words': [], 'frequency': [], 'average_rating': 3.0, 'most_rating': 3.0}
+    write_serializer.run(store_analysis_results, product_id, platform, platform_id, summary_values, rows)
+
+
+@pytest.fixture
+def analysed_product(user):
+    product_id = add_products(user, 1)[0]
+    analyse(product_id, review_rows(60))
+    return product_id
+
+
+@pytest.mark.parametrize('path, budget', [
+    ('/products', 3),
+    ('/product/{product_id}', 3),
+    ('/product/{product_id}/reviews', 3),
+    ('/sentiment_summary/{product_id}', 3),
+    ('/product/{product_id}/sentiment_timeseries', 3),
+    ('/user_tasks', 2),
+    ('/dashboard', 2),
+])
+def test_read_endpoint_budget(client, analysed_product, uncached, query_budget, path, budget):
+    with query_budget(budget, n_plus_one_threshold=2):
+        response = client.get(path.format(product_id=analysed_product))
+    assert response.status_code == 200
+
+
+def test_analysis_upsert_does_not_query_per_review(user, query_budget):
+    product_id = add_products(user, 1)[0]
+    analyse(product_id, review_rows(20))
+    with app.app_context():
+        platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=ReviewSource.AMAZON).first().platform_id
+        # 20 reviews already stored, 30 new ones; the lookups, not the writes of the flush
+        with db.session.no_autoflush, query_budget(4, n_plus_one_threshold=2):
+            store_analysis_results(product_id, ReviewSource.AMAZON, platform_id, {}, review_rows(50))
+        db.session.rollback()
+
+
+def test_analysis_upsert_updates_existing_reviews(user):
+    product_id = add_products(user, 1)[0]
+    analyse(product_id, review_rows(10))
+    rows = review_rows(15)
+    for row in rows:
+        row['Sentiment'] = 'negative'
+    analyse(product_id, rows + rows[:3])  # a text repeated in one analysis is stored once
+    with app.app_context():
+        reviews = Review.query.filter_by(product_id=product_id).all()
+    assert len(reviews) == 15
+    assert {review.sentiment.name for review in reviews} == {'NEGATIVE'}
@@ -0,0 +1,38 @@
+"""The product and task listings issue as many SQL statements for 50 products as for 2."""
+import uuid
+import pytest
+from app import app, db
+from app.models import ProductPlatform, ScrapingTask, Status
+from app.querycount import count_queries
+from app.testing import add_products
+
+BUDGET = 3
+
+
+def add_tasks(user_id, product_ids):
+    """One completed scrape of every listing of the products."""
+    with app.app_context():
+        for platform in ProductPlatform.query.filter(ProductPlatform.product_id.in_(product_ids)):
+            db.session.add(ScrapingTask(id=str(uuid.uuid4()), fsn_asin=platform.platform_id, platform=platform.platform,
+                                        status=Status.COMPLETED, product_id=platform.product_id, created_by=user_id))
+        db.session.commit()
+
+
+def statements(client, path):
+    with count_queries() as counter:
+        response = client.get(path)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize('path', ['/products', '/product/{product_id}', '/user_tasks'])
+def test_statements_do_not_grow_with_products(client, user, uncached, path):
+    product_ids = add_products(user, 2)
+    add_tasks(user, product_ids)
+    few = statements(client, path.format(product_id=product_ids[0]))
+
+    product_ids += add_products(user, 48)
+    add_tasks(user, product_ids[2:])
+    many = statements(client, path.format(product_id=product_ids[-1]))
+
+    assert few == many <= BUDGET
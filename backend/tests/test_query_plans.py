@@ -0,0 +1,71 @@
+"""
+Every query the API issues per request or per product uses an index: `EXPLAIN QUERY PLAN`
+of each hot query must not fall back to a full table scan. Runs on the temporary SQLite
+database the tests create from the models and migrations, so a dropped or missing index
+fails the suite.
+"""
+import re
+from datetime import date, datetime
+import pytest
+from sqlalchemy import create_engine, text
+from app import app, db
+from app.models import (Product, ProductPlatform, RawReview, Review, ScrapingTask, SentimentSummary,
+                        SentimentRollup, DashboardAggregate, PredictionCache, Job, JobStatus, ReviewSource, Sentiment, Status)
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+HOT_QUERIES = {
+    'products of a user': lambda: Product.query.filter_by(created_by=1),
+    'platforms of listed products': lambda: ProductPlatform.query.filter(ProductPlatform.product_id.in_([1, 2, 3])),
+    'platform by ASIN/FSN': lambda: ProductPlatform.query.filter_by(platform_id='B000000000'),
+    'raw reviews of a product platform': lambda: RawReview.query.filter_by(product_id=1, platform=ReviewSource.AMAZON),
+    'raw reviews of a task': lambda: RawReview.query.filter_by(task_id='00000000-0000-0000-0000-000000000000'),
+    'reviews by source and sentiment': lambda: Review.query.filter_by(
+        product_id=1, source=ReviewSource.AMAZON, sentiment=Sentiment.POSITIVE),
+    'reviews of a product platform': lambda: Review.query.filter_by(product_id=1, source=ReviewSource.AMAZON).order_by(Review.id),
+    'reviews page': lambda: Review.query.filter(Review.product_id == 1, Review.id > 100).order_by(Review.id).limit(101),
+    'reviews in a date range': lambda: Review.query.filter(
+        Review.product_id == 1, Review.posted_on.between(date(2024, 1, 1), date(2024, 12, 31))),
+    'tasks of a user by status': lambda: ScrapingTask.query.filter_by(created_by=1, status=Status.PENDING),
+    'tasks for an ASIN/FSN by status': lambda: ScrapingTask.query.filter_by(fsn_asin='B000000000', status=Status.PENDING),
+    'summaries of a product platform': lambda: SentimentSummary.query.filter_by(product_id=1, platform=ReviewSource.AMAZON),
+    'rollups of a product': lambda: SentimentRollup.query.filter(
+        SentimentRollup.product_id == 1, SentimentRollup.day.between(date(2024, 1, 1), date(2024, 12, 31))),
+    'dashboard row': lambda: DashboardAggregate.query.filter_by(user_id=1),
+    'cached predictions': lambda: PredictionCache.query.filter(
+        PredictionCache.model_name == 'svm', PredictionCache.model_version == '000000000000',
+        PredictionCache.text_hash.in_(['0' * 64, '1' * 64])),
+    'expired scraping task leases': lambda: ScrapingTask.query.filter(
+        ScrapingTask.status == Status.PENDING, ScrapingTask.lease_expires_at < datetime(2024, 1, 1)),
+    'next queued job': lambda: Job.query.filter(
+        Job.status == JobStatus.QUEUED, Job.kind.in_(['scrape', 'analysis'])).order_by(Job.created_at).limit(1),
+    'expired job leases': lambda: Job.query.filter(
+        Job.status == JobStatus.RUNNING, Job.lease_expires_at < datetime(2024, 1, 1)),
+}
+
+
+def explain(conn, query):
+    sql = str(query.statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    return [row[3] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+
+
+def full_scans(plan):
+    return [step for step in plan if FULL_SCAN.match(step)]
+
+
+@pytest.mark.parametrize('name', HOT_QUERIES)
+def test_hot_query_uses_an_index(name):
+    with app.app_context(), db.engine.connect() as conn:
+        plan = explain(conn, HOT_QUERIES[name]())
+    assert not full_scans(plan), f'Full table scan: {"; ".join(plan)}'
+
+
+def test_dropped_index_is_detected(tmp_path):
+    # On a database of its own, so the other tests keep the index
+    engine = create_engine(f'sqlite:///{tmp_path}/plans.db')
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_raw_reviews_task_id'))
+    with app.app_context(), engine.connect() as conn:
+        assert full_scans(explain(conn, HOT_QUERIES['raw reviews of a task']())) == ['SCAN raw_reviews']
+    engine.dispose()
@@ -0,0 +1,92 @@
+"""Deleting a product marks it and returns; the reaper removes its rows in batches, also after a restart."""
+import pytest
+from app import app, db
+from app import leases, reaper
+from app.dashboard import compute_dashboard
+from app.leases import TaskLeases
+from app.models import (DashboardAggregate, Product, ProductPlatform, RawReview, Review, ReviewSource,
+                        ScrapingTask, SentimentSummary, Sentiment, Status)
+from app.reaper import CHILD_MODELS, ProductReaper, product_reaper, reap_products
+from app.testing import add_products, add_task, load_gunicorn_config, wait_until
+
+
+@pytest.fixture
+def product(user):
+    """A product with a running scrape, 25 raw and classified reviews and a summary."""
+    product_id = add_products(user, 1)[0]
+    task_id = add_task(user, product_id)
+    with app.app_context():
+        platform_id = ProductPlatform.query.filter_by(product_id=product_id, platform=ReviewSource.AMAZON).one().platform_id
+        db.session.add_all(RawReview(task_id=task_id, body=f'Review {i}', product_id=product_id, platform=ReviewSource.AMAZON)
+                           for i in range(25))
+        db.session.add_all(Review(product_id=product_id, review_text=f'Review {i}', source=ReviewSource.AMAZON,
+                                  sentiment=Sentiment.POSITIVE, rating=5.0) for i in range(25))
+        db.session.add(SentimentSummary(product_id=product_id, platform_id=platform_id, platform=ReviewSource.AMAZON,
+                                        positive_count=25, average_rating=5.0, most_rating=5.0))
+        db.session.commit()
+    return product_id, task_id
+
+
+def stored_dashboard(user_id):
+    with app.app_context():
+        aggregate = db.session.get(DashboardAggregate, user_id)
+        return {field: getattr(aggregate, field) for field in compute_dashboard(user_id)}
+
+
+def test_delete_marks_the_product_and_cancels_its_tasks(client, user, product, monkeypatch):
+    product_id, task_id = product
+    monkeypatch.setattr(product_reaper, 'wake', lambda: None)
+    assert stored_dashboard(user)['total_reviews'] == 25
+
+    response = client.delete(f'/product/{product_id}')
+    assert response.status_code == 202
+    with app.app_context():
+        assert db.session.get(Product, product_id).deleting
+        task = db.session.get(ScrapingTask, task_id)
+        assert (task.status, task.message) == (Status.FAILED, 'Cancelled: product deleted')
+    dashboard = stored_dashboard(user)
+    assert (dashboard['total_products'], dashboard['total_reviews'], dashboard['total_positive_reviews']) == (0, 0, 0)
+    assert client.delete(f'/product/{product_id}').status_code == 404
+
+
+def test_reaper_deletes_in_batches(client, user, product, monkeypatch):
+    product_id, task_id = product
+    monkeypatch.setattr(product_reaper, 'wake', lambda: None)
+    client.delete(f'/product/{product_id}')
+
+    batches = []
+
+    def delete_batch(model, batch_product_id, batch_size):
+        deleted = reaper_delete_batch(model, batch_product_id, batch_size)
+        batches.append((model, batch_product_id, deleted))
+        return deleted
+
+    reaper_delete_batch = reaper.delete_batch
+    monkeypatch.setattr(reaper, 'delete_batch', delete_batch)
+    assert product_id in reap_products(batch_size=10)
+
+    review_batches = [deleted for model, batch_product_id, deleted in batches if (model, batch_product_id) == (Review, product_id)]
+    assert review_batches == [10, 10, 5]
+    with app.app_context():
+        assert db.session.get(Product, product_id) is None
+        for model in CHILD_MODELS:
+            assert model.query.filter_by(product_id=product_id).count() == 0
+        assert compute_dashboard(user) == stored_dashboard(user)
+
+
+def test_worker_startup_finishes_interrupted_deletions(user, product, monkeypatch):
+    product_id, task_id = product
+    # Marked by a process that stopped before its reaper got to it
+    with app.app_context():
+        db.session.get(Product, product_id).deleting = True
+        db.session.commit()
+
+    monkeypatch.setattr(leases, 'task_leases', TaskLeases(heartbeat_interval=3600))
+    monkeypatch.setattr(reaper, 'product_reaper', ProductReaper(batch_size=10, interval=3600))
+    load_gunicorn_config().post_worker_init(worker=None)
+
+    def deleted():
+        with app.app_context():
+            return db.session.get(Product, product_id) is None
+
+    assert wait_until(deleted)
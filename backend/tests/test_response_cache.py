@@ -0,0 +1,76 @@
+"""Response cache invalidation, in one process and across processes sharing a Redis backend."""
+import time
+import pytest
+from werkzeug.datastructures import MultiDict
+import app.cache
+from app.cache import MemoryBackend, RedisBackend, ResponseCache
+from app.testing import LocalRedis, add_products
+
+
+@pytest.fixture
+def shared_store():
+    return LocalRedis()
+
+
+@pytest.fixture
+def shared_cache(monkeypatch, shared_store):
+    """The response cache of this process, on the shared store."""
+    cache = ResponseCache(RedisBackend(shared_store), ttl=300)
+    monkeypatch.setattr(app.cache, 'response_cache', cache)
+    return cache
+
+
+def new_product(client, name):
+    response = client.post('/product', json={'name': name, 'description': 'Cached', 'image': None})
+    assert response.status_code == 201
+
+
+def test_write_invalidates_the_users_responses(client, user, shared_cache):
+    add_products(user, 1)
+    assert client.get('/products').headers['X-Cache'] == 'MISS'
+    response = client.get('/products')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert client.get('/products', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    new_product(client, 'Added later')
+    response = client.get('/products')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert len(response.get_json()['products']) == 2
+
+
+def test_invalidation_reaches_other_processes(client, user, shared_cache, shared_store):
+    add_products(user, 1)
+    client.get('/products')
+    assert client.get('/products').headers['X-Cache'] == 'HIT'
+
+    # A write in another gunicorn worker or app.worker process, with its own cache on the same store
+    ResponseCache(RedisBackend(shared_store), ttl=300).invalidate_user(user)
+    assert client.get('/products').headers['X-Cache'] == 'MISS'
+
+
+def test_other_users_stay_cached(client, user, shared_cache):
+    add_products(user, 1)
+    client.get('/products')
+    shared_cache.invalidate_user(user + 1)
+    assert client.get('/products').headers['X-Cache'] == 'HIT'
+
+
+@pytest.mark.parametrize('backend', [lambda: MemoryBackend(), lambda: RedisBackend(LocalRedis())])
+def test_expired_generation_does_not_revive_stale_entries(backend):
+    cache = ResponseCache(backend(), ttl=0.05)
+    stale = cache.key(1, 'products', {}, MultiDict())
+    cache.set(stale, b'old')
+    cache.invalidate_user(1)
+    time.sleep(0.15)  # past the entry's TTL and the generation's
+    assert cache.key(1, 'products', {}, MultiDict()) == stale
+    assert cache.get(stale) is None
+
+
+def test_memory_generations_are_bounded():
+    backend = MemoryBackend()
+    for user_id in range(1000):
+        backend.bump_generation(f'user:{user_id}', 0.01)
+    time.sleep(0.02)
+    backend.bump_generation('user:1000', 0.01)
+    assert list(backend.generations) == ['user:1000']
+    assert backend.generation('user:1') == 0
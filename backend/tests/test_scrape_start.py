@@ -0,0 +1,98 @@
+"""A scrape request joins the running scrape of its listing, or reuses a fresh one, unless forced."""
+from datetime import datetime, timedelta
+import pytest
+from app import app, db, tasks
+from app.models import ProductPlatform, ReviewSource, ScrapingTask, Status
+from app.testing import add_products, add_task, wait_until
+
+
+@pytest.fixture
+def listing(user):
+    product_id = add_products(user, 1, platforms=(ReviewSource.FLIPKART,))[0]
+    with app.app_context():
+        fsn = ProductPlatform.query.filter_by(product_id=product_id).one().platform_id
+    return product_id, fsn
+
+
+@pytest.fixture
+def scrapes(monkeypatch):
+    """The task ids of the scrapes started, which are not run."""
+    started = []
+    monkeypatch.setitem(app.config, 'JOB_EXECUTOR', 'thread')
+    monkeypatch.setattr(tasks, 'run_with_lease', lambda task_id, *args: started.append(task_id))
+    return started
+
+
+def scrape(client, fsn, force=False):
+    return client.post(f'/scrape_flipkart_reviews/{fsn}' + ('?force=true' if force else ''))
+
+
+def pending_tasks(fsn):
+    with app.app_context():
+        return [task.id for task in ScrapingTask.query.filter_by(fsn_asin=fsn, status=Status.PENDING)]
+
+
+def test_running_scrape_is_joined(client, user, listing, scrapes):
+    product_id, fsn = listing
+    response = scrape(client, fsn)
+    assert response.status_code == 202
+    task_id = response.get_json()['task_id']
+    assert wait_until(lambda: scrapes) == [task_id]
+
+    response = scrape(client, fsn)
+    assert response.status_code == 202
+    assert response.get_json()['task_id'] == task_id
+    assert response.get_json()['task']['status'] == 'PENDING'
+    assert pending_tasks(fsn) == [task_id] and scrapes == [task_id]
+
+
+def test_fresh_scrape_is_reused(client, user, listing, scrapes):
+    product_id, fsn = listing
+    finished_at = datetime.now() - timedelta(minutes=5)
+    task_id = add_task(user, product_id, ReviewSource.FLIPKART, Status.COMPLETED, finished_at=finished_at)
+
+    response = scrape(client, fsn)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['task_id'] == task_id
+    assert body['task']['finished_at'] == finished_at.isoformat()
+    assert scrapes == []
+
+
+def test_stale_or_forced_scrape_starts_a_new_task(client, user, listing, scrapes, monkeypatch):
+    product_id, fsn = listing
+    task_id = add_task(user, product_id, ReviewSource.FLIPKART, Status.COMPLETED,
+                       finished_at=datetime.now() - timedelta(minutes=5))
+
+    response = scrape(client, fsn, force=True)
+    assert response.status_code == 202
+    assert response.get_json()['task_id'] != task_id
+    assert pending_tasks(fsn) == [response.get_json()['task_id']]
+
+    # Past the freshness TTL, a request without force starts one as well
+    with app.app_context():
+        db.session.get(ScrapingTask, pending_tasks(fsn)[0]).status = Status.COMPLETED
+        db.session.commit()
+    monkeypatch.setitem(app.config, 'SCRAPE_FRESHNESS_TTL', {'amazon': 60, 'flipkart': 60})
+    assert scrape(client, fsn).status_code == 202
+    assert wait_until(lambda: len(scrapes) == 2)
+
+
+def test_scrape_started_by_another_worker_is_joined(client, user, listing, scrapes, monkeypatch):
+    product_id, fsn = listing
+    # Another worker inserted its task after this one found none running: the insert of this
+    # one fails on the unique index of running tasks
+    task_id = add_task(user, product_id, ReviewSource.FLIPKART)
+    running_scrape = tasks.running_scrape
+    checks = []
+
+    def raced_running_scrape(platform, platform_id):
+        checks.append(platform_id)
+        return None if len(checks) == 1 else running_scrape(platform, platform_id)
+
+    monkeypatch.setattr(tasks, 'running_scrape', raced_running_scrape)
+    response = scrape(client, fsn)
+    assert response.status_code == 202
+    assert response.get_json()['task_id'] == task_id
+    assert len(checks) == 2
+    assert pending_tasks(fsn) == [task_id] and scrapes == []
@@ -0,0 +1,69 @@
+"""Saved marketplace sessions: encrypted round trips, and what is dropped or refused on load."""
+import os
+import time
+import pytest
+from cryptography.fernet import Fernet
+from app import app
+from app.session_store import load_session, save_session, session_path
+from config import DEFAULT_SECRET_KEY
+
+ACCOUNT = 'scraper@example.com'
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'SESSION_STORE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'SESSION_STORE_KEY', Fernet.generate_key().decode())
+    return tmp_path
+
+
+def cookie(name, expiry=None):
+    return {'name': name, 'value': f'{name}-value', 'domain': '.amazon.in', 'path': '/', 'expiry': expiry}
+
+
+def test_round_trip(store):
+    cookies = [cookie('session-id', time.time() + 3600), cookie('ubid-acbin')]
+    save_session(ACCOUNT, cookies)
+    assert load_session(ACCOUNT) == cookies
+    # Neither the account name nor the cookies are readable in the file
+    with open(session_path(ACCOUNT), 'rb') as f:
+        saved = f.read()
+    assert b'session-id' not in saved and ACCOUNT.encode() not in saved
+    assert ACCOUNT not in os.listdir(store)[0]
+
+
+def test_expired_cookies_are_dropped(store):
+    save_session(ACCOUNT, [cookie('session-id', time.time() + 3600), cookie('session-token', time.time() - 1)])
+    assert [c['name'] for c in load_session(ACCOUNT)] == ['session-id']
+
+    save_session(ACCOUNT, [cookie('session-token', time.time() - 1)])
+    assert load_session(ACCOUNT) is None
+
+
+def test_session_older_than_max_age_is_discarded(store, monkeypatch):
+    save_session(ACCOUNT, [cookie('session-id')])
+    later = time.time() + app.config['SESSION_MAX_AGE'] + 60
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert load_session(ACCOUNT) is None
+    assert not os.path.exists(session_path(ACCOUNT))
+
+
+def test_session_of_another_key_is_discarded(store, monkeypatch):
+    save_session(ACCOUNT, [cookie('session-id')])
+    monkeypatch.setitem(app.config, 'SESSION_STORE_KEY', Fernet.generate_key().decode())
+    assert load_session(ACCOUNT) is None
+    assert not os.path.exists(session_path(ACCOUNT))
+
+
+def test_nothing_is_stored_under_the_public_secret_key(store, monkeypatch, caplog):
+    monkeypatch.setitem(app.config, 'SESSION_STORE_KEY', None)
+    monkeypatch.setitem(app.config, 'SECRET_KEY', DEFAULT_SECRET_KEY)
+    save_session(ACCOUNT, [cookie('session-id')])
+    assert os.listdir(store) == []
+    assert load_session(ACCOUNT) is None
+    assert [record.levelname for record in caplog.records] == ['WARNING', 'WARNING']
+
+    # A SECRET_KEY of the deployment's own is enough
+    monkeypatch.setitem(app.config, 'SECRET_KEY', 'a-secret-of-this-deployment')
+    save_session(ACCOUNT, [cookie('session-id')])
+    assert load_session(ACCOUNT) == [cookie('session-id')]
@@ -32,19 +32,54 @@ const SortArrow = ({ direction }: SortArrowProps) => {
   );
 };
 
+// Reviews per page requested from the server (it caps pages at 1000)
+const REVIEWS_PAGE_SIZE = 100;
+
+interface ReviewFilters {
+  platform: string;
+  sentiment: string;
+  rating: string;
+}
+
+// Reviews are filtered and paginated by the server, one page at a time
+const fetchReviewsPage = async (
+  productId: number,
+  filters: ReviewFilters,
+  cursor: string | null
+) => {
+  const params = new URLSearchParams({ limit: String(REVIEWS_PAGE_SIZE) });
+  if (filters.platform !== "all") params.set("source", filters.platform.toLowerCase());
+  if (filters.sentiment !== "all") params.set("sentiment", filters.sentiment.toLowerCase());
+  if (filters.rating !== "all") {
+    params.set("min_rating", filters.rating);
+    params.set("max_rating", filters.rating);
+  }
+  if (cursor) params.set("cursor", cursor);
+  const response = await fetch(`/api/product/${productId}/reviews?${params}`);
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.message || "Reviews not loaded | Unexpected error");
+  }
+  const page: any[] = await response.json();
+  return { page, cursor: response.headers.get("X-Next-Cursor") };
+};
+
 interface ProductReviewsProps {
   product: Product;
 }
 
 export function ProductReviews({ product }: ProductReviewsProps) {
   const [reviews, setReviews] = useState<any[]>([]);
-  const [filteredReviews, setFilteredReviews] = useState<any[]>([]);
+  const [sortedReviews, setSortedReviews] = useState<any[]>([]);
   const [sorting, setSorting] = useState<{
     key: string;
     direction: "asc" | "desc";
   } | null>(null);
   const [loading, setLoading] = useState(false);
-  const [filters, setFilters] = useState({
+  const [loadingMore, setLoadingMore] = useState(false);
+  // X-Next-Cursor of the last page loaded, null once every matching review is loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [filters, setFilters] = useState<ReviewFilters>({
     platform: "all",
     sentiment: "all",
     rating: "all",
@@ -52,46 +87,52 @@ export function ProductReviews({ product }: ProductReviewsProps) {
   const [scraping, setScraping] = useState(false);
   const [analyzing, setAnalyzing] = useState(false);
 
-  // Fetch all reviews once
+  // Load the first page again whenever the product or the filters change
   useEffect(() => {
-    const fetchReviews = async () => {
+    let cancelled = false;
+    const fetchFirstPage = async () => {
       setLoading(true);
       try {
-        const response = await fetch(`/api/product/${product.id}/reviews`);
-        if (!response.ok) {
-          const data = await response.json();
-          throw new Error(data.message || "Reviews not loaded | Unexpected error");
-        }
-        const data = await response.json();
-        setReviews(data);
-        setFilteredReviews(data);
+        const { page, cursor } = await fetchReviewsPage(product.id, filters, null);
+        if (cancelled) return;
+        setReviews(page);
+        setNextCursor(cursor);
       } catch (error) {
+        if (cancelled) return;
+        setReviews([]);
+        setNextCursor(null);
         toast.error(
           error instanceof Error ? error.message : "Could not load reviews"
         );
       } finally {
-        setLoading(false);
+        if (!cancelled) setLoading(false);
       }
     };
-    fetchReviews();
-  }, [product.id]);
+    fetchFirstPage();
+    return () => {
+      cancelled = true;
+    };
+  }, [product.id, filters]);
 
-  // Filter and sort reviews
-  useEffect(() => {
-    let updatedReviews = [...reviews];
-    if (filters.platform !== "all")
-      updatedReviews = updatedReviews.filter(
-        (review) => review.source === filters.platform
-      );
-    if (filters.sentiment !== "all")
-      updatedReviews = updatedReviews.filter(
-        (review) => review.sentiment === filters.sentiment
-      );
-    if (filters.rating !== "all")
-      updatedReviews = updatedReviews.filter(
-        (review) => review.rating === parseInt(filters.rating, 10)
+  const loadMoreReviews = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const { page, cursor } = await fetchReviewsPage(product.id, filters, nextCursor);
+      setReviews((prev) => [...prev, ...page]);
+      setNextCursor(cursor);
+    } catch (error) {
+      toast.error(
+        error instanceof Error ? error.message : "Could not load reviews"
       );
+    } finally {
+      setLoadingMore(false);
+    }
+  };
 
+  // Sort the reviews loaded so far
+  useEffect(() => {
+    let updatedReviews = [...reviews];
     if (sorting) {
       updatedReviews.sort((a, b) => {
         if (sorting.key === "rating" || sorting.key === "relevance_score") {
@@ -109,8 +150,8 @@ export function ProductReviews({ product }: ProductReviewsProps) {
         return 0;
       });
     }
-    setFilteredReviews(updatedReviews);
-  }, [filters, sorting, reviews]);
+    setSortedReviews(updatedReviews);
+  }, [sorting, reviews]);
 
   // Scraping and sentiment analysis functions
   const scrapeReviews = async (platform: string, id: string) => {
@@ -120,11 +161,16 @@ export function ProductReviews({ product }: ProductReviewsProps) {
         `/api/scrape_${platform.toLowerCase()}_reviews/${id}`,
         { method: "POST" }
       );
+      const data = await response.json();
       if (!response.ok) {
-        const data = await response.json();
         throw new Error(data.error || "Scraping failed");
       }
-      toast.success(`Started scraping reviews from ${platform}`);
+      // The scrape may already be running, or have completed recently and be reused
+      toast.success(
+        data.message === "Scraping started"
+          ? `Started scraping reviews from ${platform}`
+          : data.message
+      );
     } catch (error) {
       toast.error(
         error instanceof Error ? error.message : "Failed to start scraping"
@@ -215,13 +261,11 @@ export function ProductReviews({ product }: ProductReviewsProps) {
           </SelectTrigger>
           <SelectContent>
             <SelectItem value="all">All Platforms</SelectItem>
-            {[...new Set(reviews.map((review) => review.source))].map(
-              (source) => (
-                <SelectItem key={source} value={source}>
-                  {source}
-                </SelectItem>
-              )
-            )}
+            {product.platforms.map((platform) => (
+              <SelectItem key={platform.platform} value={platform.platform}>
+                {platform.platform}
+              </SelectItem>
+            ))}
           </SelectContent>
         </Select>
 
@@ -251,13 +295,11 @@ export function ProductReviews({ product }: ProductReviewsProps) {
           </SelectTrigger>
           <SelectContent>
             <SelectItem value="all">All Ratings</SelectItem>
-            {[...new Set(reviews.map((review) => review.rating))].map(
-              (rating) => (
-                <SelectItem key={rating} value={rating.toString()}>
-                  {rating}
-                </SelectItem>
-              )
-            )}
+            {[5, 4, 3, 2, 1].map((rating) => (
+              <SelectItem key={rating} value={rating.toString()}>
+                {rating}
+              </SelectItem>
+            ))}
           </SelectContent>
         </Select>
       </div>
@@ -303,7 +345,7 @@ export function ProductReviews({ product }: ProductReviewsProps) {
             </TableRow>
           </TableHeader>
           <TableBody>
-            {filteredReviews.map((review) => (
+            {sortedReviews.map((review) => (
               <TableRow key={review.id}>
                 <TableCell>{review.author || "Unknown"}</TableCell>
                 <TableCell>{review.rating}</TableCell>
@@ -335,6 +377,16 @@ export function ProductReviews({ product }: ProductReviewsProps) {
           </TableBody>
         </Table>
       )}
+
+      {/* Next page of the filtered reviews */}
+      {!loading && nextCursor && (
+        <div className="flex justify-center mt-4">
+          <Button onClick={loadMoreReviews} disabled={loadingMore} variant="outline">
+            {loadingMore && <RefreshCw className="mr-2 h-4 w-4 animate-spin" />}
+            Load more reviews
+          </Button>
+        </div>
+      )}
     </div>
   );
 }